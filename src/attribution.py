@@ -0,0 +1,197 @@
+"""
+Per-prediction feature attribution for the ABIA Traffic Accident Forecaster.
+
+Contains a decision-path attribution engine for tree ensembles. Every time a
+row moves from a node to one of its children, the change in the node's
+accident probability is credited to the feature the node split on; summed
+over the path and averaged over the trees, the credits plus the forest's
+base rate add up exactly to the predicted probability.
+
+Because every path ends in a leaf, the credits are summed root-to-leaf once
+when the engine is built, with one-hot columns already folded back into
+their source feature from MODEL_FEATURES. Explaining a batch is then one
+leaf lookup per tree and a gather from a (leaves x features) table.
+"""
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from typing import List, Optional, Tuple
+
+from .config import MODEL_FEATURES, FEATURE_LABELS, TOP_FACTORS
+from .encoding import category_layout
+
+
+def feature_fold_matrix(model_columns: pd.Index, features: List[str] = MODEL_FEATURES) -> sp.csr_matrix:
+    """
+    Build a (columns x features) 0/1 matrix mapping encoded columns to source features.
+
+    Args:
+        model_columns: Encoded column names
+        features: Source feature names
+
+    Returns:
+        Sparse matrix; multiplying column-level values by it sums them per feature
+    """
+    numeric, categorical = category_layout(model_columns)
+    index = {feature: i for i, feature in enumerate(features)}
+    rows, cols = [], []
+    for feature, position in numeric:
+        rows.append(position)
+        cols.append(index[feature])
+    for feature, (_, positions) in categorical.items():
+        rows.extend(positions.tolist())
+        cols.extend([index[feature]] * len(positions))
+    return sp.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(len(model_columns), len(features))
+    )
+
+
+def _node_values(estimator, positive_index: Optional[int]) -> np.ndarray:
+    """Positive-class probability (classifiers) or prediction (regressors) at every node."""
+    values = estimator.tree_.value[:, 0, :]
+    if positive_index is None:
+        return values[:, 0]
+    return values[:, positive_index] / values.sum(axis=1)
+
+
+class ForestAttribution:
+    """
+    Decision-path attribution for a fitted random forest.
+
+    Works with RandomForestClassifier (positive-class probability) and with
+    models exposing a fitted forest regressor as .regressor (such as the
+    distilled candidates from src.compression).
+
+    Args:
+        model: Fitted forest
+        model_columns: Encoded column names the model was trained on
+        features: Source features to fold one-hot columns into
+        chunk_rows: Rows gathered at a time when explaining large batches
+    """
+
+    def __init__(
+        self,
+        model,
+        model_columns: pd.Index,
+        features: List[str] = MODEL_FEATURES,
+        chunk_rows: int = 2048
+    ):
+        self.forest = getattr(model, 'regressor', model)
+        self.model_columns = pd.Index(model_columns)
+        self.features = list(features)
+        self.chunk_rows = chunk_rows
+        classes = getattr(self.forest, 'classes_', None)
+        positive_index = None if classes is None else int(np.flatnonzero(classes == 1)[0])
+        fold = feature_fold_matrix(self.model_columns, self.features).toarray()
+
+        leaf_tables, leaf_maps, offset, base = [], [], 0, 0.0
+        for estimator in self.forest.estimators_:
+            tree = estimator.tree_
+            values = _node_values(estimator, positive_index)
+            # Root-to-node credit totals, filled one depth level at a time
+            totals = np.zeros((tree.node_count, len(self.features)))
+            frontier = np.array([0])
+            while len(frontier):
+                split = frontier[tree.children_left[frontier] >= 0]
+                for children in (tree.children_left[split], tree.children_right[split]):
+                    credit = (values[children] - values[split])[:, None]
+                    totals[children] = totals[split] + fold[tree.feature[split]] * credit
+                frontier = np.concatenate([tree.children_left[split], tree.children_right[split]])
+
+            leaves = np.flatnonzero(tree.children_left < 0)
+            leaf_map = np.full(tree.node_count, -1, dtype=np.int64)
+            leaf_map[leaves] = offset + np.arange(len(leaves))
+            leaf_tables.append(totals[leaves].astype(np.float32))
+            leaf_maps.append(leaf_map)
+            offset += len(leaves)
+            base += values[0]
+
+        n_trees = len(self.forest.estimators_)
+        self.leaf_credits = np.concatenate(leaf_tables) / np.float32(n_trees)
+        self._leaf_maps = leaf_maps
+        self.base_value = base / n_trees
+
+    def leaf_rows(self, X: pd.DataFrame) -> np.ndarray:
+        """Row of leaf_credits reached in each tree, shape (rows, trees)."""
+        values = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+        return np.column_stack([
+            leaf_map[estimator.tree_.apply(values)]
+            for estimator, leaf_map in zip(self.forest.estimators_, self._leaf_maps)
+        ])
+
+    def explain(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Attribute each row's prediction to the source features.
+
+        Args:
+            X: Encoded rows in model_columns order (e.g. the output of
+                prepare_prediction_input)
+
+        Returns:
+            DataFrame (rows x features) of probability contributions; each
+            row sums to the prediction minus base_value
+        """
+        leaves = self.leaf_rows(X)
+        contributions = np.empty((len(X), len(self.features)))
+        for start in range(0, len(X), self.chunk_rows):
+            chunk = leaves[start:start + self.chunk_rows]
+            contributions[start:start + len(chunk)] = self.leaf_credits[chunk].sum(axis=1)
+        return pd.DataFrame(contributions, columns=self.features, index=X.index)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the precomputed tables."""
+        return self.leaf_credits.nbytes + sum(m.nbytes for m in self._leaf_maps)
+
+
+def attribution_target(model, model_columns: pd.Index, state: Optional[str]) -> Tuple[object, pd.Index, Optional[str]]:
+    """
+    Find the forest that actually scores a row.
+
+    For a ShardedModel this is the row's state shard if one exists,
+    otherwise the pooled model.
+
+    Args:
+        model: Served model (forest or ShardedModel)
+        model_columns: The served model's columns
+        state: The row's raw State value
+
+    Returns:
+        Tuple of (forest, its model columns, shard version or None)
+    """
+    if getattr(model, 'routes_by_state', False):
+        shard = model.get_shard(state)
+        if shard is not None:
+            return shard.model, shard.model_columns, shard.version
+        return model.pooled_model, model_columns, None
+    return model, model_columns, None
+
+
+def top_factors(
+    contributions: pd.Series,
+    raw_values: pd.Series,
+    n: int = TOP_FACTORS
+) -> List[dict]:
+    """
+    Summarise one row's largest contributions for display.
+
+    Args:
+        contributions: One row of ForestAttribution.explain
+        raw_values: The row's raw feature values (before encoding)
+        n: Number of factors to return
+
+    Returns:
+        List of dicts with feature, label, value and contribution, largest
+        absolute contribution first
+    """
+    order = contributions.abs().sort_values(ascending=False).index[:n]
+    return [
+        {
+            'feature': feature,
+            'label': FEATURE_LABELS.get(feature, feature),
+            'value': raw_values.get(feature),
+            'contribution': float(contributions[feature])
+        }
+        for feature in order
+    ]
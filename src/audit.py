@@ -0,0 +1,232 @@
+"""
+Prediction audit log for the ABIA Traffic Accident Forecaster.
+
+Contains a logger that keeps a record of every prediction (inputs, weather,
+probability, model version, latency) for audits and later retraining.
+Logging only puts the record on a bounded in-memory queue; a background
+thread drains the queue a few times a second and writes the records in
+batches to Parquet files partitioned by UTC date and hour:
+
+    AUDIT_LOG_DIR/date=2024-06-01/hour=14/part-<timestamp>-<id>.parquet
+"""
+
+import atexit
+import queue
+import threading
+import time
+import uuid
+import pandas as pd
+from pathlib import Path
+from typing import Optional
+
+from .config import (
+    AUDIT_LOG_DIR, AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_SECONDS,
+    AUDIT_OVERFLOW, AUDIT_BLOCK_SECONDS
+)
+
+OVERFLOW_POLICIES = ('drop', 'block')
+
+# How often the writer drains the queue; logging itself never wakes it, so
+# the request path only pays for an uncontended queue insert
+_POLL_SECONDS = 0.2
+
+
+class PredictionLogger:
+    """
+    Asynchronous, batched Parquet writer for prediction records.
+
+    Args:
+        directory: Root directory of the partitioned log
+        max_queue: Records held in memory before the overflow policy applies
+        batch_size: Records per file
+        flush_interval: Seconds a partial batch waits before being written
+        overflow: 'drop' new records when the queue is full, or 'block' the
+            caller for up to block_timeout seconds first
+        block_timeout: Longest a 'block' caller waits for queue space
+        close_at_exit: Flush remaining records when the interpreter exits
+    """
+
+    def __init__(
+        self,
+        directory: Path = AUDIT_LOG_DIR,
+        max_queue: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_SECONDS,
+        overflow: str = AUDIT_OVERFLOW,
+        block_timeout: float = AUDIT_BLOCK_SECONDS,
+        close_at_exit: bool = True
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flush_waiters = []
+        self._closed = False
+        self.counters = {'dropped': 0, 'written': 0, 'files': 0, 'write_errors': 0}
+        self._writer = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._writer.start()
+        if close_at_exit:
+            atexit.register(self.close)
+
+    # --- Request Path ---
+    def log(self, record: dict) -> bool:
+        """
+        Queue one prediction record for writing.
+
+        Nested dictionaries (e.g. weather) become underscore-joined columns.
+        A 'logged_at' UTC timestamp is added; a field of the record's own
+        that would be called 'logged_at' is written as 'record_logged_at'.
+
+        Args:
+            record: Flat or nested dictionary of scalar values
+
+        Returns:
+            True if queued, False if dropped (queue full or logger closed)
+        """
+        item = (time.time(), record)
+        try:
+            if self._closed:
+                raise queue.Full
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow == 'block' and not self._closed:
+                self._wake.set()  # Drain now rather than at the next poll
+                try:
+                    self._queue.put(item, timeout=self.block_timeout)
+                    return True
+                except queue.Full:
+                    pass
+            with self._lock:
+                self.counters['dropped'] += 1
+            return False
+        return True
+
+    # --- Writer ---
+    def _run(self) -> None:
+        """Drain the queue every poll interval and write full or timed-out batches until closed."""
+        batch, deadline = [], None
+        while True:
+            self._wake.wait(_POLL_SECONDS)
+            self._wake.clear()
+            stopping = self._closed
+            with self._lock:
+                waiters, self._flush_waiters = self._flush_waiters, []
+
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch = []
+            if batch and deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if batch and (waiters or stopping or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+            if not batch:
+                deadline = None
+
+            for waiter in waiters:
+                waiter.set()
+            if stopping:
+                return
+
+    def _write(self, batch: list) -> None:
+        """
+        Write a batch as one file per date/hour partition it spans.
+
+        Never raises: a batch that cannot be converted or written is counted
+        in write_errors, so one bad record cannot stop the writer thread.
+        """
+        if not batch:
+            return
+        try:
+            frame = pd.json_normalize([record for _, record in batch], sep='_')
+            frame = frame.rename(columns={'logged_at': 'record_logged_at'})
+            frame.insert(0, 'logged_at', pd.to_datetime([ts for ts, _ in batch], unit='s', utc=True))
+            partitions = frame.groupby([frame['logged_at'].dt.strftime('%Y-%m-%d'),
+                                        frame['logged_at'].dt.strftime('%H')])
+        except Exception as e:
+            print(f"Error converting audit log batch of {len(batch)} records: {e}")
+            with self._lock:
+                self.counters['write_errors'] += 1
+            return
+        for (day, hour), part in partitions:
+            directory = self.directory / f"date={day}" / f"hour={hour}"
+            path = directory / f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                staging = path.with_suffix('.parquet.tmp')
+                part.to_parquet(staging, index=False)
+                staging.replace(path)
+            except Exception as e:
+                print(f"Error writing audit log batch: {e}")
+                with self._lock:
+                    self.counters['write_errors'] += 1
+                continue
+            with self._lock:
+                self.counters['written'] += len(part)
+                self.counters['files'] += 1
+
+    # --- Lifecycle ---
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Write everything queued so far.
+
+        Args:
+            timeout: Longest time to wait (None waits indefinitely)
+
+        Returns:
+            True if the queued records were written within the timeout
+        """
+        if self._closed:
+            return not self._writer.is_alive()
+        done = threading.Event()
+        with self._lock:
+            self._flush_waiters.append(done)
+        self._wake.set()
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop accepting records, write the remaining queue and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            print("Audit log writer did not finish in time; unwritten records were lost")
+
+    def stats(self) -> dict:
+        """Return a copy of the counters plus the current queue depth."""
+        with self._lock:
+            return dict(self.counters, queued=self._queue.qsize())
+
+
+def read_audit_log(directory: Path = AUDIT_LOG_DIR, since: Optional[str] = None) -> pd.DataFrame:
+    """
+    Load logged predictions.
+
+    Args:
+        directory: Root directory of the partitioned log
+        since: Earliest UTC date to read, as 'YYYY-MM-DD' (None reads all)
+
+    Returns:
+        DataFrame of records ordered by logged_at (empty if nothing was logged)
+    """
+    paths = sorted(
+        p for p in Path(directory).glob('date=*/hour=*/*.parquet')
+        if since is None or p.parent.parent.name[len('date='):] >= since
+    )
+    if not paths:
+        return pd.DataFrame()
+    frame = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+    return frame.sort_values('logged_at', kind='stable').reset_index(drop=True)
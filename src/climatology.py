@@ -0,0 +1,230 @@
+"""
+Weather climatology for the ABIA Traffic Accident Forecaster.
+
+Contains a precomputed table of typical weather (median temperature,
+precipitation, snowfall and wind speed, and the most common weather code)
+per State x Month x Hour, built from the weather-enriched training data and
+stored as compact numpy arrays. When live weather is slow or unavailable,
+the app predicts from this table instead and labels the result as
+estimated.
+
+Usage:
+    python -m src.climatology --data traffic_violations_with_detailed_weather.csv
+"""
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from .config import STATE_LIST, CLIMATOLOGY_PATH, CLIMATOLOGY_MIN_COUNT
+from .data_processing import filter_by_states, remove_missing_weather
+
+# Numeric weather fields, in the training data's units (°C, mm, cm, km/h)
+CLIMATE_FIELDS = ['temperature', 'precipitation', 'snowfall', 'windspeed']
+KMH_TO_MPH = 1 / 1.60934
+
+# How much of State x Month x Hour a cell's figures are conditioned on
+DETAIL_LABELS = {3: 'state, month and hour', 2: 'state and month', 1: 'state', 0: 'all states'}
+
+
+def _summarise(df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Median fields, modal weather code and record count per group."""
+    if not keys:
+        stats = df[CLIMATE_FIELDS].median().to_frame().T
+        stats['weathercode'] = df['weathercode'].mode().iloc[0]
+        stats['count'] = len(df)
+        return stats
+    grouped = df.groupby(keys, observed=True)
+    stats = grouped[CLIMATE_FIELDS].median()
+    codes = (df.groupby(keys + ['weathercode'], observed=True).size()
+             .reset_index(name='n')
+             .sort_values(['n', 'weathercode'], ascending=[False, True])
+             .drop_duplicates(keys)
+             .set_index(keys)['weathercode'])
+    stats['weathercode'] = codes
+    stats['count'] = grouped.size()
+    return stats
+
+
+class ClimatologyTable:
+    """
+    Typical weather per State x Month x Hour.
+
+    Args:
+        states: State codes along the first axis
+    """
+
+    def __init__(self, states: Optional[List[str]] = None):
+        self.states = list(states or STATE_LIST)
+        shape = (len(self.states), 12, 24)
+        self.values = np.zeros(shape + (len(CLIMATE_FIELDS),), dtype=np.float32)
+        self.weathercodes = np.zeros(shape, dtype=np.int16)
+        self.counts = np.zeros(shape, dtype=np.int32)
+        self.detail = np.zeros(shape, dtype=np.int8)
+        self._index = {state: i for i, state in enumerate(self.states)}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, min_count: int = CLIMATOLOGY_MIN_COUNT,
+              states: Optional[List[str]] = None) -> 'ClimatologyTable':
+        """
+        Summarise weather-enriched records into a table.
+
+        Cells with fewer than min_count records take the state's figures for
+        that month, then the state's overall figures, then all states', so
+        every cell holds a usable estimate.
+
+        Args:
+            df: Records with DateTime, State, weathercode and CLIMATE_FIELDS
+            min_count: Minimum records for a level to be used
+            states: State codes to cover (defaults to STATE_LIST)
+
+        Returns:
+            ClimatologyTable
+        """
+        table = cls(states)
+        df = df[df['State'].isin(table.states)]
+        timestamps = pd.to_datetime(df['DateTime'])
+        df = df.assign(Month=timestamps.dt.month, Hour=timestamps.dt.hour)
+
+        grid = pd.MultiIndex.from_product(
+            [table.states, range(1, 13), range(24)], names=['State', 'Month', 'Hour']
+        ).to_frame(index=False)
+        exact = grid.merge(_summarise(df, ['State', 'Month', 'Hour']).reset_index(),
+                           on=['State', 'Month', 'Hour'], how='left')
+        table.counts[:] = exact['count'].fillna(0).to_numpy().reshape(table.counts.shape)
+
+        filled = pd.DataFrame(index=grid.index, columns=CLIMATE_FIELDS + ['weathercode'], dtype=float)
+        detail = np.full(len(grid), -1)
+        for level, keys in ((3, ['State', 'Month', 'Hour']), (2, ['State', 'Month']), (1, ['State']), (0, [])):
+            stats = _summarise(df, keys)
+            stats = stats[stats['count'] >= min_count] if level else stats
+            if keys:
+                level_stats = grid[keys].merge(stats.reset_index(), on=keys, how='left')
+            else:
+                level_stats = pd.DataFrame(np.repeat(stats.to_numpy(), len(grid), axis=0), columns=stats.columns)
+            todo = (detail < 0) & level_stats['count'].notna().to_numpy()
+            filled.loc[todo] = level_stats.loc[todo, CLIMATE_FIELDS + ['weathercode']].to_numpy()
+            detail[todo] = level
+
+        shape = table.counts.shape
+        table.values[:] = filled[CLIMATE_FIELDS].to_numpy(dtype=np.float32).reshape(shape + (len(CLIMATE_FIELDS),))
+        table.weathercodes[:] = filled['weathercode'].to_numpy().astype(np.int16).reshape(shape)
+        table.detail[:] = detail.reshape(shape)
+        return table
+
+    def lookup(self, state: str, month: int, hour: int) -> Optional[dict]:
+        """
+        Typical weather for a state, month and hour.
+
+        Args:
+            state: State code
+            month: Month (1-12)
+            hour: Hour of day (0-23)
+
+        Returns:
+            Weather dictionary in the live format (see
+            src.weather.parse_weather_values) with estimated=True, the number
+            of records in the exact cell and the detail it is based on, or
+            None for an unknown state
+        """
+        s = self._index.get(state)
+        if s is None:
+            return None
+        cell = (s, int(month) - 1, int(hour))
+        temperature, precipitation, snowfall, windspeed = self.values[cell].tolist()
+        return {
+            'temperature_f': round(temperature * 9/5 + 32, 1),
+            'temperature_c': round(temperature, 1),
+            'precipitation': precipitation,
+            'snowfall': snowfall,
+            'weathercode': int(self.weathercodes[cell]),
+            'windspeed': windspeed * KMH_TO_MPH,
+            'estimated': True,
+            'records': int(self.counts[cell]),
+            'based_on': DETAIL_LABELS[int(self.detail[cell])]
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the table's arrays."""
+        return self.values.nbytes + self.weathercodes.nbytes + self.counts.nbytes + self.detail.nbytes
+
+    # --- Storage ---
+    def save(self, path: Path = CLIMATOLOGY_PATH) -> None:
+        """Write the table to an .npz file atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(
+                f, values=self.values, weathercodes=self.weathercodes, counts=self.counts,
+                detail=self.detail, states=np.array(self.states), fields=np.array(CLIMATE_FIELDS)
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path = CLIMATOLOGY_PATH) -> Optional['ClimatologyTable']:
+        """
+        Load a saved table.
+
+        Returns:
+            ClimatologyTable, or None if the file does not exist
+        """
+        try:
+            with np.load(path) as data:
+                table = cls(data['states'].tolist())
+                table.values = data['values']
+                table.weathercodes = data['weathercodes']
+                table.counts = data['counts']
+                table.detail = data['detail']
+        except FileNotFoundError:
+            return None
+        return table
+
+
+def build_climatology(
+    paths: Sequence[Path],
+    out_path: Path = CLIMATOLOGY_PATH,
+    min_count: int = CLIMATOLOGY_MIN_COUNT
+) -> ClimatologyTable:
+    """
+    Build the climatology table from weather-enriched files and save it.
+
+    Args:
+        paths: CSV/Parquet files with DateTime, State, weathercode and weather columns
+        out_path: Table file
+        min_count: Minimum records per cell before rolling up
+
+    Returns:
+        The saved ClimatologyTable
+    """
+    from .training import read_table
+
+    columns = ['DateTime', 'State', 'weathercode'] + CLIMATE_FIELDS
+    df = pd.concat([read_table(p)[columns] for p in paths], ignore_index=True)
+    df = filter_by_states(remove_missing_weather(df))
+    table = ClimatologyTable.build(df, min_count)
+    table.save(out_path)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the weather climatology fallback table.")
+    parser.add_argument('--data', nargs='+', type=Path, required=True,
+                        help="Weather-enriched CSV/Parquet files")
+    parser.add_argument('--min-count', type=int, default=CLIMATOLOGY_MIN_COUNT,
+                        help="Minimum records per State x Month x Hour cell")
+    parser.add_argument('--out', type=Path, default=CLIMATOLOGY_PATH, help="Table file")
+    args = parser.parse_args()
+
+    table = build_climatology(args.data, args.out, args.min_count)
+    exact = (table.detail == 3).mean()
+    print(f"Wrote {args.out} ({table.nbytes / 1024:.0f} KB in memory); "
+          f"{exact:.0%} of cells from their own records, the rest rolled up")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""
+Model compression for the ABIA Traffic Accident Forecaster.
+
+Builds smaller candidates from the production forest (fewer trees, capped
+depth, larger leaves, or a small forest distilled from its probabilities)
+and measures each one's artifact size, load time, single-row latency,
+batch throughput and holdout AUC/Brier against the original, so a
+production model can be picked from one table.
+
+Usage:
+    python -m src.compression --data traffic_violations_with_detailed_weather.csv
+    python -m src.compression --data enriched.parquet --out compression.csv --publish depth-12
+"""
+
+import argparse
+import copy
+import os
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from typing import Dict, Optional, Sequence
+
+from .config import (
+    TARGET_COLUMN, RANDOM_STATE, TEST_SIZE, REGISTRY_DIR,
+    COMPRESSION_TREE_COUNTS, COMPRESSION_MAX_DEPTHS, COMPRESSION_MIN_SAMPLES_LEAF,
+    DISTILL_PARAMS, COMPRESSION_LATENCY_SAMPLES
+)
+from .encoding import encode_dense
+from .registry import ModelRegistry, publish_model
+from .training import evaluate_model, load_training_frame
+
+
+class DistilledClassifier:
+    """
+    Classifier interface over a regressor fitted to a teacher's probabilities.
+
+    Args:
+        regressor: Fitted regressor predicting the positive-class probability
+        classes: Class labels of the teacher model
+    """
+
+    def __init__(self, regressor, classes):
+        self.regressor = regressor
+        self.classes_ = np.asarray(classes)
+
+    def predict_proba(self, X) -> np.ndarray:
+        positive = np.clip(self.regressor.predict(X), 0.0, 1.0)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+    def set_params(self, **params) -> 'DistilledClassifier':
+        self.regressor.set_params(**params)
+        return self
+
+
+# --- Candidates ---
+def truncate_forest(model, n_trees: int):
+    """Copy of a fitted forest keeping only its first n_trees trees."""
+    smaller = copy.deepcopy(model)
+    smaller.estimators_ = smaller.estimators_[:n_trees]
+    smaller.set_params(n_estimators=len(smaller.estimators_))
+    return smaller
+
+
+def build_candidates(
+    model,
+    X_train: pd.DataFrame,
+    y_train: np.ndarray,
+    tree_counts: Sequence[int] = COMPRESSION_TREE_COUNTS,
+    max_depths: Sequence[int] = COMPRESSION_MAX_DEPTHS,
+    min_samples_leaf: Sequence[int] = COMPRESSION_MIN_SAMPLES_LEAF,
+    distill_params: Optional[dict] = DISTILL_PARAMS,
+    seed: int = RANDOM_STATE
+) -> Dict[str, object]:
+    """
+    Produce compressed alternatives to a fitted forest.
+
+    Fewer-tree candidates reuse the original's trees; capped-depth and
+    larger-leaf candidates are refitted with the original's other
+    hyperparameters; the distilled candidate is a small regression forest
+    fitted to out-of-bag probabilities. The original has seen the training
+    rows, so its own probabilities there are in-sample and overconfident.
+    Instead a copy with the original's hyperparameters is refitted with
+    oob_score=True, and each row's target comes from the trees that did not
+    sample it.
+
+    Args:
+        model: Fitted RandomForestClassifier
+        X_train: Encoded training rows
+        y_train: Training labels
+        tree_counts: Tree counts for truncated forests
+        max_depths: Depth caps for refitted forests
+        min_samples_leaf: Leaf sizes for refitted forests
+        distill_params: RandomForestRegressor parameters (None skips distillation)
+        seed: Random seed for refitted candidates
+
+    Returns:
+        Mapping of candidate name to fitted model, starting with 'original'
+    """
+    candidates = {'original': model}
+    n_trees = len(model.estimators_)
+    for count in tree_counts:
+        if count < n_trees:
+            candidates[f"trees-{count}"] = truncate_forest(model, count)
+
+    base_params = model.get_params()
+    base_params.update(random_state=seed, n_jobs=-1, warm_start=False)
+    for depth in max_depths:
+        params = dict(base_params, max_depth=depth)
+        candidates[f"depth-{depth}"] = type(model)(**params).fit(X_train, y_train)
+    for leaf in min_samples_leaf:
+        params = dict(base_params, min_samples_leaf=leaf)
+        candidates[f"leaf-{leaf}"] = type(model)(**params).fit(X_train, y_train)
+
+    if distill_params:
+        oob_forest = type(model)(**dict(base_params, bootstrap=True, oob_score=True)).fit(X_train, y_train)
+        teacher = oob_forest.oob_decision_function_[:, list(oob_forest.classes_).index(1)]
+        has_oob = ~np.isnan(teacher)  # Rows every tree sampled have no out-of-bag estimate
+        student = RandomForestRegressor(**distill_params, random_state=seed, n_jobs=-1).fit(
+            X_train[has_oob], teacher[has_oob]
+        )
+        candidates['distilled'] = DistilledClassifier(student, model.classes_)
+    return candidates
+
+
+# --- Measurement ---
+def measure_candidate(
+    model,
+    X_test: pd.DataFrame,
+    y_test: np.ndarray,
+    reference_proba: np.ndarray,
+    latency_samples: int = COMPRESSION_LATENCY_SAMPLES,
+    seed: int = RANDOM_STATE
+) -> dict:
+    """
+    Measure one candidate's cost and accuracy.
+
+    Latency and throughput are measured single-threaded (n_jobs=1), as a
+    serving process scoring one request at a time would run it.
+
+    Args:
+        model: Candidate classifier
+        X_test: Encoded holdout rows
+        y_test: Holdout labels
+        reference_proba: The original model's holdout probabilities
+        latency_samples: Number of single-row predictions to time
+        seed: Seed for choosing the timed rows
+
+    Returns:
+        Dictionary of size, load, latency, throughput and accuracy figures
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'model.pkl'
+        joblib.dump(model, path)
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        model = joblib.load(path)
+        load_seconds = time.perf_counter() - started
+    model.set_params(n_jobs=1)
+
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(X_test), size=latency_samples)
+    model.predict_proba(X_test.iloc[[0]])  # warm-up
+    latencies = []
+    for i in rows:
+        started = time.perf_counter()
+        model.predict_proba(X_test.iloc[[i]])
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    proba = model.predict_proba(X_test)[:, 1]
+    batch_seconds = time.perf_counter() - started
+
+    metrics = evaluate_model(model, X_test, y_test)
+    return {
+        'trees': len(getattr(model, 'regressor', model).estimators_),
+        'size_mb': size / 1024 ** 2,
+        'load_ms': load_seconds * 1000,
+        'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+        'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+        'rows_per_s': len(X_test) / batch_seconds,
+        'auc': metrics['auc'],
+        'brier': metrics['brier'],
+        'max_abs_diff': float(np.max(np.abs(proba - reference_proba))),
+        'mean_abs_diff': float(np.mean(np.abs(proba - reference_proba)))
+    }
+
+
+def compression_report(
+    model,
+    model_columns: pd.Index,
+    df: pd.DataFrame,
+    seed: int = RANDOM_STATE,
+    **candidate_kwargs
+):
+    """
+    Build and measure compression candidates for a model.
+
+    The holdout split matches src.training, so metrics are comparable with
+    the model's training report when run on the same data.
+
+    Args:
+        model: Fitted RandomForestClassifier
+        model_columns: Column names the model was trained on
+        df: Output of load_training_frame
+        seed: Random seed for the split and refitted candidates
+        **candidate_kwargs: Overrides for build_candidates
+
+    Returns:
+        Tuple of (report DataFrame indexed by candidate, candidate models)
+    """
+    X = pd.DataFrame(encode_dense(df, model_columns), columns=model_columns)
+    y = df[TARGET_COLUMN].to_numpy(dtype=np.int8)
+    train_idx, test_idx = train_test_split(
+        np.arange(len(y)), test_size=TEST_SIZE, stratify=y, random_state=seed
+    )
+    X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+    candidates = build_candidates(model, X_train, y[train_idx], seed=seed, **candidate_kwargs)
+
+    reference = model.predict_proba(X_test)[:, 1]
+    rows = {name: measure_candidate(candidate, X_test, y[test_idx], reference, seed=seed)
+            for name, candidate in candidates.items()}
+    report = pd.DataFrame.from_dict(rows, orient='index')
+    original = report.loc['original']
+    report['size_ratio'] = report['size_mb'] / original['size_mb']
+    report['auc_delta'] = report['auc'] - original['auc']
+    report['brier_delta'] = report['brier'] - original['brier']
+    return report, candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compressed variants of the current model.")
+    parser.add_argument('--data', nargs='+', type=Path, required=True,
+                        help="Weather-enriched CSV/Parquet files")
+    parser.add_argument('--states', nargs='+', default=None, help="States to evaluate on")
+    parser.add_argument('--out', type=Path, default=None, help="Write the table as CSV")
+    parser.add_argument('--publish', default=None,
+                        help="Publish this candidate to the registry (not made current)")
+    args = parser.parse_args()
+
+    handle = ModelRegistry(shards_dir=None).current()
+    if handle is None:
+        parser.error("No model found; train one with src.training first")
+
+    report, candidates = compression_report(handle.model, handle.model_columns,
+                                            load_training_frame(args.data, args.states))
+    columns = ['trees', 'size_mb', 'size_ratio', 'load_ms', 'p50_ms', 'p99_ms', 'rows_per_s',
+               'auc', 'auc_delta', 'brier', 'brier_delta', 'mean_abs_diff']
+    print(f"Base model: {handle.version}")
+    print(report[columns].to_string(float_format=lambda v: f"{v:.4g}"))
+    if args.out:
+        report.to_csv(args.out, index_label='candidate')
+
+    if args.publish:
+        if args.publish not in candidates:
+            parser.error(f"Unknown candidate {args.publish}; choose from {', '.join(candidates)}")
+        version = publish_model(
+            candidates[args.publish], handle.model_columns, registry_dir=REGISTRY_DIR,
+            metadata={'compression': {'base_version': handle.version, 'candidate': args.publish,
+                                      **report.loc[args.publish].to_dict()}},
+            make_current=False
+        )
+        print(f"Published {args.publish} as {version}; promote it with: python -m src.registry promote {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,29 @@
 Configuration constants and mappings for the ABIA Traffic Accident Forecaster.
 """
 
+import os
+from pathlib import Path
+
+# --- Paths ---
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MODELS_DIR = PROJECT_ROOT / 'models'
+MODEL_PATH = MODELS_DIR / 'accident_predictor_model.pkl'
+COLUMNS_PATH = MODELS_DIR / 'model_columns.pkl'
+DATA_DIR = PROJECT_ROOT / 'data'
+
 # --- Supported States ---
 STATE_LIST = ['DC', 'PA', 'FL', 'NC', 'NY', 'CA']
 
+# --- State Bounding Boxes: (lat_min, lat_max, lon_min, lon_max) ---
+STATE_BOUNDS = {
+    'DC': (38.79, 39.00, -77.12, -76.91),
+    'PA': (39.72, 42.27, -80.52, -74.69),
+    'FL': (24.40, 31.00, -87.63, -80.03),
+    'NC': (33.84, 36.59, -84.32, -75.46),
+    'NY': (40.50, 45.02, -79.76, -71.86),
+    'CA': (32.53, 42.01, -124.41, -114.13)
+}
+
 # --- Vehicle Type Mappings ---
 VEHICLE_MAP = {
     'Automobile': '02 - Automobile',
@@ -76,3 +96,273 @@ CATEGORICAL_FEATURES = [
     'DayOfWeek', 'Month', 'PartOfDay', 'WeatherCondition',
     'VehicleType', 'State', 'Gender'
 ]
+
+# Display names for model features (used when explaining predictions)
+FEATURE_LABELS = {
+    'temperature': 'Temperature',
+    'precipitation': 'Precipitation',
+    'snowfall': 'Snowfall',
+    'windspeed': 'Wind speed',
+    'Hour': 'Hour',
+    'DayOfWeek': 'Day of week',
+    'Month': 'Month',
+    'PartOfDay': 'Time of day',
+    'WeatherCondition': 'Weather',
+    'VehicleType': 'Vehicle type',
+    'State': 'State',
+    'Gender': 'Driver gender'
+}
+# Number of per-prediction factors shown in the app
+TOP_FACTORS = 5
+
+# --- Provider Endpoints ---
+PUBLIC_PROVIDER_URLS = {
+    'open_meteo': 'https://api.open-meteo.com',
+    'open_meteo_archive': 'https://archive-api.open-meteo.com',
+    'photon': 'https://photon.komoot.io',
+    'nominatim': 'https://nominatim.openstreetmap.org'
+}
+# ROADRISK_PROVIDER_STUB=http://127.0.0.1:8765 sends every provider to a local
+# src.provider_stub (at /<provider>); ROADRISK_<PROVIDER>_URL overrides one provider
+PROVIDER_STUB_URL = os.environ.get('ROADRISK_PROVIDER_STUB')
+PROVIDER_BASE_URLS = {
+    name: os.environ.get(
+        f"ROADRISK_{name.upper()}_URL",
+        f"{PROVIDER_STUB_URL.rstrip('/')}/{name}" if PROVIDER_STUB_URL else url
+    ).rstrip('/')
+    for name, url in PUBLIC_PROVIDER_URLS.items()
+}
+# Responses recorded by the stub in record mode, and served in replay mode
+CASSETTE_DIR = DATA_DIR / 'cassettes'
+PROVIDER_STUB_PORT = 8765
+
+# --- Weather API (Open-Meteo) ---
+OPEN_METEO_FORECAST_URL = PROVIDER_BASE_URLS['open_meteo'] + '/v1/forecast'
+WEATHER_FIELDS = 'temperature_2m,precipitation,snowfall,weather_code,wind_speed_10m'
+# Units requested for live/forecast weather (the feature transformer converts to °C and km/h)
+WEATHER_UNITS = {'temperature_unit': 'fahrenheit', 'wind_speed_unit': 'mph'}
+# Historical weather used to enrich training records (Celsius and km/h, as in the notebook)
+OPEN_METEO_ARCHIVE_URL = PROVIDER_BASE_URLS['open_meteo_archive'] + '/v1/archive'
+HISTORICAL_WEATHER_FIELDS = 'temperature_2m,precipitation,snowfall,weathercode,windspeed_10m'
+ENRICH_WORKERS = 10
+
+# --- Timezone ---
+DEFAULT_TIMEZONE = 'America/New_York'
+
+# --- Route Scoring ---
+# Distance between resampled route points, in kilometres
+ROUTE_SAMPLE_SPACING_KM = 5.0
+# Size of a weather grid cell in degrees; points in the same cell share one fetch
+WEATHER_GRID_DEG = 0.1
+
+# --- Risk Heatmap Tiles ---
+HEATMAP_DIR = DATA_DIR / 'heatmaps'
+HEATMAP_GRID_DEG = 0.25
+HEATMAP_HOURS = 6
+# Forecasts older than this (seconds) are refetched on refresh
+HEATMAP_WEATHER_TTL = 3600
+# Default (vehicle, gender) profiles scored for every cell and hour
+HEATMAP_PROFILES = [
+    ('Automobile', 'Male'),
+    ('Automobile', 'Female'),
+    ('Heavy Duty Truck', 'Male')
+]
+
+# --- Prediction Cache ---
+PREDICTION_CACHE_SIZE = 10000
+# Entry lifetime in seconds (None keeps entries until evicted)
+PREDICTION_CACHE_TTL = None
+# Quantization step per continuous weather feature, in model units
+WEATHER_QUANTIZATION = {
+    'temperature': 0.5,
+    'precipitation': 0.1,
+    'snowfall': 0.1,
+    'windspeed': 1.0
+}
+
+# --- Geocoding ---
+PHOTON_USER_AGENT = 'RoadRiskAI/1.0'
+NOMINATIM_USER_AGENT = 'RoadRiskAI/1.0 (roadrisk-ai.streamlit.app)'
+# Minimum seconds between requests to each provider, shared by every process on
+# the host (only applied to the public endpoints)
+GEOCODER_MIN_INTERVAL = {
+    'photon': 0.5,
+    'nominatim': 1.0
+}
+SUGGEST_DEBOUNCE_SECONDS = 0.35
+SUGGEST_CACHE_TTL = 3600
+SUGGEST_MIN_CHARS = 3
+
+# --- Location Prefetch ---
+# Weather/timezone fetched in the background when an address is selected
+PREFETCH_WORKERS = 4
+# Seconds a prefetched result is reused for the same location
+PREFETCH_TTL = 300
+# Longest the predict step waits for a prefetch still in flight
+PREFETCH_WAIT_SECONDS = 15
+
+# --- Outbound HTTP Providers ---
+# timeout: (connect, read) seconds; retries: extra attempts after the first;
+# deadline: seconds one call may take across all attempts and backoff sleeps;
+# fallback_max_age: oldest last-good result served when the provider fails
+HTTP_PROVIDERS = {
+    'open_meteo': {'timeout': (3.05, 10), 'retries': 2, 'deadline': 15},
+    'photon': {'timeout': (3.05, 10), 'retries': 1, 'deadline': 15, 'fallback_max_age': 7 * 24 * 3600},
+    'nominatim': {'timeout': (3.05, 15), 'retries': 1, 'deadline': 20, 'fallback_max_age': 7 * 24 * 3600},
+    'open_meteo_archive': {'timeout': (3.05, 20), 'retries': 3, 'deadline': 90}
+}
+HTTP_POOL_SIZE = 20
+HTTP_BACKOFF_BASE = 0.25
+HTTP_BACKOFF_MAX = 4.0
+# Consecutive failures that open a provider's circuit, and seconds before a retry probe
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30
+# Last successful responses kept per provider for circuit-open fallback
+HTTP_FALLBACK_ENTRIES = 512
+# Default oldest fallback result (seconds); older results are dropped, not served
+HTTP_FALLBACK_MAX_AGE = 3600
+# Default deadline (seconds) for one call including retries
+HTTP_DEADLINE_SECONDS = 15
+
+# --- Model Registry ---
+REGISTRY_DIR = MODELS_DIR / 'registry'
+# Seconds between checks of the registry's CURRENT pointer
+REGISTRY_POLL_SECONDS = 10
+# A CURRENT version that fails to load is retried with doubling back-off, up to this many seconds
+REGISTRY_RETRY_MAX_SECONDS = 600
+
+# --- Per-State Model Shards ---
+# Each state's shard is a registry directory: SHARDS_DIR/<STATE>/<version>/ + CURRENT
+SHARDS_DIR = MODELS_DIR / 'shards'
+MAX_RESIDENT_SHARDS = 8
+
+# --- Training ---
+TRAINING_CACHE_DIR = DATA_DIR / 'training_cache'
+TARGET_COLUMN = 'Accident'
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+CV_FOLDS = 3
+# Hyperparameter grid searched with cross-validation
+TRAINING_PARAM_GRID = {
+    'n_estimators': [100],
+    'max_depth': [None, 20],
+    'min_samples_leaf': [1, 5],
+    'class_weight': ['balanced']
+}
+
+# --- Parallel ETL ---
+# Rows per Parquet chunk (whole row groups are grouped up to this size) and
+# bytes per CSV chunk handed to each worker process
+ETL_CHUNK_ROWS = 250_000
+ETL_CHUNK_BYTES = 64 * 1024 * 1024
+# Worker counts compared by the scaling report
+ETL_SCALING_WORKERS = [1, 4, 16, 32]
+
+# --- Historical Weather Store ---
+# Hourly archive weather ingested from bulk dumps, for enrichment without the archive API
+WEATHER_STORE_DIR = DATA_DIR / 'weather_store'
+# A record takes the nearest stored cell within this distance (degrees); farther records get no weather
+WEATHER_STORE_MAX_DISTANCE_DEG = 0.1
+
+# --- Incremental Refresh ---
+# Cleaned, enriched and feature-engineered monthly partitions
+PARTITIONS_DIR = DATA_DIR / 'partitions'
+# Trees grown on each new batch of partitions
+REFRESH_NEW_TREES = 20
+# Keep at most this many trees, dropping the oldest (None keeps all)
+REFRESH_MAX_TREES = None
+
+# --- Model Compression ---
+# Candidate settings compared against the production forest
+COMPRESSION_TREE_COUNTS = [10, 25, 50]
+COMPRESSION_MAX_DEPTHS = [8, 12, 16]
+COMPRESSION_MIN_SAMPLES_LEAF = [20, 50]
+DISTILL_PARAMS = {'n_estimators': 20, 'max_depth': 12, 'min_samples_leaf': 20}
+# Single-row predictions timed per candidate
+COMPRESSION_LATENCY_SAMPLES = 200
+
+# --- Historical Accident Rates ---
+HISTORY_CUBE_PATH = DATA_DIR / 'history' / 'accident_cube.npz'
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# Minimum stops in a cell before its rate is shown; sparser cells roll up
+# over weather, then vehicle type
+HISTORY_MIN_COUNT = 30
+
+# --- Climatology Fallback ---
+CLIMATOLOGY_PATH = DATA_DIR / 'history' / 'climatology.npz'
+# Minimum records in a State x Month x Hour cell; sparser cells use the
+# state's monthly (then overall) typical weather
+CLIMATOLOGY_MIN_COUNT = 20
+# Seconds the predict step waits for live weather before estimating from
+# the climatology table
+LIVE_WEATHER_BUDGET = 1.0
+# How often an estimated result checks whether live weather has arrived
+ESTIMATE_UPGRADE_SECONDS = 2
+# Failed live fetches before an estimated result stops retrying and is shown
+# as "live weather unavailable"; the wait doubles after each failure
+ESTIMATE_UPGRADE_MAX_FAILURES = 5
+
+# --- What-If Sweep ---
+# Representative hour for each part of day (manual time selection and sweeps)
+PART_OF_DAY_HOURS = {'Morning': 9, 'Afternoon': 14, 'Evening': 19, 'Night': 23}
+
+# --- Prediction Audit Log ---
+AUDIT_LOG_DIR = DATA_DIR / 'audit'
+# Records held in memory waiting to be written
+AUDIT_QUEUE_SIZE = 10_000
+# Records per Parquet file (a partial batch is written after AUDIT_FLUSH_SECONDS)
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_SECONDS = 5.0
+# When the queue is full: 'drop' the new record, or 'block' the caller for
+# up to AUDIT_BLOCK_SECONDS before dropping it
+AUDIT_OVERFLOW = 'drop'
+AUDIT_BLOCK_SECONDS = 0.05
+
+# --- Drift Monitoring ---
+# Serving-side sketches are written here per model version and process
+DRIFT_DIR = DATA_DIR / 'drift'
+# Quantile bins per continuous feature in the training reference profile
+DRIFT_BINS = 20
+# Seconds between a serving process's sketch snapshots
+DRIFT_SNAPSHOT_SECONDS = 60
+# PSI above these levels is reported as 'warn' / 'alert'
+DRIFT_PSI_WARN = 0.1
+DRIFT_PSI_ALERT = 0.25
+# Live rows needed before a feature's scores are reported
+DRIFT_MIN_ROWS = 100
+# Features whose live mix follows the calendar (a month of traffic is all one
+# Month) rather than the inputs; scored but never warned or alerted on
+DRIFT_CALENDAR_FEATURES = ['Month', 'DayOfWeek']
+
+# --- Load Testing ---
+# Addresses simulated sessions search for, most popular first; picks follow
+# a Zipf distribution with this exponent, so a few locations are hot
+LOADTEST_ADDRESSES = [
+    ('100 N Tryon St, Charlotte', 'NC'),
+    ('1560 Broadway, New York', 'NY'),
+    ('1001 Ocean Dr, Miami Beach', 'FL'),
+    ('1600 Pennsylvania Ave NW, Washington', 'DC'),
+    ('1400 John F Kennedy Blvd, Philadelphia', 'PA'),
+    ('200 N Spring St, Los Angeles', 'CA'),
+    ('350 5th Ave, New York', 'NY'),
+    ('400 S Orange Ave, Orlando', 'FL'),
+    ('1 Dr Carlton B Goodlett Pl, San Francisco', 'CA'),
+    ('1 E Edenton St, Raleigh', 'NC'),
+    ('414 Grant St, Pittsburgh', 'PA'),
+    ('1 1st St NE, Washington', 'DC')
+]
+LOADTEST_ZIPF_EXPONENT = 1.1
+# Mean seconds a simulated user spends on each step (exponentially distributed)
+LOADTEST_THINK_SECONDS = 5.0
+LOADTEST_DURATION_SECONDS = 60
+# A concurrency level counts toward capacity if the predict step's p95 (ms)
+# and the session error rate stay within these
+LOADTEST_P95_TARGET_MS = 1500
+LOADTEST_MAX_ERROR_RATE = 0.01
+
+# --- Demo Scenario Checks ---
+# Reference cases from DEMO_SCENARIOS.md with pinned weather and expected probability bands
+DEMO_SCENARIOS_PATH = PROJECT_ROOT / 'scenarios' / 'demo_scenarios.json'
+# Timed scoring runs per scenario, and the p95 (ms) each must stay within
+DEMO_SCENARIO_REPEATS = 50
+DEMO_SCENARIO_P95_MS = 250
@@ -0,0 +1,327 @@
+"""
+Input drift monitoring for the ABIA Traffic Accident Forecaster.
+
+Contains fixed-size sketches of the model's serving inputs and the
+scores that compare them with the training data. At training time a
+reference profile is built: quantile bin edges and counts for each
+continuous feature, and level counts for each categorical one. It is
+stored in the model version's metadata. Serving processes then count live
+inputs into the same bins. Each update is a bin lookup and an increment,
+memory does not grow with traffic, and sketches from several processes
+merge by adding their counts.
+
+Usage:
+    python -m src.drift report [--version V]            (merge process snapshots, print scores)
+    python -m src.drift reference --data enriched.csv [--version V]
+"""
+
+import argparse
+import atexit
+import bisect
+import json
+import math
+import os
+import socket
+import threading
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .config import (
+    MODEL_FEATURES, CATEGORICAL_FEATURES, REGISTRY_DIR,
+    DRIFT_DIR, DRIFT_BINS, DRIFT_SNAPSHOT_SECONDS, DRIFT_PSI_WARN, DRIFT_PSI_ALERT, DRIFT_MIN_ROWS,
+    DRIFT_CALENDAR_FEATURES
+)
+
+# Bucket for categorical levels not seen in training
+OTHER_LEVEL = '__other__'
+
+# Added to empty bins so PSI stays finite
+PSI_EPSILON = 1e-4
+
+
+# --- Reference Profile ---
+def build_reference_profile(
+    df: pd.DataFrame,
+    features: Sequence[str] = MODEL_FEATURES,
+    bins: int = DRIFT_BINS
+) -> dict:
+    """
+    Summarise training inputs into a reference profile.
+
+    Args:
+        df: Training rows with the feature columns
+        features: Features to profile
+        bins: Quantile bins per continuous feature
+
+    Returns:
+        JSON-serialisable profile: bin edges and counts per continuous
+        feature, levels and counts per categorical feature
+    """
+    profile = {'rows': int(len(df)), 'continuous': {}, 'categorical': {}}
+    for feature in features:
+        if feature in CATEGORICAL_FEATURES:
+            counts = df[feature].astype(str).value_counts().sort_index()
+            profile['categorical'][feature] = {
+                'levels': counts.index.tolist(),
+                'counts': counts.astype(int).tolist() + [0]  # Last entry: OTHER_LEVEL
+            }
+        else:
+            values = df[feature].to_numpy(dtype=float)
+            quantiles = np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1])
+            edges = np.unique(quantiles).tolist()
+            counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+            profile['continuous'][feature] = {'edges': edges, 'counts': counts.tolist()}
+    return profile
+
+
+def extend_reference_profile(profile: dict, df: pd.DataFrame) -> dict:
+    """
+    Add new training rows to a profile, keeping its bins (e.g. after an incremental refresh).
+
+    Args:
+        profile: Profile from build_reference_profile
+        df: New training rows
+
+    Returns:
+        New profile with the rows counted in
+    """
+    monitor = DriftMonitor(profile, snapshot_dir=None)
+    monitor.update_batch(df)
+    extended = json.loads(json.dumps(profile))
+    extended['rows'] += len(df)
+    for kind in ('continuous', 'categorical'):
+        for feature, spec in extended[kind].items():
+            spec['counts'] = [a + b for a, b in zip(spec['counts'], monitor.counts[feature])]
+    return extended
+
+
+# --- Scores ---
+def psi(expected: Sequence[float], actual: Sequence[float]) -> float:
+    """Population stability index between two count vectors over the same bins."""
+    p = np.asarray(expected, dtype=float)
+    q = np.asarray(actual, dtype=float)
+    p = np.maximum(p / max(p.sum(), 1), PSI_EPSILON)
+    q = np.maximum(q / max(q.sum(), 1), PSI_EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def binned_ks(expected: Sequence[float], actual: Sequence[float]) -> float:
+    """Kolmogorov-Smirnov statistic evaluated at the bin edges."""
+    p = np.cumsum(expected, dtype=float)
+    q = np.cumsum(actual, dtype=float)
+    return float(np.max(np.abs(p / max(p[-1], 1) - q / max(q[-1], 1))))
+
+
+class DriftMonitor:
+    """
+    Streaming sketches of serving inputs over a reference profile's bins.
+
+    Args:
+        reference: Profile from build_reference_profile
+        version: Model version the profile belongs to (names snapshots)
+        snapshot_dir: Directory for this process's snapshots, written periodically
+            and at exit (None disables them)
+        snapshot_seconds: Seconds between snapshots
+    """
+
+    def __init__(
+        self,
+        reference: dict,
+        version: str = 'unknown',
+        snapshot_dir: Optional[Path] = DRIFT_DIR,
+        snapshot_seconds: float = DRIFT_SNAPSHOT_SECONDS
+    ):
+        self.reference = reference
+        self.version = version
+        self._edges = {f: spec['edges'] for f, spec in reference['continuous'].items()}
+        self._levels = {f: {level: i for i, level in enumerate(spec['levels'])}
+                        for f, spec in reference['categorical'].items()}
+        self.counts: Dict[str, List[int]] = {
+            **{f: [0] * (len(edges) + 1) for f, edges in self._edges.items()},
+            **{f: [0] * (len(levels) + 1) for f, levels in self._levels.items()}
+        }
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._snapshot_path = None
+        if snapshot_dir is not None:
+            name = f"{socket.gethostname()}-{os.getpid()}.json"
+            self._snapshot_path = Path(snapshot_dir) / version / name
+            atexit.register(self.save_snapshot)
+        self.snapshot_seconds = snapshot_seconds
+        self._last_snapshot = time.monotonic()
+
+    def update(self, row: dict) -> None:
+        """
+        Count one serving input row (raw feature values, before encoding).
+
+        Args:
+            row: Mapping of feature name to value; missing features are skipped
+        """
+        with self._lock:
+            for feature, edges in self._edges.items():
+                value = row.get(feature)
+                if value is not None and value == value:
+                    self.counts[feature][bisect.bisect_right(edges, value)] += 1
+            for feature, levels in self._levels.items():
+                if feature in row:
+                    self.counts[feature][levels.get(str(row[feature]), len(levels))] += 1
+            self.rows += 1
+            due = (self._snapshot_path is not None
+                   and time.monotonic() - self._last_snapshot >= self.snapshot_seconds)
+        if due:
+            self.save_snapshot()
+
+    def update_batch(self, df: pd.DataFrame) -> None:
+        """Count a batch of serving input rows (e.g. a route or sweep) in one pass."""
+        with self._lock:
+            for feature, edges in self._edges.items():
+                if feature in df:
+                    values = df[feature].to_numpy(dtype=float)
+                    values = values[~np.isnan(values)]
+                    bins = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+                    self.counts[feature] = (np.asarray(self.counts[feature]) + bins).tolist()
+            for feature, levels in self._levels.items():
+                if feature in df:
+                    codes = pd.Index(list(levels)).get_indexer(df[feature].astype(str))
+                    codes[codes < 0] = len(levels)
+                    bins = np.bincount(codes, minlength=len(levels) + 1)
+                    self.counts[feature] = (np.asarray(self.counts[feature]) + bins).tolist()
+            self.rows += len(df)
+
+    # --- Merging ---
+    def state(self) -> dict:
+        """JSON-serialisable sketch counts."""
+        with self._lock:
+            return {'version': self.version, 'rows': self.rows,
+                    'counts': {f: list(c) for f, c in self.counts.items()}}
+
+    def merge(self, state: dict) -> None:
+        """Add another process's sketch counts (from state()) into this monitor."""
+        with self._lock:
+            for feature, counts in state['counts'].items():
+                if feature in self.counts and len(counts) == len(self.counts[feature]):
+                    self.counts[feature] = [a + b for a, b in zip(self.counts[feature], counts)]
+            self.rows += state['rows']
+
+    def save_snapshot(self) -> None:
+        """Write this process's counts atomically so other processes can merge them."""
+        state = self.state()
+        path = self._snapshot_path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + '.tmp')
+            tmp.write_text(json.dumps(state))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Error saving drift snapshot: {e}")
+        self._last_snapshot = time.monotonic()
+
+    # --- Report ---
+    def report(self, min_rows: int = DRIFT_MIN_ROWS) -> pd.DataFrame:
+        """
+        Score every feature's live distribution against the reference.
+
+        Calendar features (DRIFT_CALENDAR_FEATURES) are compared with the
+        whole training year, so any window shorter than that differs from
+        it by construction; they are scored for reference with status
+        'calendar' and never warn or alert.
+
+        Args:
+            min_rows: Live rows needed for a feature to be scored
+
+        Returns:
+            DataFrame indexed by feature with rows, psi, ks (continuous
+            features only) and status ('ok', 'warn', 'alert', 'calendar'
+            or 'too few rows')
+        """
+        rows = []
+        with self._lock:
+            counts = {f: list(c) for f, c in self.counts.items()}
+        for feature, live in counts.items():
+            kind = 'continuous' if feature in self._edges else 'categorical'
+            expected = self.reference[kind][feature]['counts']
+            n = sum(live)
+            score = psi(expected, live) if n else math.nan
+            if n < min_rows:
+                status = 'too few rows'
+            elif feature in DRIFT_CALENDAR_FEATURES:
+                status = 'calendar'
+            elif score >= DRIFT_PSI_ALERT:
+                status = 'alert'
+            elif score >= DRIFT_PSI_WARN:
+                status = 'warn'
+            else:
+                status = 'ok'
+            rows.append({
+                'feature': feature,
+                'kind': kind,
+                'rows': n,
+                'psi': score,
+                'ks': binned_ks(expected, live) if kind == 'continuous' and n else math.nan,
+                'status': status
+            })
+        return pd.DataFrame(rows).set_index('feature')
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the counts (fixed by the reference's bins)."""
+        return sum(len(c) for c in self.counts.values()) * 8
+
+
+def load_snapshots(reference: dict, version: str, snapshot_dir: Path = DRIFT_DIR) -> DriftMonitor:
+    """
+    Merge every process's saved snapshot for a model version.
+
+    Args:
+        reference: The version's reference profile
+        version: Model version
+        snapshot_dir: Root snapshot directory
+
+    Returns:
+        DriftMonitor holding the combined counts
+    """
+    monitor = DriftMonitor(reference, version, snapshot_dir=None)
+    for path in sorted((Path(snapshot_dir) / version).glob('*.json')):
+        monitor.merge(json.loads(path.read_text()))
+    return monitor
+
+
+def main():
+    from .registry import get_current_version, load_version_metadata, update_version_metadata
+
+    parser = argparse.ArgumentParser(description="Serving input drift against the training data.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    report_parser = sub.add_parser('report', help="Merge serving snapshots and print drift scores")
+    report_parser.add_argument('--version', default=None, help="Model version (defaults to CURRENT)")
+    report_parser.add_argument('--min-rows', type=int, default=DRIFT_MIN_ROWS)
+    ref_parser = sub.add_parser('reference', help="Store a reference profile for an existing version")
+    ref_parser.add_argument('--data', nargs='+', type=Path, required=True,
+                            help="The weather-enriched files the version was trained on")
+    ref_parser.add_argument('--states', nargs='+', default=None, help="States the version was trained on")
+    ref_parser.add_argument('--version', default=None, help="Model version (defaults to CURRENT)")
+    args = parser.parse_args()
+
+    version = args.version or get_current_version(REGISTRY_DIR)
+    if version is None:
+        parser.error("No model version found; train one with src.training first")
+
+    if args.command == 'reference':
+        from .training import load_training_frame
+        profile = build_reference_profile(load_training_frame(args.data, args.states))
+        update_version_metadata(version, {'drift_reference': profile}, REGISTRY_DIR)
+        print(f"Stored a reference profile of {profile['rows']} rows for {version}")
+        return
+
+    reference = load_version_metadata(version, REGISTRY_DIR).get('drift_reference')
+    if reference is None:
+        parser.error(f"{version} has no reference profile; create one with: python -m src.drift reference")
+    monitor = load_snapshots(reference, version)
+    print(f"Model {version}: {monitor.rows} live rows vs {reference['rows']} training rows")
+    print(monitor.report(args.min_rows).to_string(float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Feature encoding for the ABIA Traffic Accident Forecaster.
+
+Contains a one-hot encoder that produces the same columns as the notebook's
+pd.get_dummies(drop_first=True) encoding, but writes straight into a
+preallocated numeric matrix (or a sparse CSR matrix) from integer
+category codes.
+
+Usage: python -m src.encoding --data enriched.csv   (dense vs sparse memory report)
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import MODEL_FEATURES, CATEGORICAL_FEATURES
+
+
+def build_model_columns(df: pd.DataFrame) -> pd.Index:
+    """
+    Derive the encoded column list from training data.
+
+    Matches pd.get_dummies(df[MODEL_FEATURES], columns=CATEGORICAL_FEATURES,
+    drop_first=True): numeric features first, then one column per
+    non-baseline level of each categorical feature in sorted order.
+
+    Args:
+        df: DataFrame with MODEL_FEATURES columns
+
+    Returns:
+        Column index for the design matrix
+    """
+    columns = [f for f in MODEL_FEATURES if f not in CATEGORICAL_FEATURES]
+    for feature in CATEGORICAL_FEATURES:
+        levels = sorted(df[feature].dropna().unique())
+        columns.extend(f"{feature}_{level}" for level in levels[1:])
+    return pd.Index(columns)
+
+
+def category_layout(model_columns: pd.Index) -> Tuple[List[Tuple[str, int]], Dict[str, Tuple[pd.Index, np.ndarray]]]:
+    """
+    Work out where each feature lands in the encoded matrix.
+
+    Args:
+        model_columns: Column index of the design matrix
+
+    Returns:
+        Tuple of (list of (numeric feature, column position), mapping of
+        categorical feature to (level names, column positions))
+    """
+    positions = {name: i for i, name in enumerate(model_columns)}
+    numeric = [(f, positions[f]) for f in MODEL_FEATURES if f in positions]
+    categorical = {}
+    for feature in CATEGORICAL_FEATURES:
+        prefix = f"{feature}_"
+        names = [c for c in model_columns if c.startswith(prefix)]
+        categorical[feature] = (
+            pd.Index([c[len(prefix):] for c in names]),
+            np.array([positions[c] for c in names], dtype=np.int64)
+        )
+    return numeric, categorical
+
+
+def category_codes(values: pd.Series, levels: pd.Index) -> np.ndarray:
+    """
+    Map raw categorical values to level positions (-1 for baseline or unseen).
+
+    Args:
+        values: Raw feature values
+        levels: Level names as they appear in model column names
+
+    Returns:
+        Integer code per value
+    """
+    return levels.get_indexer(values.astype(str))
+
+
+def encode_dense(
+    df: pd.DataFrame,
+    model_columns: pd.Index,
+    dtype=np.float32,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    One-hot encode raw feature rows into a dense matrix.
+
+    Levels not present in model_columns (the drop_first baseline or values
+    unseen in training) encode as all zeros, as with get_dummies + reindex.
+
+    Args:
+        df: DataFrame with MODEL_FEATURES columns
+        model_columns: Column index of the design matrix
+        dtype: Output dtype
+        out: Optional preallocated (len(df), len(model_columns)) array,
+            e.g. a memory-mapped file, to fill in place
+
+    Returns:
+        Encoded matrix
+    """
+    if out is None:
+        out = np.zeros((len(df), len(model_columns)), dtype=dtype)
+    else:
+        out[:] = 0
+
+    numeric, categorical = category_layout(model_columns)
+    for feature, position in numeric:
+        out[:, position] = df[feature].to_numpy(dtype=float)
+
+    rows = np.arange(len(df))
+    for feature, (levels, positions) in categorical.items():
+        if feature not in df.columns or len(levels) == 0:
+            continue
+        codes = category_codes(df[feature], levels)
+        known = codes >= 0
+        out[rows[known], positions[codes[known]]] = 1
+    return out
+
+
+def encode_sparse(df: pd.DataFrame, model_columns: pd.Index, dtype=np.float32) -> sp.csr_matrix:
+    """
+    One-hot encode raw feature rows into a CSR matrix.
+
+    Produces the same values and column order as encode_dense, storing only
+    non-zero entries: at most one per numeric feature and one per
+    categorical feature per row.
+
+    Args:
+        df: DataFrame with MODEL_FEATURES columns
+        model_columns: Column index of the design matrix
+        dtype: Value dtype
+
+    Returns:
+        Sparse matrix of shape (len(df), len(model_columns))
+    """
+    n_rows = len(df)
+    numeric, categorical = category_layout(model_columns)
+    rows, cols, values = [], [], []
+
+    for feature, position in numeric:
+        column = df[feature].to_numpy(dtype=float)
+        nonzero = np.flatnonzero(column != 0)
+        rows.append(nonzero)
+        cols.append(np.full(len(nonzero), position, dtype=np.int64))
+        values.append(column[nonzero])
+
+    for feature, (levels, positions) in categorical.items():
+        if feature not in df.columns or len(levels) == 0:
+            continue
+        codes = category_codes(df[feature], levels)
+        known = np.flatnonzero(codes >= 0)
+        rows.append(known)
+        cols.append(positions[codes[known]])
+        values.append(np.ones(len(known)))
+
+    matrix = sp.coo_matrix(
+        (np.concatenate(values).astype(dtype), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, len(model_columns))
+    )
+    return matrix.tocsr()
+
+
+def sparse_nbytes(matrix: sp.csr_matrix) -> int:
+    """Bytes held by a CSR matrix's data, indices and indptr arrays."""
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def encoding_memory_report(df: pd.DataFrame, model_columns: Optional[pd.Index] = None) -> dict:
+    """
+    Compare memory of the dense and sparse encodings of a dataset.
+
+    Args:
+        df: DataFrame with MODEL_FEATURES columns
+        model_columns: Column layout (derived from df if None)
+
+    Returns:
+        Dictionary with rows, columns, get_dummies_bytes (the notebook's
+        DataFrame), dense_float32_bytes, sparse_bytes, density and
+        savings relative to both dense forms
+    """
+    if model_columns is None:
+        model_columns = build_model_columns(df)
+    dummies = pd.get_dummies(df[MODEL_FEATURES], columns=CATEGORICAL_FEATURES, drop_first=True)
+    dummies_bytes = int(dummies.memory_usage(deep=True, index=False).sum())
+    dense_bytes = len(df) * len(model_columns) * np.dtype(np.float32).itemsize
+    sparse = encode_sparse(df, model_columns)
+    sparse_bytes = sparse_nbytes(sparse)
+    return {
+        'rows': len(df),
+        'columns': len(model_columns),
+        'density': sparse.nnz / max(len(df) * len(model_columns), 1),
+        'get_dummies_bytes': dummies_bytes,
+        'dense_float32_bytes': dense_bytes,
+        'sparse_bytes': sparse_bytes,
+        'saving_vs_get_dummies': 1 - sparse_bytes / dummies_bytes if dummies_bytes else 0.0,
+        'saving_vs_dense_float32': 1 - sparse_bytes / dense_bytes if dense_bytes else 0.0
+    }
+
+
+def main():
+    from .training import load_training_frame
+
+    parser = argparse.ArgumentParser(description="Report dense vs sparse encoding memory.")
+    parser.add_argument('--data', nargs='+', type=Path, required=True,
+                        help="Weather-enriched CSV/Parquet files")
+    args = parser.parse_args()
+
+    report = encoding_memory_report(load_training_frame(args.data))
+    mb = 1024 ** 2
+    print(f"{report['rows']} rows x {report['columns']} columns, density {report['density']:.3f}")
+    print(f"get_dummies DataFrame: {report['get_dummies_bytes'] / mb:10.1f} MB")
+    print(f"Dense float32 matrix:  {report['dense_float32_bytes'] / mb:10.1f} MB")
+    print(f"Sparse CSR matrix:     {report['sparse_bytes'] / mb:10.1f} MB "
+          f"({report['saving_vs_get_dummies']:.0%} smaller than get_dummies, "
+          f"{report['saving_vs_dense_float32']:.0%} smaller than dense float32)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+Parallel feature engineering for the ABIA Traffic Accident Forecaster.
+
+Contains an executor that splits raw violation records into chunks and runs
+clean -> filter -> features on each chunk in a process pool. A chunk is one
+file of a partitioned directory (e.g. one file per state or month), a run of
+whole row groups of a Parquet file, or a newline-aligned byte range of a CSV
+file. Workers read their own chunk from disk and write their output as a
+Parquet part, so no DataFrames are pickled between processes. The parts are
+then concatenated in input order, so the output does not depend on the
+number of workers.
+
+Usage:
+    python -m src.etl --input raw/ --out data/features.parquet --workers 16
+    python -m src.etl --input raw/violations.parquet --out data/features.parquet --scaling 1 4 16 32
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import shutil
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from .config import ETL_CHUNK_ROWS, ETL_CHUNK_BYTES, ETL_SCALING_WORKERS, WEATHER_STORE_DIR
+from .data_processing import clean_traffic_data, filter_by_states, remove_missing_weather
+from .transformer import ENRICHED_COLUMNS, FeatureTransformer, records_from_enriched
+from .weather_store import WeatherStore
+
+INPUT_SUFFIXES = ('.csv', '.parquet')
+# Raw columns read as numbers; every other column is read as text, so that
+# chunks parsed separately agree on their types (a Model column can be all
+# digits in one chunk and not in the next)
+NUMERIC_COLUMNS = (
+    'Latitude', 'Longitude', 'temperature', 'precipitation', 'snowfall', 'weathercode', 'windspeed'
+)
+
+# Model features that need no weather (all a chunk without weather gets)
+TIME_FEATURES = ['Hour', 'DayOfWeek', 'Month', 'PartOfDay']
+
+# Weather stores opened by this worker process, by directory
+_stores = {}
+
+
+# --- Chunk Planning ---
+def list_inputs(paths: Sequence[Path]) -> List[Path]:
+    """Expand directories into their CSV/Parquet files (sorted), keeping the given order otherwise."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.suffix in INPUT_SUFFIXES))
+        else:
+            files.append(path)
+    return files
+
+
+def _parquet_chunks(path: Path, chunk_rows: int) -> List[dict]:
+    """Group consecutive row groups into chunks of about chunk_rows rows."""
+    metadata = pq.ParquetFile(path).metadata
+    chunks, groups, rows = [], [], 0
+    for i in range(metadata.num_row_groups):
+        groups.append(i)
+        rows += metadata.row_group(i).num_rows
+        if rows >= chunk_rows:
+            chunks.append({'path': str(path), 'row_groups': groups})
+            groups, rows = [], 0
+    if groups or not chunks:
+        chunks.append({'path': str(path), 'row_groups': groups})
+    return chunks
+
+
+def _csv_chunks(path: Path, chunk_bytes: int) -> List[dict]:
+    """
+    Split a CSV file into byte ranges that start and end on line boundaries.
+
+    Assumes no quoted field contains a newline, as in the raw violation exports.
+    """
+    size = path.stat().st_size
+    chunks = []
+    with open(path, 'rb') as f:
+        f.readline()  # Header, re-read by every chunk
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            chunks.append({'path': str(path), 'byte_range': (start, end)})
+            start = end
+    return chunks or [{'path': str(path), 'byte_range': (size, size)}]
+
+
+def plan_chunks(
+    paths: Sequence[Path],
+    chunk_rows: int = ETL_CHUNK_ROWS,
+    chunk_bytes: int = ETL_CHUNK_BYTES
+) -> List[dict]:
+    """
+    Split input files into worker-sized chunks, in input order.
+
+    Args:
+        paths: Files or directories of raw violation records (CSV or Parquet)
+        chunk_rows: Target rows per Parquet chunk
+        chunk_bytes: Target bytes per CSV chunk
+
+    Returns:
+        List of chunk descriptions (path plus row_groups or byte_range), numbered by 'index'
+    """
+    chunks = []
+    for path in list_inputs(paths):
+        if path.suffix == '.parquet':
+            chunks.extend(_parquet_chunks(path, chunk_rows))
+        else:
+            chunks.extend(_csv_chunks(path, chunk_bytes))
+    for i, chunk in enumerate(chunks):
+        chunk['index'] = i
+    return chunks
+
+
+def raw_dtypes(columns: Sequence[str]) -> dict:
+    """Fixed dtypes for raw columns: float64 for NUMERIC_COLUMNS, text for the rest."""
+    return {c: 'float64' if c in NUMERIC_COLUMNS else 'str' for c in columns}
+
+
+def read_chunk(chunk: dict) -> pd.DataFrame:
+    """
+    Read one chunk's raw records with the dtypes from raw_dtypes.
+
+    Types are fixed up front rather than inferred per chunk, so every part
+    has the same schema and the parts can be concatenated.
+    """
+    if 'row_groups' in chunk:
+        df = pq.ParquetFile(chunk['path']).read_row_groups(chunk['row_groups']).to_pandas()
+        return df.astype(raw_dtypes(df.columns))
+    start, end = chunk['byte_range']
+    with open(chunk['path'], 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        body = f.read(end - start)
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns
+    return pd.read_csv(io.BytesIO(header + body), dtype=raw_dtypes(columns))
+
+
+# --- Workers ---
+def transform_chunk(
+    df: pd.DataFrame,
+    states: Optional[List[str]] = None,
+    weather_store: Optional[WeatherStore] = None
+) -> pd.DataFrame:
+    """
+    Clean, filter and featurize raw records.
+
+    Features come from the same FeatureTransformer rules as training and
+    serving. Records that already carry historical weather (a weathercode
+    column), or that get it from a local weather store, get the full model
+    features. Records without weather get time features only and are meant
+    to be enriched afterwards.
+
+    Args:
+        df: Raw violation records (notebook schema)
+        states: States to keep (defaults to STATE_LIST)
+        weather_store: Local store of ingested archive dumps to enrich from
+
+    Returns:
+        Processed DataFrame
+    """
+    df = filter_by_states(clean_traffic_data(df), states)
+    if 'weathercode' not in df.columns and weather_store is not None:
+        df = weather_store.enrich(df)
+    if 'weathercode' in df.columns:
+        df = remove_missing_weather(df)
+        return df.assign(**FeatureTransformer().features(records_from_enriched(df)))
+    records = records_from_enriched(df).reindex(columns=list(ENRICHED_COLUMNS.values()))
+    return df.assign(**FeatureTransformer().features(records)[TIME_FEATURES])
+
+
+def _open_store(store_dir: Optional[str]) -> Optional[WeatherStore]:
+    """The worker's weather store (memory-mapped once per process)."""
+    if store_dir is None:
+        return None
+    if store_dir not in _stores:
+        _stores[store_dir] = WeatherStore.load(store_dir)
+    return _stores[store_dir]
+
+
+def _process_chunk(task: dict) -> dict:
+    """Process one chunk in a worker and write it as a Parquet part."""
+    started = time.perf_counter()
+    raw = read_chunk(task)
+    df = transform_chunk(raw, task['states'], _open_store(task['weather_store']))
+    if task['columns']:
+        df = df[task['columns']]
+    target = Path(task['parts_dir']) / f"part-{task['index']:06d}.parquet"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), target)
+    return {
+        'index': task['index'],
+        'path': str(target),
+        'rows_in': len(raw),
+        'rows_out': len(df),
+        'seconds': time.perf_counter() - started
+    }
+
+
+# --- Executor ---
+def concatenate_parts(parts: Sequence[Path], out_path: Path) -> None:
+    """Stream Parquet parts into one file in the given order (written atomically)."""
+    schemas = [pq.read_schema(p) for p in parts]
+    schema = pa.unify_schemas(schemas, promote_options='permissive')
+    out_path = Path(out_path)
+    staging = out_path.with_name(out_path.name + '.tmp')
+    with pq.ParquetWriter(staging, schema) as writer:
+        for part in parts:
+            writer.write_table(pq.read_table(part).select(schema.names).cast(schema))
+    os.replace(staging, out_path)
+
+
+def run_etl(
+    paths: Sequence[Path],
+    out_path: Path,
+    max_workers: Optional[int] = None,
+    states: Optional[List[str]] = None,
+    columns: Optional[List[str]] = None,
+    chunk_rows: int = ETL_CHUNK_ROWS,
+    chunk_bytes: int = ETL_CHUNK_BYTES,
+    weather_store: Optional[Path] = None
+) -> dict:
+    """
+    Clean, filter and featurize raw records in parallel into one Parquet file.
+
+    Args:
+        paths: Files or directories of raw violation records
+        out_path: Output Parquet file
+        max_workers: Worker processes (defaults to the CPU count)
+        states: States to keep (defaults to STATE_LIST)
+        columns: Output columns (defaults to every column produced)
+        chunk_rows: Target rows per Parquet chunk
+        chunk_bytes: Target bytes per CSV chunk
+        weather_store: Directory of a local weather store to enrich records
+            that have no weather columns
+
+    Returns:
+        Report with chunks, workers, rows_in, rows_out and seconds (total,
+        chunk work summed over workers, concatenation)
+    """
+    started = time.perf_counter()
+    max_workers = max_workers or os.cpu_count() or 1
+    chunks = plan_chunks(paths, chunk_rows, chunk_bytes)
+    if not chunks:
+        raise FileNotFoundError("No CSV or Parquet input files found")
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    parts_dir = out_path.with_name(out_path.name + '.parts')
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    parts_dir.mkdir()
+    if weather_store is not None and WeatherStore.load(weather_store) is None:
+        raise FileNotFoundError(f"No weather store at {weather_store}")
+    store_dir = str(weather_store) if weather_store is not None else None
+    tasks = [
+        dict(chunk, states=states, columns=columns, parts_dir=str(parts_dir), weather_store=store_dir)
+        for chunk in chunks
+    ]
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_process_chunk, tasks))  # In chunk order
+        processed = time.perf_counter()
+        concatenate_parts([r['path'] for r in results], out_path)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    return {
+        'chunks': len(chunks),
+        'workers': max_workers,
+        'rows_in': sum(r['rows_in'] for r in results),
+        'rows_out': sum(r['rows_out'] for r in results),
+        'seconds': {
+            'total': time.perf_counter() - started,
+            'chunk_work': sum(r['seconds'] for r in results),
+            'concatenate': time.perf_counter() - processed
+        }
+    }
+
+
+def output_fingerprint(path: Path) -> str:
+    """Content hash of an output file (equal outputs hash equally regardless of row groups)."""
+    frame = pq.read_table(path).to_pandas()
+    return hashlib.sha1(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def scaling_report(
+    paths: Sequence[Path],
+    out_path: Path,
+    worker_counts: Sequence[int] = ETL_SCALING_WORKERS,
+    **etl_kwargs
+) -> pd.DataFrame:
+    """
+    Time the same job at several worker counts.
+
+    Args:
+        paths: Files or directories of raw violation records
+        out_path: Output Parquet file (rewritten by every run)
+        worker_counts: Worker counts to compare; the first is the baseline
+        **etl_kwargs: Extra arguments for run_etl
+
+    Returns:
+        DataFrame indexed by workers with seconds, speedup, efficiency
+        (speedup per worker) and identical (output matches the baseline's)
+    """
+    rows, baseline = [], None
+    for workers in worker_counts:
+        report = run_etl(paths, out_path, max_workers=workers, **etl_kwargs)
+        fingerprint = output_fingerprint(out_path)
+        if baseline is None:
+            baseline = (report['seconds']['total'], workers, fingerprint)
+        speedup = baseline[0] / report['seconds']['total']
+        rows.append({
+            'workers': workers,
+            'chunks': report['chunks'],
+            'rows_out': report['rows_out'],
+            'seconds': report['seconds']['total'],
+            'speedup': speedup,
+            'efficiency': speedup * baseline[1] / workers,
+            'identical': fingerprint == baseline[2]
+        })
+    return pd.DataFrame(rows).set_index('workers')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean, filter and featurize raw records on all cores.")
+    parser.add_argument('--input', nargs='+', type=Path, required=True,
+                        help="Raw CSV/Parquet files or directories of them (one chunk per file or more)")
+    parser.add_argument('--out', type=Path, required=True, help="Output Parquet file")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to the CPU count)")
+    parser.add_argument('--states', nargs='+', default=None, help="States to keep")
+    parser.add_argument('--columns', nargs='+', default=None, help="Output columns (defaults to all)")
+    parser.add_argument('--chunk-rows', type=int, default=ETL_CHUNK_ROWS)
+    parser.add_argument('--chunk-bytes', type=int, default=ETL_CHUNK_BYTES)
+    parser.add_argument('--weather-store', type=Path, nargs='?', const=WEATHER_STORE_DIR, default=None,
+                        help="Enrich records without weather from a local weather store")
+    parser.add_argument('--scaling', nargs='*', type=int, default=None,
+                        help=f"Report scaling at these worker counts (default {ETL_SCALING_WORKERS})")
+    args = parser.parse_args()
+    options = dict(states=args.states, columns=args.columns,
+                   chunk_rows=args.chunk_rows, chunk_bytes=args.chunk_bytes, weather_store=args.weather_store)
+
+    if args.scaling is not None:
+        report = scaling_report(args.input, args.out, args.scaling or ETL_SCALING_WORKERS, **options)
+        print(report.to_string(float_format=lambda v: f"{v:.2f}"))
+        print(f"Host CPUs: {os.cpu_count()} (more workers than CPUs cannot speed up further)")
+        if not report['identical'].all():
+            print("Warning: outputs differ between worker counts")
+        return
+
+    report = run_etl(args.input, args.out, args.workers, **options)
+    print(f"Wrote {report['rows_out']} of {report['rows_in']} rows to {args.out} from {report['chunks']} chunks "
+          f"on {report['workers']} workers in {report['seconds']['total']:.1f}s "
+          f"(concatenation {report['seconds']['concatenate']:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,12 @@ Contains functions for creating time-based and weather-based features.
 """
 
 import pandas as pd
-from .config import WEATHER_CODE_MAP
+import pytz
+from datetime import datetime
+from .config import WEATHER_CODE_MAP, DEFAULT_TIMEZONE
+
+# TimezoneFinder loads its polygon data on construction, so share one instance
+_timezone_finder = None
 
 
 def get_part_of_day(hour: int) -> str:
@@ -41,6 +46,48 @@ def map_weather_condition(weathercode: int) -> str:
     return WEATHER_CODE_MAP.get(weathercode, 'Other')
 
 
+def get_local_timezone(lat: float, lon: float):
+    """
+    Resolve the timezone for a coordinate.
+    
+    Args:
+        lat: Latitude
+        lon: Longitude
+        
+    Returns:
+        pytz timezone for the location, or DEFAULT_TIMEZONE if it cannot be resolved
+    """
+    global _timezone_finder
+    try:
+        if _timezone_finder is None:
+            from timezonefinder import TimezoneFinder
+            _timezone_finder = TimezoneFinder()
+        tz_name = _timezone_finder.timezone_at(lat=lat, lng=lon)
+        if tz_name:
+            return pytz.timezone(tz_name)
+    except Exception:
+        pass
+    return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+def get_time_features(local_time: datetime) -> dict:
+    """
+    Derive the model's time features from a local datetime.
+    
+    Args:
+        local_time: Datetime in the location's local timezone
+        
+    Returns:
+        Dictionary with Hour, DayOfWeek, Month and PartOfDay
+    """
+    return {
+        'Hour': local_time.hour,
+        'DayOfWeek': local_time.strftime('%A'),
+        'Month': local_time.month,
+        'PartOfDay': get_part_of_day(local_time.hour)
+    }
+
+
 def create_time_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Create time-based features from DateTime column.
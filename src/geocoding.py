@@ -0,0 +1,292 @@
+"""
+Address geocoding for the ABIA Traffic Accident Forecaster.
+
+Contains the Photon/Nominatim suggestion lookup, a host-wide rate limiter
+for the geocoding providers and a suggestion service that debounces input,
+cancels superseded requests and collapses identical in-flight queries
+across sessions into a single upstream call.
+"""
+
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+from .config import (
+    PHOTON_USER_AGENT, NOMINATIM_USER_AGENT, GEOCODER_MIN_INTERVAL,
+    PROVIDER_BASE_URLS, PUBLIC_PROVIDER_URLS,
+    SUGGEST_DEBOUNCE_SECONDS, SUGGEST_CACHE_TTL, SUGGEST_MIN_CHARS
+)
+from .http_client import ProviderError, get_client
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process limit
+    fcntl = None
+
+# Sentinel returned when every provider failed
+GEOCODER_ERROR = [("GEOCODER_ERROR", 0, 0)]
+
+
+class HostRateLimiter:
+    """
+    Enforce a minimum interval between calls to one provider across the host.
+
+    The time of the last call is kept in a lock file in the temp directory,
+    so every process (and every thread) on the machine shares the budget.
+    """
+
+    def __init__(self, name: str, min_interval: float, lock_dir: Optional[Path] = None):
+        self.min_interval = min_interval
+        lock_dir = Path(lock_dir or tempfile.gettempdir())
+        self.path = lock_dir / f"roadrisk_ratelimit_{name}.lock"
+        self._thread_lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until a call is allowed, then record it."""
+        with self._thread_lock, open(self.path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read().strip()
+                last_call = float(content) if content else 0.0
+                delay = last_call + self.min_interval - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                f.seek(0)
+                f.truncate()
+                f.write(repr(time.time()))
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_rate_limiters = {
+    name: HostRateLimiter(name, interval) for name, interval in GEOCODER_MIN_INTERVAL.items()
+    if PROVIDER_BASE_URLS[name] == PUBLIC_PROVIDER_URLS[name]
+}
+
+# Geolocators keep a requests session open, so build each provider's once
+_geolocators = {}
+_geolocators_lock = threading.Lock()
+
+
+def get_geolocator(provider: str):
+    """
+    Get the shared geopy geolocator for 'photon' or 'nominatim'.
+
+    Args:
+        provider: Provider name
+
+    Returns:
+        geopy geolocator configured with the provider's endpoint and read timeout
+    """
+    with _geolocators_lock:
+        if provider not in _geolocators:
+            timeout = get_client(provider).timeout
+            read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+            endpoint = urlsplit(PROVIDER_BASE_URLS[provider])
+            location = {'scheme': endpoint.scheme, 'domain': endpoint.netloc + endpoint.path}
+            if provider == 'photon':
+                from geopy.geocoders import Photon
+                _geolocators[provider] = Photon(user_agent=PHOTON_USER_AGENT, timeout=read_timeout, **location)
+            else:
+                from geopy.geocoders import Nominatim
+                _geolocators[provider] = Nominatim(user_agent=NOMINATIM_USER_AGENT, timeout=read_timeout, **location)
+        return _geolocators[provider]
+
+
+def _geocode(provider: str, query: str) -> list:
+    """Run one rate-limited, resilient geocoding call."""
+    def attempt():
+        if provider in _rate_limiters:
+            _rate_limiters[provider].wait()
+        locations = get_geolocator(provider).geocode(query, exactly_one=False, limit=5)
+        return [(loc.address, loc.latitude, loc.longitude) for loc in locations or []]
+
+    return get_client(provider).call(attempt, cache_key=query)
+
+
+def lookup_address_suggestions(address: str, state: str) -> list:
+    """
+    Get address suggestions using Photon geocoder with Nominatim fallback.
+
+    Args:
+        address: Partial or full street address
+        state: State code used to narrow the search
+
+    Returns:
+        List of (address, latitude, longitude) tuples, or GEOCODER_ERROR if
+        the fallback provider is unavailable
+    """
+    if not address or len(address) < SUGGEST_MIN_CHARS:
+        return []
+    query = f"{address}, {state}, USA"
+
+    # Try Photon geocoder first (Komoot, better rate limits)
+    try:
+        suggestions = _geocode('photon', query)
+        if suggestions:
+            return suggestions
+    except ProviderError:
+        pass  # Try Nominatim fallback
+
+    # Fallback to Nominatim within its usage policy
+    try:
+        return _geocode('nominatim', query)
+    except ProviderError:
+        return list(GEOCODER_ERROR)
+
+
+class _Ticket:
+    """A session's pending suggestion request."""
+
+    def __init__(self, key: tuple):
+        self.key = key
+        self.future = Future()
+        self.timer = None
+
+
+class SuggestionService:
+    """
+    Debounced, single-flight address suggestions shared by all sessions.
+
+    Each session has at most one pending request: a new query cancels the
+    previous one if it has not reached the provider yet. Identical queries
+    in flight at the same time (from any session) share one upstream call,
+    and successful results are cached for SUGGEST_CACHE_TTL seconds.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[str, str], list] = lookup_address_suggestions,
+        debounce: float = SUGGEST_DEBOUNCE_SECONDS,
+        cache_ttl: float = SUGGEST_CACHE_TTL,
+        max_workers: int = 4,
+        max_cache_entries: int = 1024
+    ):
+        self._lookup = lookup
+        self.debounce = debounce
+        self.cache_ttl = cache_ttl
+        self.max_cache_entries = max_cache_entries
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='suggest')
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Ticket] = {}
+        self._inflight: Dict[tuple, Future] = {}
+        self._cache: Dict[tuple, tuple] = {}
+        self.counters = {'requests': 0, 'superseded': 0, 'coalesced': 0, 'cache_hits': 0, 'upstream_calls': 0}
+
+    @staticmethod
+    def make_key(address: str, state: str) -> tuple:
+        """Normalize a query so equivalent inputs share cache and flights."""
+        return (state, ' '.join(address.lower().split()))
+
+    def request(self, session_id: str, address: str, state: str, immediate: bool = False) -> Future:
+        """
+        Request suggestions for a session.
+
+        Args:
+            session_id: Identifier of the requesting session
+            address: Text typed by the user
+            state: Selected state code
+            immediate: Skip the debounce delay (e.g. an explicit Search click)
+
+        Returns:
+            Future resolving to a list of (address, lat, lon) tuples; it is
+            cancelled if a newer request from the same session supersedes it
+        """
+        key = self.make_key(address, state)
+        with self._lock:
+            self.counters['requests'] += 1
+            previous = self._pending.get(session_id)
+            if previous is not None:
+                if previous.key == key and not previous.future.cancelled():
+                    return previous.future
+                self._cancel(previous)
+
+            ticket = _Ticket(key)
+            cached = self._cache.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.cache_ttl:
+                self.counters['cache_hits'] += 1
+                ticket.future.set_result(cached[0])
+                self._pending.pop(session_id, None)
+                return ticket.future
+
+            self._pending[session_id] = ticket
+            delay = 0 if immediate else self.debounce
+            ticket.timer = threading.Timer(delay, self._fire, args=(session_id, ticket, address, state))
+            ticket.timer.daemon = True
+            ticket.timer.start()
+        return ticket.future
+
+    def cancel(self, session_id: str) -> None:
+        """Cancel a session's pending request, if any."""
+        with self._lock:
+            ticket = self._pending.pop(session_id, None)
+            if ticket is not None:
+                self._cancel(ticket)
+
+    def _cancel(self, ticket: _Ticket) -> None:
+        """Cancel a ticket that has not reached the provider (lock held)."""
+        if ticket.timer is not None:
+            ticket.timer.cancel()
+        if ticket.future.cancel():
+            self.counters['superseded'] += 1
+
+    def _fire(self, session_id: str, ticket: _Ticket, address: str, state: str) -> None:
+        """Debounce expired: hand the request to a worker unless superseded."""
+        if not ticket.future.set_running_or_notify_cancel():
+            return
+        self._executor.submit(self._run, session_id, ticket, address, state)
+
+    def _run(self, session_id: str, ticket: _Ticket, address: str, state: str) -> None:
+        try:
+            ticket.future.set_result(self._single_flight(ticket.key, address, state))
+        except Exception as e:
+            ticket.future.set_exception(e)
+        finally:
+            with self._lock:
+                if self._pending.get(session_id) is ticket:
+                    del self._pending[session_id]
+
+    def _single_flight(self, key: tuple, address: str, state: str) -> list:
+        """Run the lookup once per key, letting concurrent callers share it."""
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                flight.set_running_or_notify_cancel()
+                self._inflight[key] = flight
+                self.counters['upstream_calls'] += 1
+            else:
+                self.counters['coalesced'] += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            result = self._lookup(address, state)
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            if result != GEOCODER_ERROR:
+                with self._lock:
+                    self._cache[key] = (result, time.monotonic())
+                    while len(self._cache) > self.max_cache_entries:
+                        self._cache.pop(next(iter(self._cache)))
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        """Return a copy of the request counters."""
+        with self._lock:
+            return dict(self.counters)
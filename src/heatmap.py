@@ -0,0 +1,372 @@
+"""
+Statewide risk heatmap tiles for the ABIA Traffic Accident Forecaster.
+
+Contains the job that lays a regular grid over each supported state, joins
+it with cached forecast weather and batch-scores every cell x hour x
+profile, plus the loader the app uses to slice the stored tiles.
+
+Usage: python -m src.heatmap [--states NC FL] [--hours 6] [--every 3600]
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from .config import (
+    STATE_LIST, STATE_BOUNDS, REGISTRY_DIR, WEATHER_UNITS,
+    HEATMAP_DIR, HEATMAP_GRID_DEG, HEATMAP_HOURS, HEATMAP_WEATHER_TTL, HEATMAP_PROFILES
+)
+from .features import get_local_timezone
+from .models import predict_positive
+from .registry import get_current_version, load_handle
+from .weather import fetch_hourly_forecast_batch
+
+# Open-Meteo weather fields (WEATHER_UNITS) stored per cell and hour, in this order
+WEATHER_CHANNELS = ('temperature_2m', 'precipitation', 'snowfall', 'wind_speed_10m', 'weather_code')
+
+# Rows per predict_proba call, to bound the size of the encoded matrix
+SCORING_CHUNK_ROWS = 200_000
+
+# Registry versions loaded once per worker process
+_worker_models = {}
+
+
+def build_state_grid(state: str, grid_deg: float = HEATMAP_GRID_DEG) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lay a regular grid of cell centres over a state's bounding box.
+
+    Args:
+        state: State code from STATE_BOUNDS
+        grid_deg: Cell size in degrees
+
+    Returns:
+        Tuple of (latitude axis, longitude axis) of cell centres
+    """
+    lat_min, lat_max, lon_min, lon_max = STATE_BOUNDS[state]
+    lats = np.arange(lat_min + grid_deg / 2, lat_max, grid_deg).round(4)
+    lons = np.arange(lon_min + grid_deg / 2, lon_max, grid_deg).round(4)
+    return lats, lons
+
+
+def _atomic_save(path: Path, save: Callable) -> None:
+    """Write a file through a temporary sibling and rename it into place."""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        save(f)
+    os.replace(tmp, path)
+
+
+def load_state_weather(
+    state: str,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    directory: Path = HEATMAP_DIR,
+    ttl: float = HEATMAP_WEATHER_TTL,
+    fetch_batch: Optional[Callable] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get hourly forecast weather for every grid cell, using the on-disk cache.
+
+    The cache is refetched only when it is older than ttl or the grid changed.
+
+    Args:
+        state: State code
+        lats: Latitude axis of the grid
+        lons: Longitude axis of the grid
+        directory: Heatmap output directory
+        ttl: Maximum cache age in seconds
+        fetch_batch: Callable (lats, lons, forecast_days) -> list of hourly
+            series; defaults to fetch_hourly_forecast_batch
+
+    Returns:
+        Tuple of (hour timestamps (T,), weather array (cells, T, channels)
+        of WEATHER_CHANNELS in WEATHER_UNITS, NaN where a cell's forecast
+        is unavailable)
+    """
+    cache_path = Path(directory) / f"{state}_weather.npz"
+    if cache_path.exists():
+        cached = np.load(cache_path)
+        fresh = time.time() - float(cached['fetched_at']) < ttl
+        same_grid = np.array_equal(cached['lats'], lats) and np.array_equal(cached['lons'], lons)
+        same_channels = 'channels' in cached and tuple(cached['channels']) == WEATHER_CHANNELS
+        if fresh and same_grid and same_channels:
+            return cached['times'], cached['values']
+
+    if fetch_batch is None:
+        fetch_batch = fetch_hourly_forecast_batch
+
+    cell_lats = np.repeat(lats, len(lons))
+    cell_lons = np.tile(lons, len(lats))
+    series = fetch_batch(list(cell_lats), list(cell_lons), 2)
+
+    times = next((np.asarray(s['time'], dtype=np.int64) for s in series if s), np.empty(0, dtype=np.int64))
+    values = np.full((len(series), len(times), len(WEATHER_CHANNELS)), np.nan, dtype=np.float32)
+    for i, s in enumerate(series):
+        if not s or len(s['time']) != len(times):
+            continue
+        values[i, :, 0] = s['temperature_f']
+        values[i, :, 1] = s['precipitation']
+        values[i, :, 2] = s['snowfall']
+        values[i, :, 3] = s['windspeed']
+        values[i, :, 4] = s['weathercode']
+
+    _atomic_save(cache_path, lambda f: np.savez(
+        f, times=times, values=values, lats=lats, lons=lons, channels=np.array(WEATHER_CHANNELS),
+        fetched_at=time.time()
+    ))
+    return times, values
+
+
+def _local_times(hour_times: np.ndarray, cell_lats: np.ndarray, cell_lons: np.ndarray) -> np.ndarray:
+    """Naive local wall-clock time per (cell, hour), resolving each cell's timezone once."""
+    local_times = np.empty((len(cell_lats), len(hour_times)), dtype='datetime64[ns]')
+    utc = pd.to_datetime(hour_times, unit='s', utc=True)
+    tz_names = np.array([get_local_timezone(lat, lon).zone for lat, lon in zip(cell_lats, cell_lons)])
+    for tz_name in np.unique(tz_names):
+        local_times[tz_names == tz_name] = utc.tz_convert(tz_name).tz_localize(None).to_numpy()
+    return local_times
+
+
+def _rows_equal(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Row-wise equality along the last axis, treating NaN as equal to NaN."""
+    return np.all((a == b) | (np.isnan(a) & np.isnan(b)), axis=-1)
+
+
+def build_state_tile(
+    state: str,
+    hours: int = HEATMAP_HOURS,
+    directory: Path = HEATMAP_DIR,
+    version: Optional[str] = None,
+    registry_dir: Path = REGISTRY_DIR,
+    grid_deg: float = HEATMAP_GRID_DEG,
+    profiles: Sequence[Tuple[str, str]] = HEATMAP_PROFILES,
+    now: Optional[float] = None,
+    fetch_batch: Optional[Callable] = None
+) -> dict:
+    """
+    Score and store the risk tile for one state.
+
+    Cells are scored with a registry version's model and feature
+    transformer, as the app scores a prediction. Cells whose weather inputs
+    for an hour are unchanged since the previous run (same hour, same model
+    version, same grid and profiles) keep their stored risk; only the rest
+    are scored.
+
+    Args:
+        state: State code
+        hours: Number of hours ahead to score, starting at the current hour
+        directory: Heatmap output directory
+        version: Registry version to score with (defaults to the current one)
+        registry_dir: Registry root directory
+        grid_deg: Cell size in degrees
+        profiles: (vehicle, gender) pairs using VEHICLE_MAP/GENDER_MAP keys
+        now: Reference Unix time (defaults to the current time)
+        fetch_batch: Optional forecast fetcher passed to load_state_weather
+
+    Returns:
+        Summary dictionary with state, cells, scored and reused row counts
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    if version is None:
+        version = get_current_version(registry_dir)
+    if version is None:
+        raise RuntimeError(f"No current model version in {registry_dir}")
+    key = (str(registry_dir), version)
+    if key not in _worker_models:
+        handle = load_handle(version, registry_dir)
+        if handle is None:
+            raise RuntimeError(f"Model version {version} could not be loaded from {registry_dir}")
+        _worker_models[key] = handle
+    handle = _worker_models[key]
+    signature = handle.version
+
+    lats, lons = build_state_grid(state, grid_deg)
+    n_cells = len(lats) * len(lons)
+    times, weather = load_state_weather(state, lats, lons, directory, fetch_batch=fetch_batch)
+
+    # --- Select the scoring window ---
+    now = time.time() if now is None else now
+    current_hour = int(now // 3600 * 3600)
+    start = int(np.searchsorted(times, current_hour))
+    hour_times = times[start:start + hours]
+    inputs = weather[:, start:start + hours, :]
+    n_hours = len(hour_times)
+    profile_names = np.array([f"{v}|{g}" for v, g in profiles])
+
+    risk = np.full((n_hours, len(profiles), len(lats), len(lons)), np.nan, dtype=np.float16)
+    needs_scoring = np.ones((n_cells, n_hours), dtype=bool)
+    reused = np.zeros((n_cells, n_hours), dtype=bool)
+
+    # --- Reuse unchanged cells from the previous tile ---
+    meta_path = directory / f"{state}_meta.npz"
+    risk_path = directory / f"{state}_risk.npy"
+    if meta_path.exists() and risk_path.exists():
+        prev = np.load(meta_path)
+        compatible = (
+            str(prev['model_signature']) == signature
+            and np.array_equal(prev['lats'], lats)
+            and np.array_equal(prev['lons'], lons)
+            and np.array_equal(prev['profiles'], profile_names)
+        )
+        if compatible:
+            prev_risk = np.load(risk_path, mmap_mode='r')
+            prev_positions = {int(t): k for k, t in enumerate(prev['hour_times'])}
+            for h, t in enumerate(hour_times):
+                k = prev_positions.get(int(t))
+                if k is None:
+                    continue
+                same = _rows_equal(prev['inputs'][:, k, :], inputs[:, h, :])
+                needs_scoring[same, h] = False
+                reused[same, h] = True
+                risk[h].reshape(len(profiles), -1)[:, same] = \
+                    np.asarray(prev_risk[k]).reshape(len(profiles), -1)[:, same]
+
+    # Cells without weather cannot be scored
+    needs_scoring &= ~np.isnan(inputs[:, :, 0])
+    cell_idx, hour_idx = np.nonzero(needs_scoring)
+
+    if len(cell_idx):
+        cell_lats = np.repeat(lats, len(lons))
+        cell_lons = np.tile(lons, len(lats))
+        local_times = _local_times(hour_times, cell_lats, cell_lons)
+
+        records = pd.DataFrame(inputs[cell_idx, hour_idx, :], columns=list(WEATHER_CHANNELS))
+        records['weather_code'] = records['weather_code'].astype(int)
+        records['timestamp'] = local_times[cell_idx, hour_idx]
+        records['lat'] = cell_lats[cell_idx]
+        records['lon'] = cell_lons[cell_idx]
+        records['state'] = state
+
+        flat_risk = risk.reshape(n_hours, len(profiles), n_cells)
+        for p, (vehicle, gender) in enumerate(profiles):
+            rows = handle.transformer.features(records.assign(vehicle=vehicle, gender=gender), **WEATHER_UNITS)
+            for chunk in range(0, len(rows), SCORING_CHUNK_ROWS):
+                part = rows.iloc[chunk:chunk + SCORING_CHUNK_ROWS]
+                probs = predict_positive(handle.model, handle.transformer.encode(part), part['State'])
+                sl = slice(chunk, chunk + len(part))
+                flat_risk[hour_idx[sl], p, cell_idx[sl]] = probs
+
+    _atomic_save(risk_path, lambda f: np.save(f, risk))
+    _atomic_save(meta_path, lambda f: np.savez(
+        f, lats=lats, lons=lons, hour_times=hour_times, inputs=inputs,
+        profiles=profile_names, model_signature=signature, generated_at=now
+    ))
+
+    return {
+        'state': state,
+        'cells': n_cells,
+        'scored_rows': int(len(cell_idx)) * len(profiles),
+        'reused_rows': int(reused.sum()) * len(profiles)
+    }
+
+
+def run_heatmap_job(
+    states: Optional[List[str]] = None,
+    hours: int = HEATMAP_HOURS,
+    directory: Path = HEATMAP_DIR,
+    max_workers: Optional[int] = None,
+    **tile_kwargs
+) -> List[dict]:
+    """
+    Build heatmap tiles for several states in a process pool.
+
+    Args:
+        states: State codes (defaults to STATE_LIST)
+        hours: Number of hours ahead to score
+        directory: Heatmap output directory
+        max_workers: Worker processes (defaults to one per state, capped by CPU count)
+        **tile_kwargs: Extra arguments for build_state_tile
+
+    Returns:
+        List of per-state summaries, in the order of states
+    """
+    if states is None:
+        states = STATE_LIST
+    # Resolve the version once so every state is scored by the same model
+    tile_kwargs.setdefault('version', get_current_version(tile_kwargs.get('registry_dir', REGISTRY_DIR)))
+    if max_workers is None:
+        max_workers = min(len(states), os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(build_state_tile, state, hours, directory, **tile_kwargs)
+            for state in states
+        ]
+        return [future.result() for future in futures]
+
+
+def load_heatmap(state: str, directory: Path = HEATMAP_DIR) -> Optional[dict]:
+    """
+    Load a state's heatmap tile with the risk array memory-mapped.
+
+    Args:
+        state: State code
+        directory: Heatmap output directory
+
+    Returns:
+        Dictionary with risk (hours x profiles x lat x lon, float16), lats,
+        lons, hour_times and profiles, or None if no tile exists
+    """
+    directory = Path(directory)
+    meta_path = directory / f"{state}_meta.npz"
+    risk_path = directory / f"{state}_risk.npy"
+    if not (meta_path.exists() and risk_path.exists()):
+        return None
+    meta = np.load(meta_path)
+    return {
+        'risk': np.load(risk_path, mmap_mode='r'),
+        'lats': meta['lats'],
+        'lons': meta['lons'],
+        'hour_times': meta['hour_times'],
+        'profiles': [tuple(p.split('|')) for p in meta['profiles']],
+        'generated_at': float(meta['generated_at'])
+    }
+
+
+def heatmap_frame(tile: dict, hour_index: int = 0, profile_index: int = 0) -> pd.DataFrame:
+    """
+    Slice one hour and profile of a tile into a lat/lon/risk DataFrame.
+
+    Args:
+        tile: Output of load_heatmap
+        hour_index: Index into tile['hour_times']
+        profile_index: Index into tile['profiles']
+
+    Returns:
+        DataFrame with lat, lon and risk columns, one row per scored cell
+    """
+    grid = np.asarray(tile['risk'][hour_index, profile_index], dtype=np.float32)
+    lat, lon = np.meshgrid(tile['lats'], tile['lons'], indexing='ij')
+    frame = pd.DataFrame({'lat': lat.ravel(), 'lon': lon.ravel(), 'risk': grid.ravel()})
+    return frame.dropna(subset=['risk'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build statewide risk heatmap tiles.")
+    parser.add_argument('--states', nargs='+', default=STATE_LIST, help="States to build")
+    parser.add_argument('--hours', type=int, default=HEATMAP_HOURS, help="Hours ahead to score")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes")
+    parser.add_argument('--every', type=int, default=0,
+                        help="Refresh interval in seconds (0 runs once)")
+    args = parser.parse_args()
+
+    while True:
+        started = time.time()
+        for summary in run_heatmap_job(args.states, args.hours, max_workers=args.workers):
+            print(f"{summary['state']}: {summary['cells']} cells, "
+                  f"{summary['scored_rows']} rows scored, {summary['reused_rows']} reused")
+        print(f"Heatmap refresh finished in {time.time() - started:.1f}s")
+        if not args.every:
+            break
+        time.sleep(max(args.every - (time.time() - started), 0))
+
+
+if __name__ == '__main__':
+    main()
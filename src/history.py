@@ -0,0 +1,238 @@
+"""
+Historical accident rates for the ABIA Traffic Accident Forecaster.
+
+Contains a precomputed cube of stop and accident counts by
+State x Hour x DayOfWeek x WeatherCondition x VehicleType, stored as dense
+numpy arrays indexed by category code. New partitions are added in place,
+and looking up the historical rate for a set of conditions is a handful of
+array reads, so the app never touches the raw data.
+
+Usage:
+    python -m src.history --data traffic_violations_with_detailed_weather.csv
+    python -m src.history --partitions          (add new files from PARTITIONS_DIR)
+"""
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .config import (
+    STATE_LIST, VEHICLE_MAP, WEATHER_CODE_MAP, TARGET_COLUMN,
+    HISTORY_CUBE_PATH, DAYS_OF_WEEK, HISTORY_MIN_COUNT, PARTITIONS_DIR
+)
+
+# Cube axes, in order
+DIMENSIONS = ['State', 'Hour', 'DayOfWeek', 'WeatherCondition', 'VehicleType']
+
+
+def default_levels() -> Dict[str, list]:
+    """Category levels for each axis of a new cube."""
+    return {
+        'State': list(STATE_LIST),
+        'Hour': list(range(24)),
+        'DayOfWeek': list(DAYS_OF_WEEK),
+        'WeatherCondition': list(dict.fromkeys(WEATHER_CODE_MAP.values())) + ['Other'],
+        'VehicleType': list(VEHICLE_MAP.values())
+    }
+
+
+class AccidentRateCube:
+    """
+    Dense stop/accident count cube.
+
+    Args:
+        levels: Category levels per dimension (defaults to default_levels())
+    """
+
+    def __init__(self, levels: Optional[Dict[str, list]] = None):
+        self.levels = levels or default_levels()
+        shape = tuple(len(self.levels[d]) for d in DIMENSIONS)
+        self.stops = np.zeros(shape, dtype=np.int64)
+        self.accidents = np.zeros(shape, dtype=np.int64)
+        self.partitions: List[str] = []
+        self._index = {d: {level: i for i, level in enumerate(self.levels[d])} for d in DIMENSIONS}
+
+    # --- Building ---
+    def add(self, df: pd.DataFrame, partition: Optional[str] = None) -> int:
+        """
+        Add a partition's records to the counts.
+
+        Rows with a level outside the cube (e.g. a vehicle type not offered
+        in the app) are skipped.
+
+        Args:
+            df: Records with the DIMENSIONS columns and the target column
+            partition: Name recorded so the partition is not added twice
+
+        Returns:
+            Number of rows counted
+        """
+        codes = []
+        for dimension in DIMENSIONS:
+            levels = pd.Index(self.levels[dimension])
+            codes.append(levels.get_indexer(df[dimension]))
+        codes = np.vstack(codes)
+        known = (codes >= 0).all(axis=0)
+        flat = np.ravel_multi_index(tuple(codes[:, known]), self.stops.shape)
+
+        size = self.stops.size
+        self.stops += np.bincount(flat, minlength=size).reshape(self.stops.shape)
+        outcomes = df[TARGET_COLUMN].to_numpy()[known]
+        self.accidents += np.bincount(flat, weights=outcomes, minlength=size).astype(np.int64).reshape(self.stops.shape)
+        if partition is not None:
+            self.partitions.append(partition)
+        return int(known.sum())
+
+    # --- Lookup ---
+    def lookup(
+        self,
+        state: str,
+        hour: int,
+        day_of_week: str,
+        weather: str,
+        vehicle: str,
+        min_count: int = HISTORY_MIN_COUNT
+    ) -> Optional[dict]:
+        """
+        Historical accident rate for one set of conditions.
+
+        If the exact cell has fewer than min_count stops, weather and then
+        vehicle type are summed out so the rate rests on enough records.
+
+        Args:
+            state: State code
+            hour: Hour of day (0-23)
+            day_of_week: Day name, e.g. 'Monday'
+            weather: WeatherCondition label
+            vehicle: VehicleType value, e.g. '02 - Automobile'
+            min_count: Minimum stops for a rate to be reported
+
+        Returns:
+            Dictionary with rate, stops, accidents and the dimensions the
+            figure is conditioned on, or None if even the roll-up is too sparse
+            or a condition is unknown
+        """
+        try:
+            s = self._index['State'][state]
+            h = self._index['Hour'][int(hour)]
+            d = self._index['DayOfWeek'][day_of_week]
+            w = self._index['WeatherCondition'][weather]
+            v = self._index['VehicleType'][vehicle]
+        except KeyError:
+            return None
+
+        candidates = [
+            (DIMENSIONS, (s, h, d, w, v)),
+            (['State', 'Hour', 'DayOfWeek', 'VehicleType'], (s, h, d, slice(None), v)),
+            (['State', 'Hour', 'DayOfWeek'], (s, h, d, slice(None), slice(None)))
+        ]
+        for conditioned_on, index in candidates:
+            stops = int(self.stops[index].sum())
+            if stops >= min_count:
+                accidents = int(self.accidents[index].sum())
+                return {
+                    'rate': accidents / stops,
+                    'stops': stops,
+                    'accidents': accidents,
+                    'conditioned_on': conditioned_on
+                }
+        return None
+
+    # --- Storage ---
+    def save(self, path: Path = HISTORY_CUBE_PATH) -> None:
+        """Write the cube to an .npz file atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(
+                f, stops=self.stops, accidents=self.accidents,
+                partitions=np.array(self.partitions, dtype=str),
+                **{f"levels_{d}": np.array(self.levels[d]) for d in DIMENSIONS}
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path = HISTORY_CUBE_PATH) -> Optional['AccidentRateCube']:
+        """
+        Load a saved cube.
+
+        Returns:
+            AccidentRateCube, or None if the file does not exist
+        """
+        try:
+            with np.load(path) as data:
+                levels = {d: data[f"levels_{d}"].tolist() for d in DIMENSIONS}
+                cube = cls(levels)
+                cube.stops = data['stops']
+                cube.accidents = data['accidents']
+                cube.partitions = data['partitions'].tolist()
+        except FileNotFoundError:
+            return None
+        return cube
+
+
+def update_cube(
+    paths: Sequence[Path],
+    cube_path: Path = HISTORY_CUBE_PATH,
+    rebuild: bool = False
+) -> dict:
+    """
+    Add new data files to the saved cube (creating it if needed).
+
+    Files are named by their stem; a file already in the cube is skipped,
+    so re-running over a growing directory only reads the new partitions.
+
+    Args:
+        paths: CSV/Parquet files with the cube dimensions and target column
+        cube_path: Cube file
+        rebuild: Start from an empty cube
+
+    Returns:
+        Dictionary with added partitions, rows counted and total stops
+    """
+    from .training import load_training_frame, read_table
+
+    cube = None if rebuild else AccidentRateCube.load(cube_path)
+    cube = cube or AccidentRateCube()
+    added, rows = [], 0
+    for path in paths:
+        name = Path(path).stem
+        if name in cube.partitions:
+            continue
+        df = read_table(path)
+        if not set(DIMENSIONS).issubset(df.columns):
+            df = load_training_frame([path])  # Enriched records without features yet
+        rows += cube.add(df, name)
+        added.append(name)
+    if added or rebuild:
+        cube.save(cube_path)
+    return {'added': added, 'rows': rows, 'total_stops': int(cube.stops.sum())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the historical accident-rate cube.")
+    parser.add_argument('--data', nargs='*', type=Path, default=[],
+                        help="Weather-enriched CSV/Parquet files")
+    parser.add_argument('--partitions', action='store_true',
+                        help=f"Also add new partitions from {PARTITIONS_DIR}")
+    parser.add_argument('--rebuild', action='store_true', help="Start from an empty cube")
+    parser.add_argument('--cube', type=Path, default=HISTORY_CUBE_PATH, help="Cube file")
+    args = parser.parse_args()
+
+    paths = list(args.data)
+    if args.partitions:
+        paths += sorted(PARTITIONS_DIR.glob('*.parquet'))
+    if not paths:
+        parser.error("Nothing to add; pass --data and/or --partitions")
+
+    summary = update_cube(paths, args.cube, args.rebuild)
+    print(f"Added {len(summary['added'])} partition(s), {summary['rows']} rows; "
+          f"cube now covers {summary['total_stops']} stops")
+
+
+if __name__ == '__main__':
+    main()
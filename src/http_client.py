@@ -0,0 +1,311 @@
+"""
+Outbound HTTP client layer for the ABIA Traffic Accident Forecaster.
+
+Contains one pooled, keep-alive client per external provider (Open-Meteo,
+Photon, Nominatim) with per-provider timeouts, retries with jittered
+exponential backoff under an overall deadline, and a circuit breaker.
+When a call fails or the circuit is open, the most recent successful
+result for the same request is returned instead, if it is recent enough;
+callers that need to know can ask for its age (see call_with_age).
+"""
+
+import random
+import threading
+import time
+import requests
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from .config import (
+    HTTP_PROVIDERS, HTTP_POOL_SIZE, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, HTTP_FALLBACK_ENTRIES,
+    HTTP_FALLBACK_MAX_AGE, HTTP_DEADLINE_SECONDS
+)
+
+try:
+    from geopy import exc as geopy_exc
+except ImportError:
+    geopy_exc = None
+
+
+class ProviderError(Exception):
+    """A provider call failed and no cached result was available."""
+
+    def __init__(self, provider: str, message: str):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+
+
+class CircuitOpenError(ProviderError):
+    """The provider's circuit is open and no cached result was available."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected for reset_timeout seconds; then a single probe call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half-open'."""
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Decide whether a failed call is worth retrying.
+
+    Timeouts, connection errors, HTTP 429 and 5xx responses, and geopy's
+    timeout/unavailable/rate-limit errors are transient; anything else
+    (bad request, parse errors) is not.
+    """
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    if geopy_exc is not None and isinstance(error, (
+        geopy_exc.GeocoderTimedOut, geopy_exc.GeocoderUnavailable, geopy_exc.GeocoderRateLimited
+    )):
+        return True
+    return False
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by a Retry-After header or geopy rate-limit error."""
+    if geopy_exc is not None and isinstance(error, geopy_exc.GeocoderRateLimited):
+        return error.retry_after
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+class ProviderClient:
+    """
+    Resilient client for one external provider.
+
+    Retries stop once the next attempt could not start before the call's
+    deadline, and get_json shortens its timeouts to fit the time left.
+    Calls made through call() with their own timeouts (geocoders) can
+    still overrun the deadline by up to one attempt.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout=(3.05, 10),
+        retries: int = 2,
+        backoff_base: float = HTTP_BACKOFF_BASE,
+        backoff_max: float = HTTP_BACKOFF_MAX,
+        pool_size: int = HTTP_POOL_SIZE,
+        breaker: Optional[CircuitBreaker] = None,
+        fallback_entries: int = HTTP_FALLBACK_ENTRIES,
+        fallback_max_age: float = HTTP_FALLBACK_MAX_AGE,
+        deadline: float = HTTP_DEADLINE_SECONDS
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.fallback_entries = fallback_entries
+        self.fallback_max_age = fallback_max_age
+        self._last_good = OrderedDict()  # cache_key -> (monotonic time stored, result)
+        self._lock = threading.Lock()
+
+        # Keep-alive connection pool; retries are handled here, not by urllib3
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After if present."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _connect_timeout(self) -> float:
+        return self.timeout[0] if isinstance(self.timeout, tuple) else self.timeout
+
+    def _timeout_within(self, deadline: float):
+        """The configured timeout, shortened to the time left before deadline."""
+        remaining = max(deadline - time.monotonic(), 0.001)
+        if isinstance(self.timeout, tuple):
+            return tuple(min(t, remaining) for t in self.timeout)
+        return min(self.timeout, remaining)
+
+    def _remember(self, cache_key: Hashable, result) -> None:
+        with self._lock:
+            self._last_good[cache_key] = (time.monotonic(), result)
+            self._last_good.move_to_end(cache_key)
+            while len(self._last_good) > self.fallback_entries:
+                self._last_good.popitem(last=False)
+
+    def _fallback(self, cache_key: Hashable, error: ProviderError) -> Tuple[Any, float]:
+        """The last good result for cache_key and its age, unless older than fallback_max_age."""
+        with self._lock:
+            if cache_key in self._last_good:
+                stored, result = self._last_good[cache_key]
+                age = time.monotonic() - stored
+                if age <= self.fallback_max_age:
+                    print(f"{self.name}: serving last known result from {age:.0f}s ago ({error})")
+                    return result, age
+                del self._last_good[cache_key]
+        raise error
+
+    def call_with_age(
+        self,
+        func: Callable,
+        cache_key: Optional[Hashable] = None,
+        deadline: Optional[float] = None
+    ) -> Tuple[Any, Optional[float]]:
+        """
+        Run a provider call with retries, circuit breaking and fallback.
+
+        Args:
+            func: Zero-argument callable performing one attempt
+            cache_key: Key under which a successful result is remembered and
+                looked up for fallback (None disables fallback)
+            deadline: time.monotonic() value after which no retry starts
+                (defaults to now plus the client's deadline)
+
+        Returns:
+            Tuple of (result, age). age is None for a fresh result, or the
+            seconds since the fallback result was fetched
+
+        Raises:
+            CircuitOpenError: The circuit is open and nothing recent is cached
+            ProviderError: All attempts failed and nothing recent is cached
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline
+        if not self.breaker.allow():
+            return self._fallback(cache_key, CircuitOpenError(self.name, "circuit open"))
+
+        for attempt in range(self.retries + 1):
+            try:
+                result = func()
+            except Exception as e:
+                if attempt < self.retries and is_retryable(e):
+                    delay = self._backoff(attempt, e)
+                    if time.monotonic() + delay + self._connect_timeout() < deadline:
+                        time.sleep(delay)
+                        continue
+                self.breaker.record_failure()
+                error = ProviderError(self.name, f"{type(e).__name__}: {e}")
+                return self._fallback(cache_key, error)
+            self.breaker.record_success()
+            if cache_key is not None:
+                self._remember(cache_key, result)
+            return result, None
+
+    def call(self, func: Callable, cache_key: Optional[Hashable] = None):
+        """
+        Run a provider call as call_with_age does, without the fallback age.
+
+        Returns:
+            The call's result, or a recent enough last successful result for cache_key
+        """
+        return self.call_with_age(func, cache_key)[0]
+
+    def get_json(
+        self,
+        url: str,
+        params: Optional[dict] = None,
+        use_fallback: bool = True,
+        with_age: bool = False
+    ):
+        """
+        GET a JSON document through the pooled session.
+
+        Every attempt's timeouts are shortened to fit the call's deadline.
+
+        Args:
+            url: Request URL
+            params: Query parameters
+            use_fallback: Remember the result and fall back to it on failure
+            with_age: Return (json, age) as call_with_age does
+
+        Returns:
+            Decoded JSON response (or the tuple with its fallback age)
+        """
+        deadline = time.monotonic() + self.deadline
+
+        def attempt():
+            response = self.session.get(url, params=params, timeout=self._timeout_within(deadline))
+            response.raise_for_status()
+            return response.json()
+
+        cache_key = (url, tuple(sorted((params or {}).items()))) if use_fallback else None
+        result = self.call_with_age(attempt, cache_key, deadline)
+        return result if with_age else result[0]
+
+
+_clients: Dict[str, ProviderClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider: str) -> ProviderClient:
+    """
+    Get the shared client for a provider, creating it on first use.
+
+    Args:
+        provider: Provider name from HTTP_PROVIDERS
+
+    Returns:
+        ProviderClient shared by every caller in the process
+    """
+    with _clients_lock:
+        if provider not in _clients:
+            _clients[provider] = ProviderClient(provider, **HTTP_PROVIDERS.get(provider, {}))
+        return _clients[provider]
@@ -0,0 +1,464 @@
+"""
+Load testing for the ABIA Traffic Accident Forecaster.
+
+Contains a headless driver for the app's prediction flow. Simulated
+sessions search for an address, pick a suggestion, choose a vehicle and
+driver and predict, pausing between steps. They use the same shared
+services as the app: the suggestion service, location prefetcher,
+prediction cache, climatology fallback, attribution, audit log and drift
+monitor. The external APIs are replaced by a src.provider_stub, so runs
+are repeatable and need no network access.
+
+Each worker process stands in for one app replica and runs its sessions
+as threads, as Streamlit does. Workers report per-stage latencies plus
+their CPU time and peak memory. The parent merges these into throughput
+and percentiles. Given several concurrency levels (--sessions 10 20 40),
+it reports the largest level that meets LOADTEST_P95_TARGET_MS and
+LOADTEST_MAX_ERROR_RATE.
+
+Usage:
+    python -m src.loadtest --record --sessions 2 --duration 120        (record cassettes once)
+    python -m src.loadtest --sessions 10 25 50 --latency-ms 80 --jitter-ms 30
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing import get_context
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from .config import (
+    VEHICLE_MAP, GENDER_MAP, WEATHER_UNITS, CASSETTE_DIR, DEFAULT_TIMEZONE, GEOCODER_MIN_INTERVAL,
+    LIVE_WEATHER_BUDGET, PREFETCH_WAIT_SECONDS,
+    LOADTEST_ADDRESSES, LOADTEST_ZIPF_EXPONENT, LOADTEST_THINK_SECONDS, LOADTEST_DURATION_SECONDS,
+    LOADTEST_P95_TARGET_MS, LOADTEST_MAX_ERROR_RATE
+)
+from .attribution import ForestAttribution, attribution_target, top_factors
+from .audit import PredictionLogger
+from .climatology import ClimatologyTable
+from .drift import DriftMonitor
+from .geocoding import GEOCODER_ERROR, SuggestionService
+from .history import AccidentRateCube
+from .http_client import ProviderError
+from .prediction_cache import PredictionCache, cached_predict_proba
+from .prefetch import LocationPrefetcher
+from .provider_stub import ProviderStub
+from .registry import ModelRegistry, load_version_metadata
+from .weather import fetch_current_weather, open_meteo_fields
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+# Stages timed for every session step, in the order they are reported
+STAGES = ['suggest', 'weather', 'inference', 'explain', 'predict']
+PERCENTILES = [50, 90, 95, 99]
+
+
+# --- Simulated Sessions ---
+class _Worker:
+    """Shared services of one simulated app replica, built as the app builds them."""
+
+    def __init__(self, audit_dir: Path):
+        self.registry = ModelRegistry()
+        handle = self.registry.current()
+        if handle is None:
+            raise RuntimeError("No model to serve; train or publish one first")
+        self.suggestions = SuggestionService()
+        self.prefetcher = LocationPrefetcher()
+        self.cache = PredictionCache()
+        self.climatology = ClimatologyTable.load()
+        self.cube = AccidentRateCube.load()
+        self.logger = PredictionLogger(audit_dir, close_at_exit=False)
+        reference = load_version_metadata(handle.version).get('drift_reference') \
+            if not handle.version.startswith('legacy-') else None
+        self.monitor = DriftMonitor(reference, handle.version, snapshot_dir=None) if reference else None
+        self._attributions = {}
+        self._attributions_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.counters = {'sessions': 0, 'searches': 0, 'predictions': 0, 'estimated': 0, 'errors': 0}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, stage: str, started: float) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.samples[stage].append(elapsed_ms)
+
+    def count(self, name: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.counters[name] += 1
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def explain(self, handle, X: pd.DataFrame, row: pd.Series) -> list:
+        """Top factors for one prediction, as the app's explain_prediction computes them."""
+        forest, columns, shard_version = attribution_target(handle.model, handle.model_columns, row['State'])
+        key = handle.version if shard_version is None else f"{handle.version}/{shard_version}"
+        with self._attributions_lock:
+            if key not in self._attributions:
+                self._attributions[key] = ForestAttribution(forest, columns)
+            attribution = self._attributions[key]
+        contributions = attribution.explain(X.reindex(columns=columns, fill_value=0))
+        return top_factors(contributions.iloc[0], row)
+
+
+def _think(rng: random.Random, mean: float, deadline: float) -> bool:
+    """Sleep for an exponential think time; False if the run ends first."""
+    pause = rng.expovariate(1 / mean) if mean > 0 else 0.0
+    if time.monotonic() + pause >= deadline:
+        return False
+    time.sleep(pause)
+    return True
+
+
+def _suggest(worker: _Worker, session_id: str, address: str, state: str, immediate: bool) -> list:
+    """Request suggestions the way the app's location panel does."""
+    future = worker.suggestions.request(session_id, address, state, immediate=immediate)
+    try:
+        return future.result(timeout=30)
+    except CancelledError:
+        return []
+    except FutureTimeoutError:
+        return list(GEOCODER_ERROR)
+
+
+def _predict(worker: _Worker, session_id: str, state: str, lat: float, lon: float,
+             vehicle: str, driver: str) -> Optional[float]:
+    """Run one predict click: wait for weather, score, explain and log."""
+    started = time.perf_counter()
+    context = worker.prefetcher.peek(session_id, lat, lon)
+    now = datetime.now(pytz.timezone(context['timezone'] if context else DEFAULT_TIMEZONE))
+
+    step = time.perf_counter()
+    worker.prefetcher.prefetch(session_id, lat, lon)
+    budget = LIVE_WEATHER_BUDGET if worker.climatology else PREFETCH_WAIT_SECONDS
+    context = worker.prefetcher.result(session_id, lat, lon, timeout=budget)
+    weather = context['weather'] if context else None
+    if not weather and worker.climatology:
+        weather = worker.climatology.lookup(state, now.month, now.hour)
+    if not weather:
+        try:
+            weather = fetch_current_weather(lat, lon)
+        except ProviderError:
+            weather = None
+    worker.record('weather', step)
+    if not weather:
+        worker.count('errors', 'no_weather')
+        return None
+
+    handle = worker.registry.current()
+    step = time.perf_counter()
+    row = handle.transformer.features_one({
+        'timestamp': now, 'lat': lat, 'lon': lon, 'state': state,
+        'vehicle': vehicle, 'gender': driver, **open_meteo_fields(weather)
+    }, **WEATHER_UNITS)
+    input_df = pd.DataFrame([row])
+    probability = cached_predict_proba(
+        worker.cache, handle.model, input_df, handle.model_columns, handle.version, handle.transformer
+    )[0]
+    if worker.monitor is not None:
+        worker.monitor.update(row)
+    if worker.cube is not None:
+        worker.cube.lookup(state, row['Hour'], row['DayOfWeek'], row['WeatherCondition'], row['VehicleType'])
+    worker.record('inference', step)
+
+    step = time.perf_counter()
+    try:
+        worker.explain(handle, handle.transformer.encode(input_df), input_df.iloc[0])
+    except Exception as e:
+        print(f"Error explaining prediction: {e}")
+    worker.record('explain', step)
+
+    worker.logger.log({
+        'session_id': session_id,
+        'trigger': 'loadtest',
+        'model_version': handle.version,
+        'probability': float(probability),
+        'estimated': bool(weather.get('estimated', False)),
+        'latency_ms': (time.perf_counter() - started) * 1000,
+        'inputs': row
+    })
+    worker.record('predict', started)
+    worker.count('predictions')
+    if weather.get('estimated'):
+        worker.count('estimated')
+    return probability
+
+
+def run_session(worker: _Worker, seed: int, deadline: float, think: float, addresses: Sequence[tuple]) -> None:
+    """
+    Drive one simulated user until the deadline.
+
+    Each visit: type an address (sometimes submitting a partial query first),
+    pick one of the first suggestions, choose a vehicle and driver, predict,
+    and sometimes predict again with a different vehicle before searching anew.
+
+    Args:
+        worker: The replica's shared services
+        seed: Seed for this user's choices and think times
+        deadline: time.monotonic() at which to stop
+        think: Mean think time in seconds
+        addresses: (query, state) pairs, most popular first
+    """
+    rng = random.Random(seed)
+    session_id = uuid.uuid4().hex
+    weights = [1 / (rank + 1) ** LOADTEST_ZIPF_EXPONENT for rank in range(len(addresses))]
+    worker.count('sessions')
+    while _think(rng, think, deadline):
+        address, state = rng.choices(addresses, weights)[0]
+        if rng.random() < 0.3:
+            _suggest(worker, session_id, address[:max(3, int(len(address) * 0.6))], state, immediate=False)
+        started = time.perf_counter()
+        suggestions = _suggest(worker, session_id, address, state, immediate=rng.random() < 0.5)
+        worker.record('suggest', started)
+        worker.count('searches')
+        if not suggestions or suggestions == GEOCODER_ERROR:
+            worker.count('errors', 'geocoder_error' if suggestions else 'no_suggestions')
+            continue
+
+        _, lat, lon = rng.choice(suggestions[:3])
+        worker.prefetcher.prefetch(session_id, lat, lon)
+        vehicle, driver = rng.choice(list(VEHICLE_MAP)), rng.choice(list(GENDER_MAP))
+        while _think(rng, think, deadline):
+            try:
+                _predict(worker, session_id, state, lat, lon, vehicle, driver)
+            except Exception as e:
+                print(f"Error in simulated prediction: {e}")
+                worker.count('errors', type(e).__name__)
+            if rng.random() >= 0.4:
+                break
+            vehicle = rng.choice(list(VEHICLE_MAP))
+    worker.prefetcher.cancel(session_id)
+    worker.suggestions.cancel(session_id)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB (None where unavailable)."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux reports KB
+
+
+def _run_worker(task: dict) -> dict:
+    """Run one replica's sessions (in a worker process) and return its measurements."""
+    if task['rate_limits']:
+        from .geocoding import HostRateLimiter, _rate_limiters  # Stand-ins are exempt by default
+        for name, interval in GEOCODER_MIN_INTERVAL.items():
+            _rate_limiters.setdefault(name, HostRateLimiter(f"loadtest_{name}", interval))
+
+    with tempfile.TemporaryDirectory(prefix='roadrisk-loadtest-') as audit_dir:
+        worker = _Worker(Path(audit_dir))
+        idle_rss = _peak_rss_mb()
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        deadline = time.monotonic() + task['duration']
+        threads = [
+            threading.Thread(
+                target=run_session, name=f"session-{i}",
+                args=(worker, task['seed'] + i, deadline, task['think'], task['addresses'])
+            )
+            for i in range(task['sessions'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+        worker.logger.close()
+
+    return {
+        'worker': task['worker'],
+        'sessions': task['sessions'],
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'idle_rss_mb': idle_rss,
+        'peak_rss_mb': _peak_rss_mb(),
+        'samples': worker.samples,
+        'counters': worker.counters,
+        'errors': worker.errors,
+        'services': {
+            'suggestions': worker.suggestions.stats(),
+            'prefetch': worker.prefetcher.stats(),
+            'prediction_cache': worker.cache.stats(),
+            'audit_log': worker.logger.stats()
+        }
+    }
+
+
+# --- Runs ---
+def summarise(results: List[dict]) -> dict:
+    """
+    Merge worker measurements into one concurrency level's figures.
+
+    Args:
+        results: Outputs of the worker processes
+
+    Returns:
+        Dictionary with sessions, throughput, error rate, per-stage
+        percentiles (ms) and per-worker CPU and memory
+    """
+    counters = {name: sum(r['counters'][name] for r in results) for name in results[0]['counters']}
+    errors = {}
+    for r in results:
+        for kind, n in r['errors'].items():
+            errors[kind] = errors.get(kind, 0) + n
+    stages = {}
+    for stage in STAGES:
+        values = np.concatenate([np.asarray(r['samples'][stage], dtype=float) for r in results])
+        if len(values):
+            stages[stage] = {'count': int(len(values)),
+                             **{f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))},
+                             'max': float(values.max())}
+    attempts = counters['searches'] + counters['predictions']
+    return {
+        'sessions': sum(r['sessions'] for r in results),
+        'workers': len(results),
+        'predictions_per_second': sum(r['counters']['predictions'] / r['wall_seconds'] for r in results),
+        'searches_per_second': sum(r['counters']['searches'] / r['wall_seconds'] for r in results),
+        'error_rate': counters['errors'] / attempts if attempts else 0.0,
+        'estimated_share': counters['estimated'] / counters['predictions'] if counters['predictions'] else 0.0,
+        'counters': counters,
+        'errors': errors,
+        'stages': stages,
+        'per_worker': [{
+            'worker': r['worker'],
+            'sessions': r['sessions'],
+            'cpu_utilisation': r['cpu_seconds'] / r['wall_seconds'],
+            'idle_rss_mb': r['idle_rss_mb'],
+            'peak_rss_mb': r['peak_rss_mb'],
+            'services': r['services']
+        } for r in results]
+    }
+
+
+def run_level(sessions: int, workers: int, duration: float, think: float, seed: int,
+              rate_limits: bool = False, addresses: Sequence[tuple] = LOADTEST_ADDRESSES) -> dict:
+    """
+    Run one concurrency level across worker processes.
+
+    Workers are started fresh with the 'spawn' method, so they read the
+    provider URLs from the environment set by the caller.
+
+    Args:
+        sessions: Concurrent simulated users, split evenly across workers
+        workers: Worker processes (simulated replicas)
+        duration: Seconds each worker runs its sessions
+        think: Mean think time in seconds
+        seed: Base seed; every session gets its own
+        rate_limits: Apply the public geocoders' request intervals to the stand-ins
+        addresses: (query, state) pairs, most popular first
+
+    Returns:
+        Output of summarise
+    """
+    workers = max(1, min(workers, sessions))
+    tasks = [{
+        'worker': w,
+        'sessions': sessions // workers + (w < sessions % workers),
+        'duration': duration,
+        'think': think,
+        'seed': seed + w * 100_000,
+        'rate_limits': rate_limits,
+        'addresses': list(addresses)
+    } for w in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as executor:
+        return summarise(list(executor.map(_run_worker, tasks)))
+
+
+def meets_target(level: dict) -> bool:
+    """True if a level's predict-step p95 and error rate are within the configured targets."""
+    predict = level['stages'].get('predict')
+    return (predict is not None and predict['p95'] <= LOADTEST_P95_TARGET_MS
+            and level['error_rate'] <= LOADTEST_MAX_ERROR_RATE)
+
+
+def format_level(level: dict) -> str:
+    """Human-readable report of one concurrency level."""
+    lines = [
+        f"{level['sessions']} sessions on {level['workers']} worker(s): "
+        f"{level['predictions_per_second']:.2f} predictions/s, {level['searches_per_second']:.2f} searches/s, "
+        f"errors {level['error_rate']:.1%}, estimated weather {level['estimated_share']:.0%}"
+        f" -> {'meets target' if meets_target(level) else 'misses target'}"
+    ]
+    lines.append(f"  {'stage':<10}{'count':>7}" + ''.join(f"{f'p{p}':>9}" for p in PERCENTILES) + f"{'max':>9}")
+    for stage, s in level['stages'].items():
+        lines.append(f"  {stage:<10}{s['count']:>7}" + ''.join(f"{s[f'p{p}']:>9.1f}" for p in PERCENTILES)
+                     + f"{s['max']:>9.1f}")
+    for w in level['per_worker']:
+        memory = f"{w['idle_rss_mb']:.0f} MB idle, {w['peak_rss_mb']:.0f} MB peak" \
+            if w['peak_rss_mb'] is not None else "memory n/a"
+        lines.append(f"  worker {w['worker']}: {w['sessions']} sessions, "
+                     f"CPU {w['cpu_utilisation']:.0%} of a core, {memory}")
+    if level['errors']:
+        lines.append(f"  errors: {level['errors']}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the prediction flow with simulated sessions.")
+    parser.add_argument('--sessions', nargs='+', type=int, default=[10],
+                        help="Concurrent sessions; several values run one level each")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (simulated app replicas)")
+    parser.add_argument('--duration', type=float, default=LOADTEST_DURATION_SECONDS, help="Seconds per level")
+    parser.add_argument('--think', type=float, default=LOADTEST_THINK_SECONDS, help="Mean think time in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--record', action='store_true',
+                        help="Proxy to the public APIs and record cassettes instead of replaying them")
+    parser.add_argument('--cassettes', type=Path, default=CASSETTE_DIR, help="Cassette directory")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latency added by the API stand-ins")
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of 503s from the stand-ins")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of 429s from the stand-ins")
+    parser.add_argument('--rate-limits', action='store_true',
+                        help="Apply the public geocoders' request intervals to the stand-ins")
+    parser.add_argument('--out', type=Path, default=None, help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    stub = ProviderStub(
+        'record' if args.record else 'replay', args.cassettes, port=0,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, seed=args.seed
+    )
+    with stub:
+        os.environ['ROADRISK_PROVIDER_STUB'] = f"http://{stub.host}:{stub.port}"
+        levels = []
+        for sessions in args.sessions:
+            level = run_level(sessions, args.workers, args.duration, args.think, args.seed, args.rate_limits)
+            levels.append(level)
+            print(format_level(level))
+            print()
+        stub_stats = stub.stats()
+
+    if stub_stats['missing']:
+        print(f"Warning: {stub_stats['missing']} requests had no recording; run once with --record "
+              f"to fill {args.cassettes}")
+    passing = [level for level in levels if meets_target(level)]
+    if passing:
+        best = max(passing, key=lambda level: level['sessions'])
+        print(f"Capacity: {best['sessions']} concurrent sessions on {best['workers']} worker(s) "
+              f"({best['predictions_per_second']:.2f} predictions/s) within p95 {LOADTEST_P95_TARGET_MS} ms "
+              f"and {LOADTEST_MAX_ERROR_RATE:.0%} errors")
+    else:
+        print(f"No level met p95 {LOADTEST_P95_TARGET_MS} ms with {LOADTEST_MAX_ERROR_RATE:.0%} errors")
+    if args.out:
+        args.out.write_text(json.dumps({'levels': levels, 'provider_stub': stub_stats}, indent=2, default=str))
+        print(f"Wrote {args.out}")
+
+
+if __name__ == '__main__':
+    main()
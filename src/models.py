@@ -5,6 +5,8 @@ Contains functions for loading trained models and preparing prediction inputs.
 """
 
 import joblib
+import warnings
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import Tuple, Optional
@@ -39,6 +41,20 @@ def load_model_assets(
         return None, None
 
 
+def get_model_version(model_path: Path) -> str:
+    """
+    Identify a model artifact by file size and modification time.
+    
+    Args:
+        model_path: Path to the model pickle file
+        
+    Returns:
+        Version string; changes whenever the artifact is replaced
+    """
+    stat = Path(model_path).stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
 def prepare_prediction_input(
     input_df: pd.DataFrame,
     model_columns: pd.Index
@@ -47,21 +63,35 @@ def prepare_prediction_input(
     Prepare input DataFrame for model prediction.
     
     Performs one-hot encoding and aligns columns to match training format.
+    Uses the training encoder (src.encoding), so integer categoricals such
+    as Month get their one-hot columns too.
     
     Args:
-        input_df: DataFrame with raw feature values
+        input_df: DataFrame with MODEL_FEATURES columns
         model_columns: Expected column names from training
         
     Returns:
         DataFrame ready for model.predict()
     """
-    # One-hot encode categorical features
-    encoded_df = pd.get_dummies(input_df)
-    
-    # Align columns to match training format (fill missing with 0)
-    final_df = encoded_df.reindex(columns=model_columns, fill_value=0)
-    
-    return final_df
+    from .encoding import encode_dense
+    return pd.DataFrame(encode_dense(input_df, model_columns), columns=model_columns, index=input_df.index)
+
+
+def predict_positive(model, X, states=None) -> np.ndarray:
+    """
+    Accident probabilities for encoded rows.
+
+    Args:
+        model: Trained classifier or ShardedModel
+        X: Encoded rows (prepare_prediction_input output)
+        states: Raw State value of each row; a ShardedModel routes on these
+
+    Returns:
+        Array of accident probabilities (0-1), one per row
+    """
+    if states is not None and getattr(model, 'routes_by_state', False):
+        return model.predict_proba(X, states=np.asarray(states, dtype=object))[:, 1]
+    return model.predict_proba(X)[:, 1]
 
 
 def predict_accident_risk(
@@ -83,7 +113,40 @@ def predict_accident_risk(
         - probability: Probability of accident (0-1)
     """
     prepared_df = prepare_prediction_input(input_df, model_columns)
-    prediction = model.predict(prepared_df)[0]
-    probability = model.predict_proba(prepared_df)[0][1]
+    probability = predict_positive(model, prepared_df, input_df['State'])[0]
+    prediction = int(probability > 0.5)
     
     return prediction, probability
+
+
+def predict_accident_risk_batch(
+    model,
+    input_df: pd.DataFrame,
+    model_columns: pd.Index,
+    sparse: bool = False
+) -> np.ndarray:
+    """
+    Predict accident probabilities for many rows in a single model call.
+    
+    Args:
+        model: Trained classifier model
+        input_df: DataFrame with one row of feature values per prediction
+        model_columns: Expected column names from training
+        sparse: Encode straight to a CSR matrix (src.encoding.encode_sparse)
+            instead of a one-hot DataFrame; needs a plain estimator, not a
+            ShardedModel
+        
+    Returns:
+        Array of accident probabilities (0-1), one per input row
+    """
+    if input_df.empty:
+        return np.empty(0)
+    if sparse:
+        from .encoding import encode_sparse
+        X = encode_sparse(input_df, model_columns)
+        with warnings.catch_warnings():
+            # Models fitted on DataFrames warn that a CSR matrix has no column names
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            return model.predict_proba(X)[:, 1]
+    prepared_df = prepare_prediction_input(input_df, model_columns)
+    return predict_positive(model, prepared_df, input_df['State'])
@@ -0,0 +1,172 @@
+"""
+Prediction memoization for the ABIA Traffic Accident Forecaster.
+
+Every model input except the four continuous weather values is a small
+categorical, so requests from the same area and time repeat constantly.
+This module caches probabilities keyed on the categorical tuple plus the
+weather values quantized to configurable steps.
+"""
+
+import threading
+import time
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from .config import (
+    MODEL_FEATURES, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, WEATHER_QUANTIZATION
+)
+from .models import predict_positive, prepare_prediction_input
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of accident probabilities with optional TTL.
+
+    Entries are keyed by model version as well as inputs, so sessions still
+    holding the old model during a hot swap neither clear nor pollute the
+    new version's entries; the old version's entries age out of the LRU.
+    Safe to share between Streamlit sessions (threads).
+    """
+
+    def __init__(
+        self,
+        max_size: int = PREDICTION_CACHE_SIZE,
+        ttl: Optional[float] = PREDICTION_CACHE_TTL,
+        quantization: Optional[Dict[str, float]] = None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.quantization = dict(WEATHER_QUANTIZATION if quantization is None else quantization)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, record: dict) -> tuple:
+        """
+        Build the cache key for one input record.
+
+        Continuous weather values are snapped to the centre of their
+        quantization step; all other features are used as-is.
+
+        Args:
+            record: Mapping with MODEL_FEATURES keys
+
+        Returns:
+            Tuple of feature values in MODEL_FEATURES order
+        """
+        key = []
+        for feature in MODEL_FEATURES:
+            value = record[feature]
+            step = self.quantization.get(feature)
+            if step:
+                value = round(float(value) / step) * step
+            key.append(value)
+        return tuple(key)
+
+    def get(self, key: Hashable) -> Optional[float]:
+        """Return the cached probability for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: float) -> None:
+        """Store a probability, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Report cache effectiveness.
+
+        Returns:
+            Dictionary with hits, misses, hit_rate, size and model_versions
+            (distinct versions with entries)
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+                'model_versions': len({version for version, _ in self._entries})
+            }
+
+
+def cached_predict_proba(
+    cache: PredictionCache,
+    model,
+    input_df: pd.DataFrame,
+    model_columns: pd.Index,
+    model_version: Hashable,
+    transformer=None
+) -> np.ndarray:
+    """
+    Predict accident probabilities, serving repeated inputs from the cache.
+
+    Weather values are quantized before scoring, so a probability depends
+    only on its model version and cache key, not on which request populated it. Hits skip
+    one-hot encoding and the forest walk; all misses are encoded and scored
+    together in one model call.
+
+    Args:
+        cache: Shared PredictionCache
+        model: Trained classifier model
+        input_df: DataFrame with MODEL_FEATURES columns, one row per prediction
+        model_columns: Expected column names from training
+        model_version: Identifier of the model artifact
+        transformer: The model version's FeatureTransformer, which then
+            encodes the misses (a single miss from precomputed column
+            positions)
+
+    Returns:
+        Array of accident probabilities (0-1), one per input row
+    """
+    keys = [cache.make_key(record) for record in input_df.to_dict('records')]
+
+    probabilities = np.empty(len(keys))
+    missing = []
+    for i, key in enumerate(keys):
+        value = cache.get((model_version, key))
+        if value is None:
+            missing.append(i)
+        else:
+            probabilities[i] = value
+
+    if missing:
+        states = [keys[i][MODEL_FEATURES.index('State')] for i in missing]
+        if transformer is not None and len(missing) == 1:
+            prepared_df = transformer.encode_one(dict(zip(MODEL_FEATURES, keys[missing[0]])))
+        else:
+            quantized = pd.DataFrame([keys[i] for i in missing], columns=MODEL_FEATURES)
+            if transformer is not None:
+                prepared_df = transformer.encode(quantized)
+            else:
+                prepared_df = prepare_prediction_input(quantized, model_columns)
+        scored = predict_positive(model, prepared_df, states)
+        probabilities[missing] = scored
+        for i, value in zip(missing, scored):
+            cache.put((model_version, keys[i]), float(value))
+
+    return probabilities
@@ -0,0 +1,217 @@
+"""
+Location prefetch for the ABIA Traffic Accident Forecaster.
+
+Contains a service that starts fetching live weather and resolving the
+timezone as soon as a location is selected, so the predict step only has
+to encode and score. Each session has at most one prefetch: selecting a
+new location or clearing the selection cancels the previous one, and
+sessions selecting the same location share one upstream call.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from .config import PREFETCH_WORKERS, PREFETCH_TTL, PREFETCH_WAIT_SECONDS
+from .features import get_local_timezone
+from .http_client import ProviderError
+from .weather import fetch_current_weather
+
+
+def fetch_location_context(lat: float, lon: float) -> dict:
+    """
+    Fetch everything a prediction needs to know about a location.
+
+    Args:
+        lat: Latitude
+        lon: Longitude
+
+    Returns:
+        Dictionary with weather (see fetch_current_weather, or None),
+        weather_error (message or None) and timezone (name)
+    """
+    try:
+        weather, error = fetch_current_weather(lat, lon), None
+    except ProviderError as e:
+        weather, error = None, str(e)
+    return {
+        'weather': weather,
+        'weather_error': error,
+        'timezone': get_local_timezone(lat, lon).zone
+    }
+
+
+class LocationPrefetcher:
+    """
+    Background weather/timezone prefetch shared by all sessions.
+
+    Each session has at most one prefetch: a new location (or a cancel)
+    drops the previous one, which is cancelled outright if it has not
+    started and no other session is waiting on it. Sessions selecting the
+    same location share one fetch, and completed results are reused for
+    PREFETCH_TTL seconds; after that a request for the location, even from
+    the session that already holds the result, starts a new fetch.
+    Sessions whose result has expired are forgotten, so sessions that
+    ended do not accumulate.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[float, float], dict] = fetch_location_context,
+        ttl: float = PREFETCH_TTL,
+        max_workers: int = PREFETCH_WORKERS
+    ):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, tuple] = {}
+        self._flights: Dict[tuple, tuple] = {}
+        self.counters = {'requests': 0, 'superseded': 0, 'coalesced': 0, 'upstream_calls': 0}
+
+    @staticmethod
+    def make_key(lat: float, lon: float) -> tuple:
+        """Round coordinates so selections of the same address share a fetch."""
+        return (round(lat, 4), round(lon, 4))
+
+    def prefetch(self, session_id: str, lat: float, lon: float) -> Future:
+        """
+        Start fetching a location's context for a session.
+
+        Args:
+            session_id: Identifier of the requesting session
+            lat: Latitude
+            lon: Longitude
+
+        Returns:
+            Future resolving to the context dict (see fetch_location_context)
+        """
+        key = self.make_key(lat, lon)
+        started = None
+        with self._lock:
+            self.counters['requests'] += 1
+            self._expire()
+            previous = self._sessions.pop(session_id, None)
+            if previous is not None:
+                if previous[0] == key and self._current(previous):
+                    self._sessions[session_id] = previous
+                    return previous[1]
+                self._release(previous)
+
+            flight = self._flights.get(key)
+            if flight is not None and not self._failed(flight[0]):
+                self.counters['coalesced'] += 1
+                future = flight[0]
+            else:
+                future = started = self._executor.submit(self._fetch, lat, lon)
+                self._flights[key] = (future, None)
+                self.counters['upstream_calls'] += 1
+            self._sessions[session_id] = (key, future)
+        if started is not None:
+            # Outside the lock: a fetch that has already finished runs _finished on this thread
+            started.add_done_callback(lambda f, key=key: self._finished(key, f))
+        return future
+
+    @staticmethod
+    def _failed(future: Future) -> bool:
+        """True for a cancelled fetch or one that finished without weather."""
+        if future.cancelled():
+            return True
+        if not future.done():
+            return False
+        return future.exception() is not None or not future.result().get('weather')
+
+    def _finished(self, key: tuple, future: Future) -> None:
+        """Start a completed fetch's TTL; failed fetches are retried on the next request."""
+        if future.cancelled():
+            return  # Runs inside _release's cancel(), which already holds the lock
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None or flight[0] is not future:
+                return
+            if self._failed(future):
+                del self._flights[key]
+            else:
+                self._flights[key] = (future, time.monotonic())
+
+    def _current(self, entry: tuple) -> bool:
+        """
+        True if a session's fetch is in flight or its result is within the TTL (lock held).
+
+        A fetch stays in _flights until it fails, is cancelled or expires.
+        """
+        key, future = entry
+        flight = self._flights.get(key)
+        return flight is not None and flight[0] is future and not self._failed(future)
+
+    def _expire(self) -> None:
+        """Drop completed results older than the TTL, and sessions holding them (lock held)."""
+        now = time.monotonic()
+        for key, (_, finished_at) in list(self._flights.items()):
+            if finished_at is not None and now - finished_at >= self.ttl:
+                del self._flights[key]
+        for session_id, entry in list(self._sessions.items()):
+            if entry[1].done() and not self._current(entry):
+                del self._sessions[session_id]
+
+    def _release(self, entry: tuple) -> None:
+        """Cancel a dropped prefetch unless another session still wants it (lock held)."""
+        key, future = entry
+        if any(other is future for _, other in self._sessions.values()):
+            return
+        if future.cancel():
+            self.counters['superseded'] += 1
+            self._flights.pop(key, None)
+
+    def cancel(self, session_id: str) -> None:
+        """Cancel a session's prefetch (e.g. when its selection is cleared)."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._release(entry)
+
+    def peek(self, session_id: str, lat: float, lon: float) -> Optional[dict]:
+        """Return the session's prefetched context for a location if it has already arrived."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None or entry[0] != self.make_key(lat, lon):
+            return None
+        future = entry[1]
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def result(
+        self,
+        session_id: str,
+        lat: float,
+        lon: float,
+        timeout: float = PREFETCH_WAIT_SECONDS
+    ) -> Optional[dict]:
+        """
+        Wait for the session's prefetched context for a location.
+
+        Args:
+            session_id: Identifier of the session
+            lat: Latitude
+            lon: Longitude
+            timeout: Longest time to wait for a fetch still in flight
+
+        Returns:
+            Context dict, or None if nothing was prefetched for this location
+            or the prefetch failed, was cancelled or timed out
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None or entry[0] != self.make_key(lat, lon):
+            return None
+        try:
+            return entry[1].result(timeout=timeout)
+        except Exception:
+            return None
+
+    def stats(self) -> dict:
+        """Return a copy of the request counters."""
+        with self._lock:
+            return dict(self.counters)
@@ -0,0 +1,295 @@
+"""
+Local provider stand-in for the ABIA Traffic Accident Forecaster.
+
+Contains a small HTTP server that sits in place of Open-Meteo (forecast and
+archive), Photon and Nominatim. Each provider is served under
+/<provider>/..., and the app is pointed at the server with the
+ROADRISK_PROVIDER_STUB environment variable (see PROVIDER_BASE_URLS).
+
+- record mode forwards each request to the public API and saves every
+  successful response as a cassette under CASSETTE_DIR;
+- replay mode answers from the cassettes only, with no network access;
+  requests that were never recorded get a 404.
+
+In both modes the server can add latency, 503 errors and 429 rate-limit
+responses at configurable rates. A fixed seed makes the injected faults
+repeatable for benchmarks.
+
+Usage:
+    python -m src.provider_stub --mode record
+    python -m src.provider_stub --mode replay --latency-ms 80 --jitter-ms 20 --error-rate 0.02 --rate-limit-rate 0.01
+    ROADRISK_PROVIDER_STUB=http://127.0.0.1:8765 streamlit run streamlit_app/main.py
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from .config import PUBLIC_PROVIDER_URLS, CASSETTE_DIR, PROVIDER_STUB_PORT
+
+MODES = ('record', 'replay')
+
+
+def request_key(path: str, query: str) -> str:
+    """Identify a request by its path and its query parameters in sorted order."""
+    canonical = f"{path}?{urlencode(sorted(parse_qsl(query, keep_blank_values=True)))}"
+    return hashlib.sha1(canonical.encode()).hexdigest()[:20]
+
+
+# --- Cassettes ---
+class Cassettes:
+    """
+    Recorded responses on disk, one JSON file per provider and request.
+
+    Args:
+        directory: Root directory (one subdirectory per provider)
+    """
+
+    def __init__(self, directory: Path = CASSETTE_DIR):
+        self.directory = Path(directory)
+
+    def _path(self, provider: str, path: str, query: str) -> Path:
+        return self.directory / provider / f"{request_key(path, query)}.json"
+
+    def load(self, provider: str, path: str, query: str) -> Optional[dict]:
+        """Return the recorded response for a request, or None."""
+        try:
+            return json.loads(self._path(provider, path, query).read_text())
+        except FileNotFoundError:
+            return None
+
+    def save(self, provider: str, path: str, query: str, status: int, content_type: str, body: str) -> None:
+        """Record a response (written atomically)."""
+        target = self._path(provider, path, query)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + '.tmp')
+        tmp.write_text(json.dumps({
+            'provider': provider, 'path': path, 'query': query,
+            'status': status, 'content_type': content_type, 'body': body
+        }))
+        os.replace(tmp, target)
+
+    def count(self) -> Dict[str, int]:
+        """Number of recorded responses per provider."""
+        if not self.directory.exists():
+            return {}
+        return {p.name: len(list(p.glob('*.json'))) for p in sorted(self.directory.iterdir()) if p.is_dir()}
+
+
+# --- Stub Server ---
+class ProviderStub:
+    """
+    Record/replay HTTP stand-in for the external providers, with fault injection.
+
+    Args:
+        mode: 'record' (proxy to upstreams and save) or 'replay' (cassettes only)
+        cassette_dir: Cassette root directory
+        host: Interface to listen on
+        port: Port to listen on (0 picks a free one)
+        latency_ms: Added delay per response
+        jitter_ms: Uniform +/- variation of the delay
+        error_rate: Fraction of requests answered with 503
+        rate_limit_rate: Fraction of requests answered with 429
+        retry_after: Retry-After seconds sent with 429 responses
+        seed: Seed for the injected delays and faults
+        upstreams: Public base URL per provider (record mode)
+    """
+
+    def __init__(
+        self,
+        mode: str = 'replay',
+        cassette_dir: Path = CASSETTE_DIR,
+        host: str = '127.0.0.1',
+        port: int = PROVIDER_STUB_PORT,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: Optional[int] = 0,
+        upstreams: Dict[str, str] = PUBLIC_PROVIDER_URLS
+    ):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        self.cassettes = Cassettes(cassette_dir)
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.upstreams = dict(upstreams)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._session = requests.Session()
+        self.counters = {'requests': 0, 'replayed': 0, 'recorded': 0, 'missing': 0,
+                         'injected_errors': 0, 'rate_limited': 0, 'upstream_errors': 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _draw(self) -> Tuple[float, float]:
+        """Next (delay seconds, fault draw) from the seeded generator."""
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            return max(0.0, self.latency_ms + jitter) / 1000, self._rng.random()
+
+    def handle(self, provider: str, path: str, query: str, headers: Optional[dict] = None) -> Tuple[int, dict, bytes]:
+        """
+        Answer one request.
+
+        Args:
+            provider: Provider name (first path segment)
+            path: Remaining request path, e.g. '/v1/forecast'
+            query: Raw query string
+            headers: Incoming request headers (User-Agent is forwarded when recording)
+
+        Returns:
+            Tuple of (status, response headers, body)
+        """
+        self._count('requests')
+        delay, draw = self._draw()
+        if delay:
+            time.sleep(delay)
+        if draw < self.rate_limit_rate:
+            self._count('rate_limited')
+            return 429, {'Retry-After': f"{self.retry_after:g}", 'Content-Type': 'application/json'}, \
+                b'{"error": "rate limited (injected)"}'
+        if draw < self.rate_limit_rate + self.error_rate:
+            self._count('injected_errors')
+            return 503, {'Content-Type': 'application/json'}, b'{"error": "unavailable (injected)"}'
+
+        if self.mode == 'replay':
+            recorded = self.cassettes.load(provider, path, query)
+            if recorded is None:
+                self._count('missing')
+                body = json.dumps({'error': 'no recorded response', 'provider': provider,
+                                   'key': request_key(path, query)})
+                return 404, {'Content-Type': 'application/json'}, body.encode()
+            self._count('replayed')
+            return recorded['status'], {'Content-Type': recorded['content_type']}, recorded['body'].encode()
+
+        upstream = self.upstreams.get(provider)
+        if upstream is None:
+            return 404, {'Content-Type': 'application/json'}, b'{"error": "unknown provider"}'
+        user_agent = (headers or {}).get('User-Agent')
+        try:
+            response = self._session.get(
+                f"{upstream}{path}", params=query, timeout=30,
+                headers={'User-Agent': user_agent} if user_agent else None
+            )
+        except requests.RequestException as e:
+            self._count('upstream_errors')
+            return 502, {'Content-Type': 'application/json'}, json.dumps({'error': str(e)}).encode()
+        content_type = response.headers.get('Content-Type', 'application/json')
+        if response.status_code == 200:
+            self.cassettes.save(provider, path, query, 200, content_type, response.text)
+            self._count('recorded')
+        else:
+            self._count('upstream_errors')
+        return response.status_code, {'Content-Type': content_type}, response.content
+
+    def stats(self) -> dict:
+        """Return a copy of the request counters."""
+        with self._lock:
+            return dict(self.counters)
+
+    # --- Lifecycle ---
+    def start(self) -> str:
+        """
+        Serve in a background thread.
+
+        Returns:
+            Base URL to use as ROADRISK_PROVIDER_STUB
+        """
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, as the real providers
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path == '/__stats':
+                    status, headers, body = 200, {'Content-Type': 'application/json'}, \
+                        json.dumps(stub.stats()).encode()
+                else:
+                    provider, _, rest = parts.path.lstrip('/').partition('/')
+                    status, headers, body = stub.handle(provider, '/' + rest, parts.query, dict(self.headers))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # One line per request would dominate benchmark output
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='provider-stub', daemon=True).start()
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'ProviderStub':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the weather and geocoding APIs.")
+    parser.add_argument('--mode', choices=MODES, default='replay')
+    parser.add_argument('--cassettes', type=Path, default=CASSETTE_DIR, help="Cassette directory")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PROVIDER_STUB_PORT)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Added delay per response")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Uniform +/- variation of the delay")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of 503 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="Retry-After sent with 429s")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for injected delays and faults")
+    args = parser.parse_args()
+
+    stub = ProviderStub(
+        args.mode, args.cassettes, args.host, args.port, args.latency_ms, args.jitter_ms,
+        args.error_rate, args.rate_limit_rate, args.retry_after, args.seed
+    )
+    url = stub.start()
+    recorded = stub.cassettes.count()
+    print(f"Provider stub ({args.mode}) on {url}; cassettes: {recorded or 'none yet'}")
+    print(f"Point the app at it with: ROADRISK_PROVIDER_STUB={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+        print(f"Stopped; {stub.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Incremental model refresh for the ABIA Traffic Accident Forecaster.
+
+New monthly violation files are processed on their own (clean, weather
+enrichment, features) into PARTITIONS_DIR, so history is never reprocessed.
+The serving forest is then grown with extra trees fitted on only the new
+partitions (scikit-learn's warm_start), optionally dropping the oldest
+trees, and published to the registry as a new version for review; it
+serves once promoted. The partitions each version has seen are recorded
+in its metadata.
+
+Usage:
+    python -m src.refresh --raw raw/2024-05.csv raw/2024-06.csv
+    python -m src.refresh --raw raw/2024-07.csv --new-trees 20 --max-trees 200
+    python -m src.refresh --raw raw/2024-08.csv --promote
+"""
+
+import argparse
+import copy
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from sklearn.model_selection import train_test_split
+from typing import List, Optional, Sequence
+
+from .config import (
+    TARGET_COLUMN, RANDOM_STATE, TEST_SIZE, REGISTRY_DIR,
+    PARTITIONS_DIR, REFRESH_NEW_TREES, REFRESH_MAX_TREES, ENRICH_WORKERS, WEATHER_STORE_DIR
+)
+from .data_processing import clean_traffic_data, filter_by_states, remove_missing_weather
+from .drift import extend_reference_profile
+from .registry import ModelRegistry, load_version_metadata, publish_model
+from .training import evaluate_model, read_table
+from .transformer import FeatureTransformer, records_from_enriched
+from .weather import enrich_with_historical_weather
+from .weather_store import WeatherStore
+
+
+# --- Partitions ---
+def partition_name(raw_path: Path) -> str:
+    """Partition name for a raw file (its file name without extension)."""
+    return Path(raw_path).stem
+
+
+def process_partition(
+    raw_path: Path,
+    partitions_dir: Path = PARTITIONS_DIR,
+    states: Optional[List[str]] = None,
+    max_workers: int = ENRICH_WORKERS,
+    weather_store: Optional[WeatherStore] = None
+) -> Path:
+    """
+    Clean, enrich and featurize one raw file into a Parquet partition.
+
+    Already-processed partitions are reused, so only new files hit the
+    weather archive (or the local weather store, when given).
+
+    Args:
+        raw_path: Raw violation records (CSV or Parquet, notebook schema)
+        partitions_dir: Output directory for processed partitions
+        states: States to keep (defaults to STATE_LIST)
+        max_workers: Concurrent weather archive requests
+        weather_store: Local store of ingested archive dumps to enrich from
+
+    Returns:
+        Path of the processed partition
+    """
+    partitions_dir = Path(partitions_dir)
+    target = partitions_dir / f"{partition_name(raw_path)}.parquet"
+    if target.exists():
+        return target
+
+    df = clean_traffic_data(read_table(raw_path))
+    df = filter_by_states(df, states)
+    df = enrich_with_historical_weather(df, max_workers=max_workers, store=weather_store)
+    df = remove_missing_weather(df)
+    features = FeatureTransformer().features(records_from_enriched(df))
+    features[TARGET_COLUMN] = df[TARGET_COLUMN]
+
+    partitions_dir.mkdir(parents=True, exist_ok=True)
+    staging = target.with_suffix('.parquet.tmp')
+    features.reset_index(drop=True).to_parquet(staging, index=False)
+    staging.replace(target)
+    return target
+
+
+# --- Forest Growth ---
+def grow_forest(model, X: np.ndarray, y: np.ndarray, new_trees: int, max_trees: Optional[int] = None):
+    """
+    Return a copy of a fitted forest with extra trees fitted on new data.
+
+    Args:
+        model: Fitted RandomForestClassifier
+        X: Encoded new rows
+        y: Labels for the new rows
+        new_trees: Number of trees to add
+        max_trees: Drop the oldest trees beyond this count (None keeps all)
+
+    Returns:
+        Tuple of (grown model, number of trees dropped)
+    """
+    grown = copy.deepcopy(model)
+    grown.set_params(warm_start=True, n_estimators=len(grown.estimators_) + new_trees)
+    with warnings.catch_warnings():
+        # 'balanced' weights are meant to come from the new month's own class mix here
+        warnings.filterwarnings('ignore', message='class_weight presets')
+        grown.fit(X, y)
+    grown.set_params(warm_start=False)
+
+    dropped = 0
+    if max_trees is not None and len(grown.estimators_) > max_trees:
+        dropped = len(grown.estimators_) - max_trees
+        grown.estimators_ = grown.estimators_[dropped:]
+        grown.set_params(n_estimators=len(grown.estimators_))
+    return grown, dropped
+
+
+def refresh_model(
+    raw_paths: Sequence[Path],
+    new_trees: int = REFRESH_NEW_TREES,
+    max_trees: Optional[int] = REFRESH_MAX_TREES,
+    states: Optional[List[str]] = None,
+    partitions_dir: Path = PARTITIONS_DIR,
+    registry_dir: Path = REGISTRY_DIR,
+    publish: bool = True,
+    version: Optional[str] = None,
+    seed: int = RANDOM_STATE,
+    weather_store: Optional[WeatherStore] = None,
+    promote: bool = False
+) -> dict:
+    """
+    Grow the current model with the partitions it has not seen yet.
+
+    A stratified holdout of the new rows is kept aside to compare the
+    current and refreshed models on the most recent data.
+
+    Args:
+        raw_paths: Raw monthly files (already-seen partitions are skipped)
+        new_trees: Trees to add
+        max_trees: Maximum forest size after the refresh
+        states: States to keep
+        partitions_dir: Processed partition directory
+        registry_dir: Registry holding the current model
+        publish: Publish the refreshed model
+        version: Registry version name (defaults to a timestamp)
+        seed: Random seed for the holdout split
+        weather_store: Local store of ingested archive dumps to enrich from
+        promote: Point CURRENT at the published version (otherwise it is
+            published for review and promoted with src.registry promote)
+
+    Returns:
+        Refresh report (also stored in the published version's metadata)
+    """
+    started = time.perf_counter()
+    current = ModelRegistry(registry_dir, shards_dir=None).current()
+    if current is None:
+        raise FileNotFoundError("No model to refresh; train one with src.training first")
+    base_metadata = load_version_metadata(current.version, registry_dir)
+    seen = base_metadata.get('partitions', [])
+
+    new_paths = [p for p in raw_paths if partition_name(p) not in seen]
+    report = {'base_version': current.version, 'new_partitions': [partition_name(p) for p in new_paths]}
+    if not new_paths:
+        report['seconds'] = {'total': time.perf_counter() - started}
+        return report
+
+    frames = [
+        pd.read_parquet(process_partition(p, partitions_dir, states, weather_store=weather_store))
+        for p in new_paths
+    ]
+    df = pd.concat(frames, ignore_index=True)
+    prepared = time.perf_counter()
+
+    X = current.transformer.encode(df).to_numpy()
+    y = df[TARGET_COLUMN].to_numpy(dtype=np.int8)
+    fit_idx, holdout_idx = train_test_split(
+        np.arange(len(y)), test_size=TEST_SIZE, stratify=y, random_state=seed
+    )
+    # Score with named columns, as the serving model sees them
+    holdout = pd.DataFrame(X[holdout_idx], columns=current.model_columns)
+
+    model, dropped = grow_forest(
+        current.model, pd.DataFrame(X[fit_idx], columns=current.model_columns), y[fit_idx],
+        new_trees, max_trees
+    )
+    report.update({
+        'rows': int(len(y)),
+        'trees': len(model.estimators_),
+        'trees_added': new_trees,
+        'trees_dropped': dropped,
+        'holdout_metrics': {
+            'base': {k: v for k, v in evaluate_model(current.model, holdout, y[holdout_idx]).items()
+                     if k != 'classification_report'},
+            'refreshed': {k: v for k, v in evaluate_model(model, holdout, y[holdout_idx]).items()
+                          if k != 'classification_report'}
+        },
+        'seconds': {
+            'prepare': prepared - started,
+            'total': time.perf_counter() - started
+        }
+    })
+    if publish:
+        metadata = {'refresh': report, 'partitions': seen + report['new_partitions']}
+        if base_metadata.get('drift_reference'):
+            metadata['drift_reference'] = extend_reference_profile(base_metadata['drift_reference'], df)
+        report['version'] = publish_model(
+            model, current.model_columns, version, registry_dir, metadata=metadata,
+            make_current=promote, transformer=current.transformer
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grow the current model with new monthly data.")
+    parser.add_argument('--raw', nargs='+', type=Path, required=True,
+                        help="Raw monthly violation files (CSV/Parquet)")
+    parser.add_argument('--states', nargs='+', default=None, help="States to keep")
+    parser.add_argument('--new-trees', type=int, default=REFRESH_NEW_TREES, help="Trees to add")
+    parser.add_argument('--max-trees', type=int, default=REFRESH_MAX_TREES,
+                        help="Drop the oldest trees beyond this count")
+    parser.add_argument('--version', default=None, help="Registry version name")
+    parser.add_argument('--no-publish', action='store_true', help="Skip publishing")
+    parser.add_argument('--promote', action='store_true', help="Make the published version current")
+    parser.add_argument('--weather-store', type=Path, nargs='?', const=WEATHER_STORE_DIR, default=None,
+                        help="Enrich from a local weather store instead of the archive API")
+    args = parser.parse_args()
+
+    store = None
+    if args.weather_store:
+        store = WeatherStore.load(args.weather_store)
+        if store is None:
+            parser.error(f"No weather store at {args.weather_store}; ingest dumps with src.weather_store first")
+    report = refresh_model(
+        args.raw, args.new_trees, args.max_trees, args.states,
+        publish=not args.no_publish, version=args.version, weather_store=store,
+        promote=args.promote
+    )
+    if not report['new_partitions']:
+        print(f"No new partitions; {report['base_version']} is up to date")
+        return
+    metrics = report['holdout_metrics']
+    print(f"Added {report['trees_added']} trees on {report['rows']} rows "
+          f"({', '.join(report['new_partitions'])}); dropped {report['trees_dropped']}")
+    print(f"Holdout AUC {metrics['base']['auc']:.4f} -> {metrics['refreshed']['auc']:.4f} | "
+          f"Brier {metrics['base']['brier']:.4f} -> {metrics['refreshed']['brier']:.4f}")
+    print(f"Finished in {report['seconds']['total']:.1f}s"
+          + (f"; published version {report['version']}" if 'version' in report else ""))
+    if 'version' in report and not args.promote:
+        print(f"Promote it with: python -m src.registry promote {report['version']}")
+
+
+if __name__ == '__main__':
+    main()
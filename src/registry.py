@@ -0,0 +1,356 @@
+"""
+Versioned model registry for the ABIA Traffic Accident Forecaster.
+
+Artifacts live under models/registry/<version>/ (model.pkl,
+model_columns.pkl, transformer.json, metadata.json) and a CURRENT file names the version
+to serve. Serving processes poll CURRENT, load and warm a new version in
+the background and swap it in atomically between requests.
+
+Usage:
+    python -m src.registry list
+    python -m src.registry publish MODEL_PKL COLUMNS_PKL [--version V]
+    python -m src.registry promote VERSION
+"""
+
+import argparse
+import json
+import os
+import threading
+import joblib
+import pandas as pd
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from .config import MODEL_PATH, COLUMNS_PATH, REGISTRY_DIR, REGISTRY_POLL_SECONDS, REGISTRY_RETRY_MAX_SECONDS, SHARDS_DIR
+from .models import load_model_assets, get_model_version
+from .transformer import FeatureTransformer
+
+MODEL_FILE = 'model.pkl'
+COLUMNS_FILE = 'model_columns.pkl'
+METADATA_FILE = 'metadata.json'
+TRANSFORMER_FILE = 'transformer.json'
+CURRENT_FILE = 'CURRENT'
+
+
+# --- Registry Storage ---
+def list_versions(registry_dir: Path = REGISTRY_DIR) -> List[str]:
+    """
+    List published model versions, oldest first.
+
+    Args:
+        registry_dir: Registry root directory
+
+    Returns:
+        Sorted list of version names
+    """
+    registry_dir = Path(registry_dir)
+    if not registry_dir.exists():
+        return []
+    return sorted(p.name for p in registry_dir.iterdir() if (p / MODEL_FILE).exists())
+
+
+def get_current_version(registry_dir: Path = REGISTRY_DIR) -> Optional[str]:
+    """
+    Read the version named by the registry's CURRENT pointer.
+
+    Args:
+        registry_dir: Registry root directory
+
+    Returns:
+        Version name, or None if no version is current
+    """
+    try:
+        version = (Path(registry_dir) / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def set_current_version(version: str, registry_dir: Path = REGISTRY_DIR) -> None:
+    """
+    Atomically point CURRENT at a published version.
+
+    Args:
+        version: Version name to serve
+        registry_dir: Registry root directory
+    """
+    registry_dir = Path(registry_dir)
+    if not (registry_dir / version / MODEL_FILE).exists():
+        raise FileNotFoundError(f"Model version {version} is not in {registry_dir}")
+    tmp = registry_dir / f".{CURRENT_FILE}.tmp"
+    tmp.write_text(version + '\n')
+    os.replace(tmp, registry_dir / CURRENT_FILE)
+
+
+def publish_model(
+    model,
+    model_columns: pd.Index,
+    version: Optional[str] = None,
+    registry_dir: Path = REGISTRY_DIR,
+    metadata: Optional[dict] = None,
+    make_current: bool = True,
+    transformer: Optional[FeatureTransformer] = None
+) -> str:
+    """
+    Write a model artifact as a new registry version.
+
+    Files are written to a temporary directory and renamed into place, so a
+    partially written version is never visible.
+
+    Args:
+        model: Trained classifier model
+        model_columns: Column names the model was trained on
+        version: Version name (defaults to a UTC timestamp)
+        registry_dir: Registry root directory
+        metadata: Extra JSON-serialisable metadata (metrics, data range, ...)
+        make_current: Point CURRENT at the new version
+        transformer: Fitted feature transformer (defaults to one over model_columns)
+
+    Returns:
+        The published version name
+    """
+    registry_dir = Path(registry_dir)
+    registry_dir.mkdir(parents=True, exist_ok=True)
+    if version is None:
+        version = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    target = registry_dir / version
+    if target.exists():
+        raise FileExistsError(f"Model version {version} already exists")
+
+    staging = registry_dir / f".{version}.tmp"
+    staging.mkdir()
+    joblib.dump(model, staging / MODEL_FILE)
+    joblib.dump(model_columns, staging / COLUMNS_FILE)
+    (transformer or FeatureTransformer(model_columns)).save(staging / TRANSFORMER_FILE)
+    info = {'version': version, 'created_at': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')}
+    info.update(metadata or {})
+    (staging / METADATA_FILE).write_text(json.dumps(info, indent=2, default=str))
+    os.replace(staging, target)
+
+    if make_current:
+        set_current_version(version, registry_dir)
+    return version
+
+
+def load_version_metadata(version: str, registry_dir: Path = REGISTRY_DIR) -> dict:
+    """Read a version's metadata.json (empty dict if missing)."""
+    try:
+        return json.loads((Path(registry_dir) / version / METADATA_FILE).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def update_version_metadata(version: str, updates: dict, registry_dir: Path = REGISTRY_DIR) -> dict:
+    """
+    Merge keys into a published version's metadata.json (written atomically).
+
+    Args:
+        version: Version name
+        updates: Keys to add or replace
+        registry_dir: Registry root directory
+
+    Returns:
+        The updated metadata
+    """
+    path = Path(registry_dir) / version / METADATA_FILE
+    if not path.parent.exists():
+        raise FileNotFoundError(f"Model version {version} is not in {registry_dir}")
+    info = load_version_metadata(version, registry_dir)
+    info.update(updates)
+    tmp = path.with_name(f".{METADATA_FILE}.tmp")
+    tmp.write_text(json.dumps(info, indent=2, default=str))
+    os.replace(tmp, path)
+    return info
+
+
+# --- Serving ---
+class ModelHandle:
+    """A loaded model version and its feature transformer. Requests keep a reference for their duration."""
+
+    def __init__(
+        self,
+        model,
+        model_columns: pd.Index,
+        version: str,
+        path: Optional[Path] = None,
+        transformer: Optional[FeatureTransformer] = None
+    ):
+        self.model = model
+        self.model_columns = model_columns
+        self.version = version
+        self.path = path
+        self.transformer = transformer or FeatureTransformer(model_columns)
+
+
+def load_handle(version: str, registry_dir: Path = REGISTRY_DIR) -> Optional[ModelHandle]:
+    """
+    Load and warm a registry version.
+
+    Args:
+        version: Version name
+        registry_dir: Registry root directory
+
+    Returns:
+        ModelHandle, or None if the artifacts could not be loaded
+    """
+    path = Path(registry_dir) / version
+    model, model_columns = load_model_assets(path / MODEL_FILE, path / COLUMNS_FILE)
+    if model is None:
+        return None
+    transformer = None
+    if (path / TRANSFORMER_FILE).exists():  # Versions published before transformers have only columns
+        transformer = FeatureTransformer.load(path / TRANSFORMER_FILE)
+    handle = ModelHandle(model, model_columns, version, path, transformer)
+    warm_up(handle)
+    return handle
+
+
+def warm_up(handle: ModelHandle) -> None:
+    """Run one prediction so the first real request doesn't pay first-call costs."""
+    sample = pd.DataFrame([[0] * len(handle.model_columns)], columns=handle.model_columns)
+    handle.model.predict_proba(sample)
+
+
+class ModelRegistry:
+    """
+    Serves the current registry version and hot-swaps it when CURRENT changes.
+
+    Callers take the handle once per request (current()) and use it
+    throughout, so a swap never changes the model mid-request. The old
+    version is freed when the last request holding it drops its reference.
+    A CURRENT version that fails to load keeps the served one in place and
+    is retried with doubling back-off rather than on every poll.
+
+    If the registry is empty, the legacy MODEL_PATH/COLUMNS_PATH pair is served.
+    If shards_dir contains per-state shards, the served model is wrapped in a
+    ShardedModel so rows are routed to their state's shard transparently;
+    shards are rediscovered whenever a new pooled version is swapped in.
+    """
+
+    def __init__(
+        self,
+        registry_dir: Path = REGISTRY_DIR,
+        poll_interval: float = REGISTRY_POLL_SECONDS,
+        fallback_paths=(MODEL_PATH, COLUMNS_PATH),
+        shards_dir: Optional[Path] = SHARDS_DIR
+    ):
+        self.registry_dir = Path(registry_dir)
+        self.poll_interval = poll_interval
+        self.fallback_paths = fallback_paths
+        self.shards_dir = Path(shards_dir) if shards_dir else None
+        self._handle: Optional[ModelHandle] = None
+        self._swap_lock = threading.Lock()
+        self._failures = {}  # version -> (consecutive failures, monotonic time of next attempt)
+        self._stop = threading.Event()
+        self._watcher = None
+        self.refresh()
+
+    def _load_fallback(self) -> Optional[ModelHandle]:
+        model_path, columns_path = self.fallback_paths
+        model, model_columns = load_model_assets(model_path, columns_path)
+        if model is None:
+            return None
+        return ModelHandle(model, model_columns, f"legacy-{get_model_version(model_path)}", Path(model_path))
+
+    def refresh(self) -> bool:
+        """
+        Load the version named by CURRENT if it differs from the served one.
+
+        Returns:
+            True if a new version was swapped in
+        """
+        version = get_current_version(self.registry_dir)
+        current = self._handle
+        if version is None:
+            if current is not None:
+                return False
+            handle = self._load_fallback()
+        else:
+            if current is not None and current.version == version:
+                return False
+            handle = self._load_version(version)
+        if handle is None:
+            return False
+        if self.shards_dir is not None and self.shards_dir.is_dir() and any(self.shards_dir.iterdir()):
+            from .sharding import ShardedModel
+            handle.model = ShardedModel(handle.model, handle.model_columns, self.shards_dir)
+        with self._swap_lock:
+            self._handle = handle
+        print(f"Model version {handle.version} is now serving")
+        return True
+
+    def _load_version(self, version: str) -> Optional[ModelHandle]:
+        """Load a registry version, backing off after failed attempts."""
+        failures, retry_at = self._failures.get(version, (0, 0.0))
+        if time.monotonic() < retry_at:
+            return None
+        try:
+            handle = load_handle(version, self.registry_dir)
+            error = None if handle is not None else "artifacts missing or unreadable"
+        except Exception as e:
+            handle, error = None, f"{type(e).__name__}: {e}"
+        if handle is not None:
+            self._failures.pop(version, None)
+            return handle
+        delay = min(self.poll_interval * 2 ** failures, REGISTRY_RETRY_MAX_SECONDS)
+        self._failures[version] = (failures + 1, time.monotonic() + delay)
+        print(f"Could not load model version {version} ({error}); retrying in {delay:.0f}s")
+        return None
+
+    def start(self) -> 'ModelRegistry':
+        """Start the background watcher thread (idempotent)."""
+        if self._watcher is None or not self._watcher.is_alive():
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the background watcher thread."""
+        self._stop.set()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing model registry: {e}")
+
+    def current(self) -> Optional[ModelHandle]:
+        """Return the handle serving new requests."""
+        return self._handle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the model registry.")
+    parser.add_argument('--registry', type=Path, default=REGISTRY_DIR, help="Registry directory")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="List versions")
+    publish = sub.add_parser('publish', help="Publish model artifacts as a new version")
+    publish.add_argument('model', type=Path)
+    publish.add_argument('columns', type=Path)
+    publish.add_argument('--version', default=None)
+    publish.add_argument('--no-promote', action='store_true', help="Don't make it current")
+    promote = sub.add_parser('promote', help="Point CURRENT at a version")
+    promote.add_argument('version')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        current = get_current_version(args.registry)
+        for version in list_versions(args.registry):
+            print(f"{'*' if version == current else ' '} {version}")
+    elif args.command == 'publish':
+        version = publish_model(
+            joblib.load(args.model), joblib.load(args.columns), args.version,
+            args.registry, make_current=not args.no_promote
+        )
+        print(f"Published {version}")
+    elif args.command == 'promote':
+        set_current_version(args.version, args.registry)
+        print(f"{args.version} is now current")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Route risk scoring for the ABIA Traffic Accident Forecaster.
+
+Contains functions for resampling a route polyline, deduplicating weather
+lookups into grid cells and scoring every segment in a single model call.
+"""
+
+import math
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional, Sequence, Tuple, Union
+
+from .config import (
+    MODEL_FEATURES, VEHICLE_MAP, GENDER_MAP,
+    ROUTE_SAMPLE_SPACING_KM, WEATHER_GRID_DEG
+)
+from .features import get_local_timezone, get_part_of_day
+from .models import predict_accident_risk_batch
+from .weather import fetch_hourly_forecast, to_model_weather
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Open-Meteo serves at most 16 forecast days
+MAX_FORECAST_DAYS = 16
+
+_PART_OF_DAY_BY_HOUR = np.array([get_part_of_day(h) for h in range(24)], dtype=object)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great-circle distance between coordinate arrays.
+
+    Args:
+        lat1, lon1: Start coordinates in degrees (scalars or arrays)
+        lat2, lon2: End coordinates in degrees (scalars or arrays)
+
+    Returns:
+        Distance in kilometres
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _to_epoch_seconds(etas: Sequence[Union[datetime, float, int]]) -> np.ndarray:
+    """Convert ETAs (timezone-aware datetimes or Unix seconds) to a float array."""
+    return np.array([
+        eta.timestamp() if isinstance(eta, datetime) else float(eta)
+        for eta in etas
+    ], dtype=float)
+
+
+def resample_route(
+    points: Sequence[Tuple[float, float]],
+    etas: Sequence[Union[datetime, float, int]],
+    spacing_km: float = ROUTE_SAMPLE_SPACING_KM
+) -> pd.DataFrame:
+    """
+    Resample a route polyline to evenly spaced points.
+
+    Positions and ETAs are interpolated linearly along the cumulative
+    distance of the polyline; the route's end point is always kept.
+
+    Args:
+        points: Sequence of (lat, lon) vertices
+        etas: ETA at each vertex (timezone-aware datetimes or Unix seconds)
+        spacing_km: Distance between resampled points
+
+    Returns:
+        DataFrame with lat, lon, eta (Unix seconds) and vertex (index of the
+        input vertex each sample follows)
+    """
+    if len(points) < 2:
+        raise ValueError("A route needs at least two points")
+    if len(points) != len(etas):
+        raise ValueError("points and etas must have the same length")
+    if spacing_km <= 0:
+        raise ValueError("spacing_km must be positive")
+
+    coords = np.asarray(points, dtype=float)
+    eta_s = _to_epoch_seconds(etas)
+    if np.any(np.diff(eta_s) < 0):
+        raise ValueError("etas must be non-decreasing along the route")
+
+    step = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    cumulative = np.concatenate([[0.0], np.cumsum(step)])
+    total = cumulative[-1]
+
+    if total == 0:
+        distances = np.array([0.0, 0.0])
+    else:
+        distances = np.append(np.arange(0.0, total, spacing_km), total)
+
+    # np.interp needs strictly increasing x; duplicate vertices add no distance
+    keep = np.concatenate([[True], np.diff(cumulative) > 0])
+    xp = cumulative[keep]
+    vertex = np.flatnonzero(keep)[np.clip(np.searchsorted(xp, distances, side='right') - 1, 0, len(xp) - 1)]
+    if len(xp) == 1:
+        lat = np.full(len(distances), coords[0, 0])
+        lon = np.full(len(distances), coords[0, 1])
+        eta = np.array([eta_s[0], eta_s[-1]])
+    else:
+        lat = np.interp(distances, xp, coords[keep, 0])
+        lon = np.interp(distances, xp, coords[keep, 1])
+        eta = np.interp(distances, xp, eta_s[keep])
+
+    return pd.DataFrame({'lat': lat, 'lon': lon, 'eta': eta, 'vertex': vertex})
+
+
+def build_segments(samples: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn consecutive resampled points into scored segments.
+
+    Each segment is represented by its midpoint position and midpoint ETA.
+
+    Args:
+        samples: Output of resample_route
+
+    Returns:
+        DataFrame with lat, lon, eta, duration_s, distance_km and vertex
+    """
+    start = samples.iloc[:-1].reset_index(drop=True)
+    end = samples.iloc[1:].reset_index(drop=True)
+    return pd.DataFrame({
+        'lat': (start['lat'] + end['lat']) / 2,
+        'lon': (start['lon'] + end['lon']) / 2,
+        'eta': (start['eta'] + end['eta']) / 2,
+        'duration_s': end['eta'] - start['eta'],
+        'distance_km': haversine_km(start['lat'], start['lon'], end['lat'], end['lon']),
+        'vertex': start['vertex']
+    })
+
+
+def assign_weather_cells(
+    lat: np.ndarray,
+    lon: np.ndarray,
+    grid_deg: float = WEATHER_GRID_DEG
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Deduplicate coordinates into weather grid cells.
+
+    Args:
+        lat: Latitudes
+        lon: Longitudes
+        grid_deg: Cell size in degrees
+
+    Returns:
+        Tuple of (cell index per coordinate, DataFrame of unique cells with
+        their centre lat/lon)
+    """
+    ij = np.column_stack([
+        np.floor(np.asarray(lat) / grid_deg),
+        np.floor(np.asarray(lon) / grid_deg)
+    ]).astype(np.int64)
+    unique_ij, inverse = np.unique(ij, axis=0, return_inverse=True)
+    cells = pd.DataFrame({
+        'lat': np.round((unique_ij[:, 0] + 0.5) * grid_deg, 4),
+        'lon': np.round((unique_ij[:, 1] + 0.5) * grid_deg, 4)
+    })
+    return inverse.reshape(-1), cells
+
+
+def _nearest_hour_index(times: np.ndarray, eta: np.ndarray) -> np.ndarray:
+    """Index of the forecast hour closest to each ETA."""
+    idx = np.clip(np.searchsorted(times, eta), 1, len(times) - 1)
+    use_left = (eta - times[idx - 1]) <= (times[idx] - eta)
+    return np.where(use_left, idx - 1, idx)
+
+
+def score_route(
+    model,
+    model_columns: pd.Index,
+    points: Sequence[Tuple[float, float]],
+    etas: Sequence[Union[datetime, float, int]],
+    vehicle_type: str,
+    gender: str,
+    state: Union[str, Sequence[str]],
+    spacing_km: float = ROUTE_SAMPLE_SPACING_KM,
+    grid_deg: float = WEATHER_GRID_DEG,
+    fetch_forecast: Optional[Callable] = None,
+    max_workers: int = 8
+) -> dict:
+    """
+    Score accident risk along a route.
+
+    The route is resampled, its segments are grouped into weather grid
+    cells (one forecast fetch and one timezone lookup per cell), and every
+    segment is scored in a single model call.
+
+    Args:
+        model: Trained classifier model
+        model_columns: Expected column names from training
+        points: Sequence of (lat, lon) vertices
+        etas: ETA at each vertex (timezone-aware datetimes or Unix seconds)
+        vehicle_type: Vehicle type, as a VEHICLE_MAP key or model value
+        gender: Driver gender, as a GENDER_MAP key or model value
+        state: State code for the whole route, or one per vertex
+        spacing_km: Distance between resampled points
+        grid_deg: Weather grid cell size in degrees
+        fetch_forecast: Callable (lat, lon, forecast_days) -> hourly series;
+            defaults to fetch_hourly_forecast
+        max_workers: Concurrent forecast fetches
+
+    Returns:
+        Dictionary with:
+        - segments: DataFrame of per-segment inputs and probability
+          (NaN where weather was unavailable)
+        - max_probability: Highest segment probability
+        - time_weighted_probability: Probability averaged over travel time
+        - cells_fetched: Number of unique weather cells requested
+        - missing_cells: Number of cells whose forecast could not be fetched
+    """
+    if fetch_forecast is None:
+        fetch_forecast = fetch_hourly_forecast
+
+    segments = build_segments(resample_route(points, etas, spacing_km))
+
+    if isinstance(state, str):
+        segments['State'] = state
+    else:
+        if len(state) != len(points):
+            raise ValueError("state must be a single code or one per point")
+        segments['State'] = np.asarray(state, dtype=object)[segments['vertex'].to_numpy()]
+
+    cell_index, cells = assign_weather_cells(segments['lat'], segments['lon'], grid_deg)
+    segments['cell'] = cell_index
+
+    # --- Fetch each cell's forecast once ---
+    horizon_s = segments['eta'].max() - datetime.now().timestamp()
+    forecast_days = int(min(max(math.ceil(horizon_s / 86400) + 1, 1), MAX_FORECAST_DAYS))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        forecasts = list(executor.map(
+            lambda c: fetch_forecast(c[0], c[1], forecast_days),
+            zip(cells['lat'], cells['lon'])
+        ))
+
+    # --- Weather and local time features per cell ---
+    feature_frames = []
+    missing_cells = 0
+    for cell_id, forecast in enumerate(forecasts):
+        rows = segments.index[cell_index == cell_id]
+        if not forecast or not forecast.get('time'):
+            missing_cells += 1
+            continue
+
+        times = np.asarray(forecast['time'], dtype=float)
+        hour_idx = _nearest_hour_index(times, segments.loc[rows, 'eta'].to_numpy())
+        weather = [
+            to_model_weather({k: forecast[k][i] for k in forecast if k != 'time'})
+            for i in hour_idx
+        ]
+
+        tz = get_local_timezone(cells.at[cell_id, 'lat'], cells.at[cell_id, 'lon'])
+        local = pd.to_datetime(segments.loc[rows, 'eta'], unit='s', utc=True).dt.tz_convert(tz)
+        hours = local.dt.hour.to_numpy()
+
+        frame = pd.DataFrame(weather, index=rows)
+        frame['Hour'] = hours
+        frame['DayOfWeek'] = local.dt.day_name().to_numpy()
+        frame['Month'] = local.dt.month.to_numpy()
+        frame['PartOfDay'] = _PART_OF_DAY_BY_HOUR[hours]
+        feature_frames.append(frame)
+
+    segments['probability'] = np.nan
+    if feature_frames:
+        features = pd.concat(feature_frames).sort_index()
+        features['State'] = segments.loc[features.index, 'State']
+        features['VehicleType'] = VEHICLE_MAP.get(vehicle_type, vehicle_type)
+        features['Gender'] = GENDER_MAP.get(gender, gender)
+        features = features[MODEL_FEATURES]
+
+        probabilities = predict_accident_risk_batch(model, features, model_columns)
+        segments.loc[features.index, 'probability'] = probabilities
+        segments = segments.join(features.drop(columns=['State']))
+
+    scored = segments.dropna(subset=['probability'])
+    if scored.empty:
+        max_probability = time_weighted = float('nan')
+    else:
+        max_probability = float(scored['probability'].max())
+        weights = scored['duration_s'].to_numpy()
+        if weights.sum() > 0:
+            time_weighted = float(np.average(scored['probability'], weights=weights))
+        else:
+            time_weighted = float(scored['probability'].mean())
+
+    return {
+        'segments': segments,
+        'max_probability': max_probability,
+        'time_weighted_probability': time_weighted,
+        'cells_fetched': len(cells),
+        'missing_cells': missing_cells
+    }
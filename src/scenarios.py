@@ -0,0 +1,284 @@
+"""
+Demo scenario checks for the ABIA Traffic Accident Forecaster.
+
+Contains a runner for the reference cases in DEMO_SCENARIOS.md (Green,
+Yellow and Red). Each scenario is a fixture in DEMO_SCENARIOS_PATH with a
+location, vehicle, driver, pinned local time, the weather recorded for
+that hour from the Open-Meteo archive and an expected probability band.
+The runner scores every scenario through the app's scoring path (feature
+transformer + prediction cache), checks the band and times repeated cold
+predictions. A model build that moves a scenario out of its band, or
+makes it slower than its latency budget, fails the check, as does a
+scenario whose weather has not been recorded.
+
+To add a scenario, append an entry without weather to the fixture file and
+record it; "max_p95_ms" in an entry overrides the default latency budget
+for that scenario.
+
+Usage:
+    python -m src.scenarios
+    python -m src.scenarios --version 20240601-120000 --out scenarios.json
+    python -m src.scenarios --record        (record the pinned hours' weather, then check)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .config import DEMO_SCENARIOS_PATH, DEMO_SCENARIO_REPEATS, DEMO_SCENARIO_P95_MS, REGISTRY_DIR
+from .prediction_cache import PredictionCache, cached_predict_proba
+from .registry import ModelRegistry, load_handle
+from .transformer import TEMPERATURE_UNITS, WIND_SPEED_UNITS
+from .weather import fetch_historical_weather
+
+
+# --- Fixtures ---
+def load_scenarios(path: Path = DEMO_SCENARIOS_PATH) -> dict:
+    """
+    Read the scenario fixture file.
+
+    Returns:
+        Dictionary with 'weather_units' and the 'scenarios' list
+    """
+    return json.loads(Path(path).read_text())
+
+
+def scenario_record(scenario: dict) -> dict:
+    """Raw transformer record for a scenario (pinned local time and weather)."""
+    return {
+        'timestamp': datetime.fromisoformat(scenario['timestamp']),
+        'lat': scenario['lat'],
+        'lon': scenario['lon'],
+        'state': scenario['state'],
+        'vehicle': scenario['vehicle'],
+        'gender': scenario['gender'],
+        **scenario['weather']
+    }
+
+
+def archive_weather(scenario: dict, weather_units: dict) -> Optional[dict]:
+    """
+    Archive weather at a scenario's location and pinned local hour.
+
+    Args:
+        scenario: Scenario fixture
+        weather_units: Units to record in (the fixture's weather_units)
+
+    Returns:
+        Transformer weather fields, or None if the archive has no data
+        for that hour
+    """
+    pinned = datetime.fromisoformat(scenario['timestamp'])
+    hourly = fetch_historical_weather(scenario['lat'], scenario['lon'], pinned.date(), timezone='auto')
+    hour = pinned.strftime('%Y-%m-%dT%H:00')
+    if not hourly or hour not in hourly['time']:
+        return None
+    i = hourly['time'].index(hour)
+    if hourly['temperature_2m'][i] is None:
+        return None
+    # The archive answers in °C and km/h (the model's units); convert to the fixture's
+    scale, offset = TEMPERATURE_UNITS[weather_units.get('temperature_unit', 'celsius')]
+    return {
+        'temperature_2m': round((hourly['temperature_2m'][i] - offset) / scale, 1),
+        'precipitation': hourly['precipitation'][i],
+        'snowfall': hourly['snowfall'][i],
+        'weather_code': int(hourly['weathercode'][i]),
+        'wind_speed_10m': round(
+            hourly['windspeed_10m'][i] / WIND_SPEED_UNITS[weather_units.get('wind_speed_unit', 'kmh')], 1
+        )
+    }
+
+
+def record_weather(path: Path = DEMO_SCENARIOS_PATH, names: Optional[List[str]] = None) -> List[str]:
+    """
+    Record scenarios' weather from the Open-Meteo archive at their pinned local hour.
+
+    Args:
+        path: Fixture file (rewritten atomically)
+        names: Scenarios to record (defaults to all)
+
+    Returns:
+        Names of the scenarios that were recorded
+    """
+    spec = load_scenarios(path)
+    units = spec.get('weather_units', {})
+    recorded = []
+    for scenario in spec['scenarios']:
+        if names and scenario['name'] not in names:
+            continue
+        weather = archive_weather(scenario, units)
+        if weather is None:
+            print(f"Could not record weather for {scenario['name']} at {scenario['timestamp']}")
+            continue
+        scenario['weather'] = weather
+        scenario['weather_recorded_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds').replace(
+            '+00:00', 'Z'
+        )
+        recorded.append(scenario['name'])
+
+    staging = Path(path).with_suffix('.json.tmp')
+    staging.write_text(json.dumps(spec, indent=2) + '\n')
+    os.replace(staging, path)
+    return recorded
+
+
+# --- Scoring ---
+def score_scenario(handle, scenario: dict, weather_units: dict) -> Tuple[float, dict]:
+    """
+    Score one scenario as the app scores a predict click, with a cold cache.
+
+    Args:
+        handle: ModelHandle to check
+        scenario: Scenario fixture
+        weather_units: Units of the fixture's weather fields
+
+    Returns:
+        Tuple of (probability, model features)
+
+    Raises:
+        ValueError: The scenario's weather has not been recorded
+    """
+    if not scenario.get('weather'):
+        raise ValueError(f"No recorded weather for {scenario['name']}; run: python -m src.scenarios --record")
+    features = handle.transformer.features_one(scenario_record(scenario), **weather_units)
+    probability = cached_predict_proba(
+        PredictionCache(), handle.model, pd.DataFrame([features]),
+        handle.model_columns, handle.version, handle.transformer
+    )[0]
+    return float(probability), features
+
+
+def run_scenarios(
+    handle,
+    spec: dict,
+    repeats: int = DEMO_SCENARIO_REPEATS,
+    max_p95_ms: float = DEMO_SCENARIO_P95_MS
+) -> pd.DataFrame:
+    """
+    Check every scenario's probability band and scoring latency.
+
+    Each scenario is scored once untimed, then `repeats` more times with a
+    fresh cache so every run pays for encoding and inference.
+
+    Args:
+        handle: ModelHandle to check
+        spec: Fixture file contents (see load_scenarios)
+        repeats: Timed runs per scenario
+        max_p95_ms: Default latency budget for the p95 of the timed runs
+
+    Returns:
+        DataFrame indexed by scenario name with probability, the band,
+        p50_ms/p95_ms/max_ms, the budget and recorded (weather recorded),
+        in_band, stable (repeats agree), fast_enough and passed flags
+    """
+    units = spec.get('weather_units', {})
+    rows = []
+    for scenario in spec['scenarios']:
+        band = scenario['expected']
+        if not scenario.get('weather'):
+            rows.append({
+                'name': scenario['name'], 'probability': np.nan,
+                'min': band.get('min', 0.0), 'max': band.get('max', 1.0),
+                'p50_ms': np.nan, 'p95_ms': np.nan, 'max_ms': np.nan,
+                'budget_ms': scenario.get('max_p95_ms', max_p95_ms),
+                'part_of_day': None, 'weather_condition': None, 'recorded': False,
+                'in_band': False, 'stable': False, 'fast_enough': False, 'passed': False
+            })
+            continue
+        probability, features = score_scenario(handle, scenario, units)
+        timings, probabilities = [], []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            value, _ = score_scenario(handle, scenario, units)
+            timings.append((time.perf_counter() - started) * 1000)
+            probabilities.append(value)
+
+        budget = scenario.get('max_p95_ms', max_p95_ms)
+        p95 = float(np.percentile(timings, 95)) if timings else 0.0
+        row = {
+            'name': scenario['name'],
+            'probability': probability,
+            'min': band.get('min', 0.0),
+            'max': band.get('max', 1.0),
+            'p50_ms': float(np.percentile(timings, 50)) if timings else 0.0,
+            'p95_ms': p95,
+            'max_ms': max(timings, default=0.0),
+            'budget_ms': budget,
+            'part_of_day': features['PartOfDay'],
+            'weather_condition': features['WeatherCondition'],
+            'recorded': True
+        }
+        row['in_band'] = row['min'] <= probability <= row['max']
+        row['stable'] = all(v == probability for v in probabilities)
+        row['fast_enough'] = p95 <= budget
+        row['passed'] = row['in_band'] and row['stable'] and row['fast_enough']
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('name')
+
+
+def format_report(version: str, report: pd.DataFrame) -> str:
+    """Human-readable summary of a scenario run."""
+    lines = [f"Model {version}: {int(report['passed'].sum())} of {len(report)} scenarios passed"]
+    for name, row in report.iterrows():
+        if not row['recorded']:
+            lines.append(f"  {name:<32} FAIL: weather not recorded (run with --record)")
+            continue
+        problems = []
+        if not row['in_band']:
+            problems.append(f"outside {row['min']:.0%}-{row['max']:.0%}")
+        if not row['stable']:
+            problems.append("unstable across repeats")
+        if not row['fast_enough']:
+            problems.append(f"p95 over {row['budget_ms']:.0f} ms")
+        status = 'ok' if row['passed'] else 'FAIL: ' + ', '.join(problems)
+        lines.append(
+            f"  {name:<32} {row['probability']:6.1%}  (expected {row['min']:.0%}-{row['max']:.0%})"
+            f"  p50 {row['p50_ms']:6.1f} ms  p95 {row['p95_ms']:6.1f} ms  {status}"
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the demo scenarios' probability bands and latency.")
+    parser.add_argument('--fixtures', type=Path, default=DEMO_SCENARIOS_PATH, help="Scenario fixture file")
+    parser.add_argument('--version', default=None, help="Registry version to check (defaults to the served model)")
+    parser.add_argument('--repeats', type=int, default=DEMO_SCENARIO_REPEATS, help="Timed runs per scenario")
+    parser.add_argument('--max-p95-ms', type=float, default=DEMO_SCENARIO_P95_MS,
+                        help="Default per-scenario latency budget")
+    parser.add_argument('--record', nargs='*', default=None, metavar='NAME',
+                        help="Record the pinned hours' weather from the Open-Meteo archive "
+                             "(all scenarios, or the named ones), then run the check")
+    parser.add_argument('--out', type=Path, default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.record is not None:
+        recorded = record_weather(args.fixtures, args.record)
+        print(f"Recorded weather for {len(recorded)} scenario(s): {', '.join(recorded) or 'none'}")
+
+    if args.version:
+        handle = load_handle(args.version, REGISTRY_DIR)
+    else:
+        handle = ModelRegistry().current()
+    if handle is None:
+        parser.error("No model found; train one with src.training first")
+
+    report = run_scenarios(handle, load_scenarios(args.fixtures), args.repeats, args.max_p95_ms)
+    print(format_report(handle.version, report))
+    if args.out:
+        args.out.write_text(json.dumps(
+            {'version': handle.version, 'scenarios': report.reset_index().to_dict('records')},
+            indent=2, default=str
+        ))
+    if not report['passed'].all():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
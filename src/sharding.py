@@ -0,0 +1,179 @@
+"""
+Per-state model sharding for the ABIA Traffic Accident Forecaster.
+
+Each state (or region) can have its own forest, published as a small
+registry under models/shards/<STATE>/. ShardedModel behaves like a single
+classifier on the output of prepare_prediction_input, with each row's raw
+State value passed alongside (states=...). Routing never decodes the
+State_* columns, so states the pooled model has no column for still reach
+their own shard. It loads a state's shard the first time it is needed,
+keeps at most a fixed number resident (LRU) and falls back to the pooled
+model for states without a shard, or when no states are given.
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+from .config import SHARDS_DIR, MAX_RESIDENT_SHARDS
+from .registry import ModelHandle, get_current_version, load_handle, publish_model
+
+
+def publish_shard(
+    state: str,
+    model,
+    model_columns: pd.Index,
+    shards_dir: Path = SHARDS_DIR,
+    **publish_kwargs
+) -> str:
+    """
+    Publish a model as the current shard for one state.
+
+    Args:
+        state: State code
+        model: Classifier trained on that state's rows
+        model_columns: Column names the model was trained on
+        shards_dir: Root directory of all shards
+        **publish_kwargs: Extra arguments for publish_model
+
+    Returns:
+        The published version name
+    """
+    return publish_model(model, model_columns, registry_dir=Path(shards_dir) / state, **publish_kwargs)
+
+
+class ShardedModel:
+    """
+    Classifier facade that routes rows to per-state shards.
+
+    Args:
+        pooled_model: Model trained on all states, used as the fallback
+        model_columns: Encoded columns produced by prepare_prediction_input
+        shards_dir: Root directory of all shards
+        max_resident: Maximum number of shards kept in memory
+    """
+
+    # Tells predict_positive to pass raw states along with the encoded rows
+    routes_by_state = True
+
+    def __init__(
+        self,
+        pooled_model,
+        model_columns: pd.Index,
+        shards_dir: Path = SHARDS_DIR,
+        max_resident: int = MAX_RESIDENT_SHARDS
+    ):
+        self.pooled_model = pooled_model
+        self.classes_ = pooled_model.classes_
+        self.model_columns = pd.Index(model_columns)
+        self.shards_dir = Path(shards_dir)
+        self.max_resident = max_resident
+
+        self._resident: "OrderedDict[str, ModelHandle]" = OrderedDict()
+        self._unavailable = set()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    # --- Routing ---
+    def get_shard(self, state: Optional[str]) -> Optional[ModelHandle]:
+        """
+        Get a state's shard, loading it on first use.
+
+        Args:
+            state: State code
+
+        Returns:
+            ModelHandle for the shard, or None if the state has no shard
+        """
+        if state is None:
+            return None
+        with self._lock:
+            if state in self._resident:
+                self._resident.move_to_end(state)
+                return self._resident[state]
+            if state in self._unavailable:
+                return None
+            load_lock = self._load_locks.setdefault(state, threading.Lock())
+
+        # Load outside the main lock so other states keep serving
+        with load_lock:
+            with self._lock:
+                if state in self._resident:
+                    return self._resident[state]
+            shard_dir = self.shards_dir / state
+            version = get_current_version(shard_dir)
+            handle = load_handle(version, shard_dir) if version else None
+            with self._lock:
+                if handle is None:
+                    self._unavailable.add(state)
+                    return None
+                self._resident[state] = handle
+                self.loads += 1
+                while len(self._resident) > self.max_resident:
+                    self._resident.popitem(last=False)
+                    self.evictions += 1
+            return handle
+
+    def reset(self) -> None:
+        """Forget loaded shards and negative lookups (e.g. after publishing shards)."""
+        with self._lock:
+            self._resident.clear()
+            self._unavailable.clear()
+
+    # --- Classifier Interface ---
+    def _shard_proba(self, handle: ModelHandle, X: pd.DataFrame) -> np.ndarray:
+        """Score rows with a shard, aligning its columns and classes to the pooled model."""
+        if not handle.model_columns.equals(self.model_columns):
+            X = X.reindex(columns=handle.model_columns, fill_value=0)
+        proba = handle.model.predict_proba(X)
+        aligned = np.zeros((len(X), len(self.classes_)))
+        for j, cls in enumerate(handle.model.classes_):
+            aligned[:, np.searchsorted(self.classes_, cls)] = proba[:, j]
+        return aligned
+
+    def predict_proba(self, X: pd.DataFrame, states: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Predict class probabilities, routing each row to its state's shard.
+
+        Args:
+            X: Output of prepare_prediction_input
+            states: Raw State value of each row (None scores every row with
+                the pooled model)
+
+        Returns:
+            Array of shape (n_rows, n_classes)
+        """
+        if states is None:
+            return self.pooled_model.predict_proba(X)
+        states = np.asarray(states, dtype=object)
+        proba = np.empty((len(X), len(self.classes_)))
+        pooled_rows = np.zeros(len(X), dtype=bool)
+        for state in pd.unique(states):
+            rows = states == state
+            handle = self.get_shard(state)
+            if handle is None:
+                pooled_rows |= rows
+            else:
+                proba[rows] = self._shard_proba(handle, X[rows])
+        if pooled_rows.any():
+            proba[pooled_rows] = self.pooled_model.predict_proba(X[pooled_rows])
+        return proba
+
+    def predict(self, X: pd.DataFrame, states: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Predict class labels (see predict_proba)."""
+        return self.classes_[self.predict_proba(X, states).argmax(axis=1)]
+
+    def stats(self) -> dict:
+        """Report resident shards and load/eviction counts."""
+        with self._lock:
+            return {
+                'resident': list(self._resident),
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'without_shard': sorted(self._unavailable)
+            }
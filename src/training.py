@@ -0,0 +1,454 @@
+"""
+Model training pipeline for the ABIA Traffic Accident Forecaster.
+
+Builds the encoded design matrix once and caches it on disk as
+memory-mapped arrays (dense, or CSR components with --sparse), runs a
+cross-validated hyperparameter search in a process pool whose workers read
+that shared cache, then fits the final model and publishes it to the
+registry together with a metrics report.
+
+Usage:
+    python -m src.training --data traffic_violations_with_detailed_weather.csv
+    python -m src.training --data enriched.parquet --workers 8 --state NC
+    python -m src.training --data enriched.parquet --sparse
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, brier_score_loss, classification_report, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from typing import Dict, List, Optional, Sequence
+
+from .config import (
+    TARGET_COLUMN, RANDOM_STATE, TEST_SIZE, CV_FOLDS,
+    TRAINING_PARAM_GRID, TRAINING_CACHE_DIR, REGISTRY_DIR, SHARDS_DIR
+)
+from .data_processing import filter_by_states, remove_missing_weather
+from .drift import build_reference_profile
+from .encoding import build_model_columns, encode_dense, encode_sparse
+from .registry import publish_model
+from .transformer import FeatureTransformer, records_from_enriched
+
+# Bump when the encoding changes so stale cached matrices are not reused
+ENCODING_VERSION = 2
+
+# Rows encoded per chunk when filling the memory-mapped design matrix
+ENCODE_CHUNK_ROWS = 1_000_000
+
+
+# --- Data Loading ---
+def read_table(path: Path) -> pd.DataFrame:
+    """Read a CSV or Parquet file."""
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def load_training_frame(paths: Sequence[Path], states: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load weather-enriched records and build model features.
+
+    Args:
+        paths: CSV/Parquet files with DateTime, weather columns, State,
+            VehicleType, Gender and Accident
+        states: States to keep (defaults to STATE_LIST)
+
+    Returns:
+        DataFrame with MODEL_FEATURES and the target column
+    """
+    df = pd.concat([read_table(p) for p in paths], ignore_index=True)
+    df = remove_missing_weather(df)
+    df = filter_by_states(df, states)
+    # The serving transformer's batch path, so training and serving features cannot diverge
+    features = FeatureTransformer().features(records_from_enriched(df))
+    features[TARGET_COLUMN] = df[TARGET_COLUMN]
+    return features.reset_index(drop=True)
+
+
+def data_fingerprint(paths: Sequence[Path], *extra) -> str:
+    """
+    Identify a training input by its files (path, size, mtime) and options.
+
+    Args:
+        paths: Input files
+        *extra: Additional values that change the design matrix
+
+    Returns:
+        Short hex digest
+    """
+    digest = hashlib.sha256(f"encoding-v{ENCODING_VERSION}".encode())
+    for path in sorted(Path(p).resolve() for p in paths):
+        stat = path.stat()
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    digest.update(repr(extra).encode())
+    return digest.hexdigest()[:16]
+
+
+# --- Design Matrix Cache ---
+def build_design_matrix(
+    df: pd.DataFrame,
+    cache_dir: Path,
+    model_columns: Optional[pd.Index] = None,
+    sparse: bool = False
+) -> Path:
+    """
+    Encode the training frame into memory-mapped arrays on disk.
+
+    Writes X.npy (float32), y.npy (int8) and columns.json into cache_dir.
+    With sparse=True the matrix is stored as CSR components instead
+    (X_data.npy, X_indices.npy, X_indptr.npy), which holds only the
+    non-zero entries of the one-hot columns.
+    If the directory already holds a complete matrix it is reused as-is.
+
+    Args:
+        df: Output of load_training_frame
+        cache_dir: Directory for this dataset's matrix
+        model_columns: Column layout to encode into (derived from df if None)
+        sparse: Store a CSR matrix instead of a dense one
+
+    Returns:
+        cache_dir
+    """
+    cache_dir = Path(cache_dir)
+    if (cache_dir / 'columns.json').exists():
+        return cache_dir
+
+    staging = cache_dir.with_name(cache_dir.name + '.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    if model_columns is None:
+        model_columns = build_model_columns(df)
+    if sparse:
+        _write_sparse_matrix(df, model_columns, staging)
+    else:
+        X = np.lib.format.open_memmap(
+            staging / 'X.npy', mode='w+', dtype=np.float32, shape=(len(df), len(model_columns))
+        )
+        for start in range(0, len(df), ENCODE_CHUNK_ROWS):
+            stop = start + ENCODE_CHUNK_ROWS
+            encode_dense(df.iloc[start:stop], model_columns, out=X[start:stop])
+        X.flush()
+        del X
+
+    np.save(staging / 'y.npy', df[TARGET_COLUMN].to_numpy(dtype=np.int8))
+    (staging / 'columns.json').write_text(json.dumps(list(model_columns)))
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(staging, cache_dir)
+    return cache_dir
+
+
+def _write_sparse_matrix(df: pd.DataFrame, model_columns: pd.Index, directory: Path) -> None:
+    """
+    Encode df chunk by chunk and save the stacked CSR components.
+
+    indices and indptr are saved with one dtype (int32, or int64 once nnz
+    exceeds the int32 range), as scipy would otherwise copy them to a
+    common dtype when the matrix is opened and lose the memory map.
+    """
+    data, indices, indptr = [], [], [np.zeros(1, dtype=np.int64)]
+    nnz = 0
+    for start in range(0, len(df), ENCODE_CHUNK_ROWS):
+        chunk = encode_sparse(df.iloc[start:start + ENCODE_CHUNK_ROWS], model_columns)
+        data.append(chunk.data)
+        indices.append(chunk.indices)
+        indptr.append(chunk.indptr[1:].astype(np.int64) + nnz)
+        nnz += chunk.nnz
+    index_dtype = np.int32 if max(nnz, len(model_columns)) <= np.iinfo(np.int32).max else np.int64
+    np.save(directory / 'X_data.npy', np.concatenate(data) if data else np.empty(0, np.float32))
+    np.save(directory / 'X_indices.npy',
+            np.concatenate(indices).astype(index_dtype, copy=False) if indices else np.empty(0, index_dtype))
+    np.save(directory / 'X_indptr.npy', np.concatenate(indptr).astype(index_dtype, copy=False))
+
+
+def load_design_matrix(cache_dir: Path):
+    """
+    Open a cached design matrix without reading it into memory.
+
+    Args:
+        cache_dir: Directory written by build_design_matrix
+
+    Returns:
+        Tuple of (X, y array, model_columns), where X is a dense memmap or,
+        for a sparse cache, a CSR matrix over memory-mapped components
+    """
+    cache_dir = Path(cache_dir)
+    y = np.load(cache_dir / 'y.npy')
+    columns = pd.Index(json.loads((cache_dir / 'columns.json').read_text()))
+    if (cache_dir / 'X_indptr.npy').exists():
+        X = sp.csr_matrix(
+            (np.load(cache_dir / 'X_data.npy', mmap_mode='r'),
+             np.load(cache_dir / 'X_indices.npy', mmap_mode='r'),
+             np.load(cache_dir / 'X_indptr.npy', mmap_mode='r')),
+            shape=(len(y), len(columns)), copy=False
+        )
+    else:
+        X = np.load(cache_dir / 'X.npy', mmap_mode='r')
+    return X, y, columns
+
+
+# --- Evaluation ---
+def evaluate_model(model, X, y) -> dict:
+    """
+    Compute holdout metrics for a fitted classifier.
+
+    Args:
+        model: Fitted classifier
+        X: Feature matrix
+        y: True labels
+
+    Returns:
+        Dictionary with auc, brier, accuracy and the classification report
+    """
+    proba = model.predict_proba(X)[:, 1]
+    pred = (proba > 0.5).astype(int)
+    return {
+        'auc': float(roc_auc_score(y, proba)),
+        'brier': float(brier_score_loss(y, proba)),
+        'accuracy': float(accuracy_score(y, pred)),
+        'classification_report': classification_report(y, pred, output_dict=True, zero_division=0)
+    }
+
+
+def _score_fold(task: dict) -> dict:
+    """
+    Fit and score one (params, fold) pair; runs in a worker process.
+
+    The forest is fitted on the whole shared matrix with zero sample weight
+    outside the fold, so the worker does not copy the fold's rows out of the
+    memmap (a sparse matrix is still converted to CSC by the forest).
+    Zero-weight rows carry no weight in any split, so only the fold trains
+    the trees. How bootstrap samples are drawn depends on the scikit-learn
+    release: those that weight bootstrap sampling draw only fold rows, and
+    max_samples=1.0 keeps each sample the size of the fold; older ones draw
+    from every row and the zero-weight draws are ignored. Only the smaller
+    validation rows are copied for scoring.
+    """
+    X, y, _ = load_design_matrix(task['matrix_dir'])
+    started = time.perf_counter()
+    params = dict(task['params'])
+    if params.get('bootstrap', True):
+        params.setdefault('max_samples', 1.0)
+    weights = np.zeros(len(y), dtype=np.float64)
+    weights[task['train_idx']] = 1.0
+    model = RandomForestClassifier(**params, random_state=task['seed'], n_jobs=1)
+    model.fit(X, y, sample_weight=weights)
+    proba = model.predict_proba(X[task['val_idx']])[:, 1]
+    y_val = y[task['val_idx']]
+    return {
+        'params': task['params'],
+        'fold': task['fold'],
+        'auc': float(roc_auc_score(y_val, proba)),
+        'brier': float(brier_score_loss(y_val, proba)),
+        'fit_seconds': time.perf_counter() - started
+    }
+
+
+def expand_grid(param_grid: Dict[str, list]) -> List[dict]:
+    """Expand a parameter grid into a list of parameter dictionaries."""
+    keys = sorted(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def run_search(
+    matrix_dir: Path,
+    train_idx: np.ndarray,
+    y: np.ndarray,
+    param_grid: Dict[str, list] = TRAINING_PARAM_GRID,
+    n_folds: int = CV_FOLDS,
+    max_workers: Optional[int] = None,
+    seed: int = RANDOM_STATE
+) -> List[dict]:
+    """
+    Cross-validated grid search over a cached design matrix.
+
+    Every (params, fold) pair is a separate task in a process pool. Workers
+    memory-map the same cached arrays, so the matrix lives once in the page
+    cache instead of being pickled to each process.
+
+    Args:
+        matrix_dir: Directory written by build_design_matrix
+        train_idx: Row indices available for cross-validation
+        y: Labels for all rows
+        param_grid: Parameter grid for RandomForestClassifier
+        n_folds: Number of stratified folds
+        max_workers: Worker processes (defaults to CPU count)
+        seed: Seed for fold assignment and forests
+
+    Returns:
+        One summary per parameter set (mean/std AUC, mean Brier, folds),
+        best first
+    """
+    folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    splits = [(train_idx[a], train_idx[b]) for a, b in folds.split(train_idx, y[train_idx])]
+    tasks = [
+        {'matrix_dir': str(matrix_dir), 'params': params, 'fold': k,
+         'train_idx': fit_idx, 'val_idx': val_idx, 'seed': seed}
+        for params in expand_grid(param_grid)
+        for k, (fit_idx, val_idx) in enumerate(splits)
+    ]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_score_fold, tasks))
+
+    summaries = []
+    for params in expand_grid(param_grid):
+        folds_for = [r for r in results if r['params'] == params]
+        aucs = [r['auc'] for r in folds_for]
+        summaries.append({
+            'params': params,
+            'mean_auc': float(np.mean(aucs)),
+            'std_auc': float(np.std(aucs)),
+            'mean_brier': float(np.mean([r['brier'] for r in folds_for])),
+            'fit_seconds': float(np.sum([r['fit_seconds'] for r in folds_for])),
+            'folds': folds_for
+        })
+    return sorted(summaries, key=lambda s: -s['mean_auc'])
+
+
+# --- Pipeline ---
+def train_pipeline(
+    paths: Sequence[Path],
+    states: Optional[List[str]] = None,
+    param_grid: Dict[str, list] = TRAINING_PARAM_GRID,
+    n_folds: int = CV_FOLDS,
+    max_workers: Optional[int] = None,
+    cache_dir: Path = TRAINING_CACHE_DIR,
+    registry_dir: Path = REGISTRY_DIR,
+    model_columns: Optional[pd.Index] = None,
+    publish: bool = True,
+    version: Optional[str] = None,
+    seed: int = RANDOM_STATE,
+    sparse: bool = False,
+    promote: bool = False
+) -> dict:
+    """
+    Train, evaluate and publish a model from weather-enriched records.
+
+    Args:
+        paths: Input CSV/Parquet files
+        states: States to train on (defaults to STATE_LIST)
+        param_grid: Hyperparameter grid
+        n_folds: Cross-validation folds
+        max_workers: Worker processes for the search
+        cache_dir: Root of the design matrix cache
+        registry_dir: Registry to publish into
+        model_columns: Fixed column layout (e.g. the pooled model's, for shards)
+        publish: Publish the model to the registry
+        version: Registry version name (defaults to a timestamp)
+        seed: Random seed for the split, folds and forests
+        sparse: Cache and train on a CSR design matrix
+        promote: Point CURRENT at the published version (otherwise it is
+            published for review and promoted with src.registry promote)
+
+    Returns:
+        Metrics report (also stored in the published version's metadata)
+    """
+    started = time.perf_counter()
+    fingerprint = data_fingerprint(
+        paths, states, None if model_columns is None else list(model_columns), sparse
+    )
+    matrix_dir = Path(cache_dir) / fingerprint
+    frame = None
+    if not (matrix_dir / 'columns.json').exists():
+        frame = load_training_frame(paths, states)
+        build_design_matrix(frame, matrix_dir, model_columns, sparse)
+    # Input distribution the serving drift monitor compares against
+    reference_path = matrix_dir / 'drift_reference.json'
+    if not reference_path.exists():
+        frame = frame if frame is not None else load_training_frame(paths, states)
+        reference_path.write_text(json.dumps(build_reference_profile(frame)))
+    del frame  # Free the raw rows before the design matrix is loaded
+    X, y, columns = load_design_matrix(matrix_dir)
+    prepared = time.perf_counter()
+
+    train_idx, test_idx = train_test_split(
+        np.arange(len(y)), test_size=TEST_SIZE, stratify=y, random_state=seed
+    )
+    search = run_search(matrix_dir, train_idx, y, param_grid, n_folds, max_workers, seed)
+    best_params = search[0]['params']
+
+    model = RandomForestClassifier(**best_params, random_state=seed, n_jobs=-1)
+    model.fit(X[train_idx], y[train_idx])
+    test_metrics = evaluate_model(model, X[test_idx], y[test_idx])
+
+    report = {
+        'data_fingerprint': fingerprint,
+        'inputs': [str(p) for p in paths],
+        'states': states,
+        'rows': int(len(y)),
+        'sparse': sparse,
+        'positive_rate': float(y.mean()),
+        'best_params': best_params,
+        'search': [{k: v for k, v in s.items() if k != 'folds'} for s in search],
+        'test_metrics': test_metrics,
+        'seconds': {
+            'prepare': prepared - started,
+            'total': time.perf_counter() - started
+        }
+    }
+    if publish:
+        report['version'] = publish_model(
+            model, columns, version, registry_dir,
+            metadata={'training': report, 'drift_reference': json.loads(reference_path.read_text())},
+            make_current=promote
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the accident risk model.")
+    parser.add_argument('--data', nargs='+', type=Path, required=True,
+                        help="Weather-enriched CSV/Parquet files")
+    parser.add_argument('--states', nargs='+', default=None, help="States to train on")
+    parser.add_argument('--state', default=None,
+                        help="Train a per-state shard using the pooled model's columns")
+    parser.add_argument('--workers', type=int, default=None, help="Search worker processes")
+    parser.add_argument('--folds', type=int, default=CV_FOLDS, help="Cross-validation folds")
+    parser.add_argument('--version', default=None, help="Registry version name")
+    parser.add_argument('--no-publish', action='store_true', help="Skip publishing")
+    parser.add_argument('--promote', action='store_true', help="Make the published version current")
+    parser.add_argument('--report', type=Path, default=None, help="Write the metrics report here")
+    parser.add_argument('--sparse', action='store_true', help="Use a sparse CSR design matrix")
+    args = parser.parse_args()
+
+    states, registry_dir, model_columns = args.states, REGISTRY_DIR, None
+    if args.state:
+        from .registry import ModelRegistry
+        pooled = ModelRegistry(shards_dir=None).current()
+        if pooled is None:
+            parser.error("A pooled model is required to train a shard")
+        states, registry_dir, model_columns = [args.state], SHARDS_DIR / args.state, pooled.model_columns
+
+    report = train_pipeline(
+        args.data, states, n_folds=args.folds, max_workers=args.workers,
+        registry_dir=registry_dir, model_columns=model_columns,
+        publish=not args.no_publish, version=args.version, sparse=args.sparse, promote=args.promote
+    )
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2, default=str))
+
+    metrics = report['test_metrics']
+    print(f"Best params: {report['best_params']}")
+    print(f"Test AUC {metrics['auc']:.4f} | Brier {metrics['brier']:.4f} | Accuracy {metrics['accuracy']:.4f}")
+    print(f"Finished in {report['seconds']['total']:.1f}s"
+          + (f"; published version {report['version']}" if 'version' in report else ""))
+    if 'version' in report and not args.promote:
+        registry_option = f"--registry {registry_dir} " if args.state else ""
+        print(f"Promote it with: python -m src.registry {registry_option}promote {report['version']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Fitted feature transformer for the ABIA Traffic Accident Forecaster.
+
+Contains the single definition of how a raw record becomes a row of the
+model matrix. Training and serving both use it. A raw record holds:
+
+    timestamp        time of the trip: naive local time, or a tz-aware time,
+                     which is converted to the location's timezone
+    lat, lon         location
+    state            state code
+    vehicle, gender  app labels (VEHICLE_MAP / GENDER_MAP keys) or data codes
+    temperature_2m, precipitation, snowfall, weather_code, wind_speed_10m
+                     Open-Meteo fields, in the units named by temperature_unit
+                     and wind_speed_unit (Open-Meteo's defaults: celsius, kmh)
+
+Fitting on training features fixes the encoded columns, and the fitted
+transformer is saved next to the model in the registry. features() and
+transform() are the vectorized batch path. features_one() and
+transform_one() build a single row with plain Python and precomputed column
+positions. Both paths give identical outputs.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from .config import (
+    MODEL_FEATURES, CATEGORICAL_FEATURES, WEATHER_CODE_MAP, VEHICLE_MAP, GENDER_MAP, DAYS_OF_WEEK
+)
+from .encoding import build_model_columns, category_layout, encode_dense
+from .features import get_local_timezone, get_part_of_day
+
+# Bump when the raw-record -> feature rules change
+TRANSFORMER_VERSION = 1
+
+# Open-Meteo unit names -> (scale, offset) into the model's units (°C, km/h)
+TEMPERATURE_UNITS = {'celsius': (1.0, 0.0), 'fahrenheit': (5 / 9, -32 * 5 / 9)}
+WIND_SPEED_UNITS = {'kmh': 1.0, 'mph': 1.60934, 'ms': 3.6, 'kn': 1.852}
+
+# Enriched training columns (notebook schema) -> raw record fields
+ENRICHED_COLUMNS = {
+    'DateTime': 'timestamp',
+    'Latitude': 'lat',
+    'Longitude': 'lon',
+    'State': 'state',
+    'VehicleType': 'vehicle',
+    'Gender': 'gender',
+    'temperature': 'temperature_2m',
+    'precipitation': 'precipitation',
+    'snowfall': 'snowfall',
+    'weathercode': 'weather_code',
+    'windspeed': 'wind_speed_10m'
+}
+
+_PART_OF_DAY_BY_HOUR = np.array([get_part_of_day(h) for h in range(24)], dtype=object)
+_DAYS = np.array(DAYS_OF_WEEK, dtype=object)
+
+
+def records_from_enriched(df: pd.DataFrame) -> pd.DataFrame:
+    """Rename weather-enriched training columns to raw record fields (celsius, kmh)."""
+    return df.rename(columns=ENRICHED_COLUMNS)
+
+
+def weather_features(record: dict, temperature_unit: str = 'celsius', wind_speed_unit: str = 'kmh') -> dict:
+    """
+    Convert one record's Open-Meteo fields into model weather features.
+
+    Args:
+        record: Mapping with temperature_2m, precipitation, snowfall,
+            weather_code and wind_speed_10m
+        temperature_unit: Unit of temperature_2m
+        wind_speed_unit: Unit of wind_speed_10m
+
+    Returns:
+        Dictionary with temperature (°C), precipitation, snowfall,
+        windspeed (km/h) and WeatherCondition
+    """
+    scale, offset = TEMPERATURE_UNITS[temperature_unit]
+    return {
+        'temperature': float(record['temperature_2m']) * scale + offset,
+        'precipitation': float(record['precipitation']),
+        'snowfall': float(record['snowfall']),
+        'windspeed': float(record['wind_speed_10m']) * WIND_SPEED_UNITS[wind_speed_unit],
+        'WeatherCondition': WEATHER_CODE_MAP.get(record['weather_code'], 'Other')
+    }
+
+
+def _local_times(records: pd.DataFrame) -> pd.Series:
+    """
+    Naive local wall-clock times for a batch (tz-aware times use each row's location).
+
+    Raises:
+        ValueError: The batch mixes naive and tz-aware timestamps. Naive
+            times are local and aware ones are instants, and reading both
+            on one scale can put hours up to a day apart.
+    """
+    try:
+        ts = pd.to_datetime(records['timestamp'])
+    except ValueError:
+        aware = records['timestamp'].map(lambda value: pd.Timestamp(value).tzinfo is not None)
+        if not aware.any():
+            raise
+        if not aware.all():
+            raise ValueError(
+                f"{int((~aware).sum())} naive and {int(aware.sum())} tz-aware timestamps in one batch; "
+                "pass all local times naive or all with a UTC offset"
+            )
+        ts = pd.to_datetime(records['timestamp'], utc=True)  # Mixed UTC offsets
+    if ts.dt.tz is None:
+        return ts
+    zones = pd.Series(
+        [get_local_timezone(lat, lon).zone for lat, lon in zip(records['lat'], records['lon'])],
+        index=records.index
+    )
+    local = pd.Series(pd.NaT, index=records.index, dtype='datetime64[ns]')
+    for zone, index in zones.groupby(zones).groups.items():
+        local[index] = ts[index].dt.tz_convert(zone).dt.tz_localize(None)
+    return local
+
+
+class FeatureTransformer:
+    """
+    Raw records -> model features -> encoded model matrix.
+
+    Args:
+        model_columns: Encoded columns from fit() (None until fitted)
+    """
+
+    def __init__(self, model_columns: Optional[pd.Index] = None):
+        self.model_columns = None
+        if model_columns is not None:
+            self._set_columns(pd.Index(model_columns))
+
+    def _set_columns(self, model_columns: pd.Index) -> None:
+        self.model_columns = model_columns
+        numeric, categorical = category_layout(model_columns)
+        self._numeric = numeric
+        self._levels = {
+            feature: dict(zip(levels, positions.tolist()))
+            for feature, (levels, positions) in categorical.items()
+        }
+
+    def fit(self, features: pd.DataFrame) -> 'FeatureTransformer':
+        """
+        Fix the encoded columns from training features.
+
+        Args:
+            features: Output of features() on the training records
+
+        Returns:
+            self
+        """
+        self._set_columns(build_model_columns(features))
+        return self
+
+    # --- Features ---
+    def features(
+        self,
+        records: pd.DataFrame,
+        temperature_unit: str = 'celsius',
+        wind_speed_unit: str = 'kmh'
+    ) -> pd.DataFrame:
+        """
+        Build model features for a batch of raw records.
+
+        Args:
+            records: DataFrame of raw record fields (see module docstring)
+            temperature_unit: Unit of temperature_2m
+            wind_speed_unit: Unit of wind_speed_10m
+
+        Returns:
+            DataFrame with MODEL_FEATURES columns and the records' index
+        """
+        scale, offset = TEMPERATURE_UNITS[temperature_unit]
+        local = _local_times(records)
+        hours = local.dt.hour.to_numpy()
+        out = pd.DataFrame(index=records.index)
+        out['temperature'] = records['temperature_2m'].to_numpy(dtype=float) * scale + offset
+        out['precipitation'] = records['precipitation'].to_numpy(dtype=float)
+        out['snowfall'] = records['snowfall'].to_numpy(dtype=float)
+        out['windspeed'] = records['wind_speed_10m'].to_numpy(dtype=float) * WIND_SPEED_UNITS[wind_speed_unit]
+        out['Hour'] = hours
+        out['DayOfWeek'] = _DAYS[local.dt.dayofweek.to_numpy()]
+        out['Month'] = local.dt.month.to_numpy()
+        out['PartOfDay'] = _PART_OF_DAY_BY_HOUR[hours]
+        out['WeatherCondition'] = records['weather_code'].map(WEATHER_CODE_MAP).fillna('Other').to_numpy()
+        out['VehicleType'] = records['vehicle'].map(VEHICLE_MAP).fillna(records['vehicle']).to_numpy()
+        out['State'] = records['state'].to_numpy()
+        out['Gender'] = records['gender'].map(GENDER_MAP).fillna(records['gender']).to_numpy()
+        return out[MODEL_FEATURES]
+
+    def features_one(
+        self,
+        record: dict,
+        temperature_unit: str = 'celsius',
+        wind_speed_unit: str = 'kmh'
+    ) -> dict:
+        """
+        Build model features for one raw record (same values as features()).
+
+        Args:
+            record: Mapping of raw record fields
+            temperature_unit: Unit of temperature_2m
+            wind_speed_unit: Unit of wind_speed_10m
+
+        Returns:
+            Dictionary keyed by MODEL_FEATURES
+        """
+        local = record['timestamp']
+        if not isinstance(local, datetime):
+            local = pd.Timestamp(local)
+        if local.tzinfo is not None:
+            local = local.astimezone(get_local_timezone(record['lat'], record['lon']))
+        vehicle, gender = record['vehicle'], record['gender']
+        features = weather_features(record, temperature_unit, wind_speed_unit)
+        features.update({
+            'Hour': local.hour,
+            'DayOfWeek': DAYS_OF_WEEK[local.weekday()],
+            'Month': local.month,
+            'PartOfDay': _PART_OF_DAY_BY_HOUR[local.hour],
+            'VehicleType': VEHICLE_MAP.get(vehicle, vehicle),
+            'State': record['state'],
+            'Gender': GENDER_MAP.get(gender, gender)
+        })
+        return {feature: features[feature] for feature in MODEL_FEATURES}
+
+    # --- Encoding ---
+    def encode(self, features: pd.DataFrame) -> pd.DataFrame:
+        """One-hot encode a batch of features into the model matrix (float32, model_columns)."""
+        return pd.DataFrame(encode_dense(features, self.model_columns), columns=self.model_columns,
+                            index=features.index)
+
+    def encode_one(self, features: dict) -> pd.DataFrame:
+        """Encode one row of features from precomputed column positions (same values as encode())."""
+        row = np.zeros((1, len(self.model_columns)), dtype=np.float32)
+        for feature, position in self._numeric:
+            row[0, position] = features[feature]
+        for feature in CATEGORICAL_FEATURES:
+            position = self._levels[feature].get(str(features[feature]))
+            if position is not None:
+                row[0, position] = 1
+        return pd.DataFrame(row, columns=self.model_columns)
+
+    def transform(self, records: pd.DataFrame, **units) -> pd.DataFrame:
+        """Raw records -> model matrix (batch path)."""
+        return self.encode(self.features(records, **units))
+
+    def transform_one(self, record: dict, **units) -> pd.DataFrame:
+        """Raw record -> one-row model matrix (single-record path)."""
+        return self.encode_one(self.features_one(record, **units))
+
+    # --- Storage ---
+    def save(self, path: Path) -> None:
+        """Write the fitted transformer as JSON."""
+        Path(path).write_text(json.dumps({
+            'version': TRANSFORMER_VERSION,
+            'features': MODEL_FEATURES,
+            'model_columns': list(self.model_columns)
+        }))
+
+    @classmethod
+    def load(cls, path: Path) -> 'FeatureTransformer':
+        """
+        Load a saved transformer.
+
+        Raises:
+            ValueError: If it was saved with different feature rules
+        """
+        spec = json.loads(Path(path).read_text())
+        if spec['version'] != TRANSFORMER_VERSION or spec['features'] != MODEL_FEATURES:
+            raise ValueError(f"{path} was saved by an incompatible feature transformer")
+        return cls(pd.Index(spec['model_columns']))
@@ -0,0 +1,310 @@
+"""
+Weather API utilities for the ABIA Traffic Accident Forecaster.
+
+Contains functions for building Open-Meteo requests and converting their
+responses into the units the model was trained on.
+"""
+
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import List, Optional
+
+from .config import (
+    OPEN_METEO_FORECAST_URL, WEATHER_FIELDS, WEATHER_UNITS,
+    OPEN_METEO_ARCHIVE_URL, HISTORICAL_WEATHER_FIELDS, ENRICH_WORKERS
+)
+from .data_processing import prepare_weather_lookup_keys
+from .http_client import ProviderError, get_client
+from .transformer import WIND_SPEED_UNITS, weather_features
+
+# Conversion factor used by the app when feeding wind speed to the model
+MPH_TO_KMH = WIND_SPEED_UNITS['mph']
+
+
+def build_weather_params(lat: float, lon: float, block: str = 'current', **extra) -> dict:
+    """
+    Build Open-Meteo query parameters in the same shape as the live weather request.
+
+    Args:
+        lat: Latitude
+        lon: Longitude
+        block: 'current' for current conditions or 'hourly' for a forecast series
+        **extra: Additional query parameters (e.g. forecast_days, timeformat)
+
+    Returns:
+        Dictionary of query parameters
+    """
+    params = {
+        'latitude': lat,
+        'longitude': lon,
+        block: WEATHER_FIELDS,
+        **WEATHER_UNITS
+    }
+    params.update(extra)
+    return params
+
+
+def parse_weather_values(data: dict) -> dict:
+    """
+    Convert one set of Open-Meteo values into the app's weather dictionary.
+
+    Args:
+        data: Mapping with temperature_2m, precipitation, snowfall,
+            weather_code and wind_speed_10m keys
+
+    Returns:
+        Dictionary with temperature_f, temperature_c, precipitation,
+        snowfall, weathercode and windspeed (mph)
+    """
+    return {
+        'temperature_f': data['temperature_2m'],
+        'temperature_c': round((data['temperature_2m'] - 32) * 5/9, 1),
+        'precipitation': data['precipitation'],
+        'snowfall': data['snowfall'],
+        'weathercode': data['weather_code'],
+        'windspeed': data['wind_speed_10m']
+    }
+
+
+def open_meteo_fields(weather: dict) -> dict:
+    """
+    Convert an app weather dictionary back into Open-Meteo fields (WEATHER_UNITS).
+
+    Args:
+        weather: Dictionary as returned by parse_weather_values
+
+    Returns:
+        Dictionary with temperature_2m, precipitation, snowfall,
+        weather_code and wind_speed_10m
+    """
+    return {
+        'temperature_2m': weather['temperature_f'],
+        'precipitation': weather['precipitation'],
+        'snowfall': weather['snowfall'],
+        'weather_code': weather['weathercode'],
+        'wind_speed_10m': weather['windspeed']
+    }
+
+
+def to_model_weather(weather: dict) -> dict:
+    """
+    Convert an app weather dictionary into model feature values.
+
+    Uses the feature transformer's conversion, so every serving path scores
+    the same weather values as training.
+
+    Args:
+        weather: Dictionary as returned by parse_weather_values
+
+    Returns:
+        Dictionary with temperature (°C), precipitation, snowfall,
+        windspeed (km/h) and WeatherCondition
+    """
+    return weather_features(open_meteo_fields(weather), **WEATHER_UNITS)
+
+
+def fetch_current_weather(lat: float, lon: float) -> dict:
+    """
+    Fetch current weather conditions from Open-Meteo.
+
+    Args:
+        lat: Latitude
+        lon: Longitude
+
+    Returns:
+        Weather dictionary (see parse_weather_values). When the service
+        failed and a recent earlier response was served instead, it also
+        has stale=True and age_seconds (how old that response is)
+
+    Raises:
+        ProviderError: The request failed and no recent cached result
+            exists, or the response has no 'current' block
+    """
+    json_data, age = get_client('open_meteo').get_json(
+        OPEN_METEO_FORECAST_URL, build_weather_params(lat, lon), with_age=True
+    )
+    try:
+        weather = parse_weather_values(json_data['current'])
+    except (KeyError, TypeError) as e:
+        raise ProviderError('open_meteo', f"unexpected response format (missing {e})")
+    if age is not None:
+        weather.update(stale=True, age_seconds=age)
+    return weather
+
+
+def fetch_hourly_forecast(lat: float, lon: float, forecast_days: int = 2) -> Optional[dict]:
+    """
+    Fetch an hourly forecast series from Open-Meteo.
+
+    Times are returned as Unix timestamps (UTC) so they can be matched
+    against arbitrary ETAs without timezone handling.
+
+    Args:
+        lat: Latitude
+        lon: Longitude
+        forecast_days: Number of days of forecast to request
+
+    Returns:
+        Dictionary with a 'time' list and one list per weather key
+        (see parse_weather_values), or None if the request fails
+    """
+    params = build_weather_params(
+        lat, lon, block='hourly',
+        forecast_days=forecast_days, timeformat='unixtime', timezone='UTC'
+    )
+    try:
+        json_data = get_client('open_meteo').get_json(OPEN_METEO_FORECAST_URL, params)
+        return _parse_hourly(json_data['hourly'])
+    except (ProviderError, KeyError, TypeError) as e:
+        print(f"Error fetching hourly forecast for ({lat}, {lon}): {type(e).__name__}: {e}")
+        return None
+
+
+def fetch_hourly_forecast_batch(
+    lats: List[float],
+    lons: List[float],
+    forecast_days: int = 2,
+    chunk_size: int = 100
+) -> List[Optional[dict]]:
+    """
+    Fetch hourly forecasts for many locations using multi-location requests.
+
+    Open-Meteo accepts comma-separated coordinate lists, so each chunk of
+    locations costs a single HTTP round trip.
+
+    Args:
+        lats: Latitudes
+        lons: Longitudes
+        forecast_days: Number of days of forecast to request
+        chunk_size: Locations per request
+
+    Returns:
+        One hourly series (see fetch_hourly_forecast) or None per location
+    """
+    results = []
+    for start in range(0, len(lats), chunk_size):
+        chunk_lats = lats[start:start + chunk_size]
+        chunk_lons = lons[start:start + chunk_size]
+        params = build_weather_params(
+            ','.join(f"{v:.4f}" for v in chunk_lats),
+            ','.join(f"{v:.4f}" for v in chunk_lons),
+            block='hourly',
+            forecast_days=forecast_days, timeformat='unixtime', timezone='UTC'
+        )
+        try:
+            payload = get_client('open_meteo').get_json(OPEN_METEO_FORECAST_URL, params)
+            if isinstance(payload, dict):
+                payload = [payload]
+            parsed = [_parse_hourly(item['hourly']) for item in payload]
+            results.extend(parsed)
+        except (ProviderError, KeyError, TypeError) as e:
+            print(f"Error fetching forecast batch at offset {start}: {type(e).__name__}: {e}")
+            results.extend([None] * len(chunk_lats))
+    return results
+
+
+def _parse_hourly(hourly: dict) -> dict:
+    """Convert an Open-Meteo 'hourly' block into per-key lists in app units."""
+    times = hourly['time']
+    series = {'time': list(times)}
+    for i in range(len(times)):
+        values = parse_weather_values({k: hourly[k][i] for k in WEATHER_FIELDS.split(',')})
+        for key, value in values.items():
+            series.setdefault(key, []).append(value)
+    return series
+
+
+# --- Historical Weather (training data enrichment) ---
+# Archive fields and the training column each one fills
+HISTORICAL_COLUMNS = {
+    'temperature_2m': 'temperature',
+    'precipitation': 'precipitation',
+    'snowfall': 'snowfall',
+    'weathercode': 'weathercode',
+    'windspeed_10m': 'windspeed'
+}
+
+
+def fetch_historical_weather(
+    lat: float,
+    lon: float,
+    day: date,
+    timezone: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Fetch one day of hourly archive weather for a location.
+
+    Uses the same request as the notebook's enrichment step (Celsius, km/h,
+    hours in GMT), so new records match the data the model was trained on.
+
+    Args:
+        lat: Latitude
+        lon: Longitude
+        day: Date to fetch
+        timezone: Time zone of the day and the returned hours ('auto' for
+            the location's own; defaults to GMT)
+
+    Returns:
+        Open-Meteo 'hourly' block (24 values per field), or None on failure
+    """
+    params = {
+        'latitude': lat,
+        'longitude': lon,
+        'start_date': day.isoformat(),
+        'end_date': day.isoformat(),
+        'hourly': HISTORICAL_WEATHER_FIELDS
+    }
+    if timezone:
+        params['timezone'] = timezone
+    try:
+        return get_client('open_meteo_archive').get_json(OPEN_METEO_ARCHIVE_URL, params)['hourly']
+    except (ProviderError, KeyError, TypeError) as e:
+        print(f"Error fetching archive weather for ({lat}, {lon}) on {day}: {type(e).__name__}: {e}")
+        return None
+
+
+def enrich_with_historical_weather(
+    df: pd.DataFrame,
+    max_workers: int = ENRICH_WORKERS,
+    store=None
+) -> pd.DataFrame:
+    """
+    Add hourly weather columns to violation records.
+
+    One archive request is made per unique (date, rounded location), in
+    parallel; each record then takes the value for its hour. With a local
+    store, the values come from disk instead and no requests are made.
+
+    Args:
+        df: Cleaned DataFrame with Latitude, Longitude and DateTime columns
+        max_workers: Concurrent archive requests
+        store: src.weather_store.WeatherStore of ingested archive dumps
+
+    Returns:
+        DataFrame with temperature, precipitation, snowfall, weathercode and
+        windspeed columns (NaN where no weather was found)
+    """
+    if store is not None:
+        return store.enrich(df)
+    keyed = prepare_weather_lookup_keys(df)
+    groups = keyed[['date_only', 'lat_round', 'lon_round']].drop_duplicates()
+    keys = list(groups.itertuples(index=False, name=None))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        blocks = list(executor.map(lambda k: fetch_historical_weather(k[1], k[2], k[0]), keys))
+
+    rows = []
+    for (day, lat, lon), hourly in zip(keys, blocks):
+        if not hourly:
+            continue
+        for hour in range(len(hourly.get('time', []))):
+            row = {'date_only': day, 'lat_round': lat, 'lon_round': lon, 'hour': hour}
+            for field, column in HISTORICAL_COLUMNS.items():
+                row[column] = hourly.get(field, [None] * 24)[hour]
+            rows.append(row)
+    weather = pd.DataFrame(rows, columns=['date_only', 'lat_round', 'lon_round', 'hour'] + list(HISTORICAL_COLUMNS.values()))
+
+    keyed['hour'] = keyed['DateTime'].dt.hour
+    enriched = keyed.merge(weather, on=['date_only', 'lat_round', 'lon_round', 'hour'], how='left')
+    enriched.index = df.index
+    return enriched.drop(columns=['lat_round', 'lon_round', 'date_only', 'hour'])
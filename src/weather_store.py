@@ -0,0 +1,469 @@
+"""
+Local historical weather store for the ABIA Traffic Accident Forecaster.
+
+Contains an ingest path for bulk hourly weather dumps and an indexed
+on-disk store. The store enriches prepare_weather_lookup_keys output
+without any archive API requests. Supported dump formats:
+
+    .json      Open-Meteo API responses (one location or a list of them)
+    .csv       Open-Meteo CSV exports (location block, blank line, hourly
+               table), or flat tables
+    .parquet   flat tables
+
+A flat table has latitude, longitude and time columns plus hourly fields.
+Fields use Open-Meteo names (temperature_2m, precipitation, snowfall,
+weathercode, windspeed_10m, or the newer weather_code and wind_speed_10m).
+Unit labels in CSV headers ("temperature_2m (°F)") or in a JSON
+hourly_units block are converted to the archive request's units (°C, mm,
+cm, km/h).
+
+Every cell's hourly series is stored back to back in one float32 matrix
+(values-<generation>.npy, memory-mapped for reading). The matrix has one
+row per hour and one column per HISTORICAL_COLUMNS field, with NaN gaps.
+index.npz holds each cell's coordinates, first hour and offset, and is
+replaced last, so readers never see a half-written store. A record is
+matched to the nearest cell within WEATHER_STORE_MAX_DISTANCE_DEG and to
+its (date, hour) in GMT, as with the archive API. An enrichment is one
+nearest-cell query per distinct location plus one array gather.
+
+Usage:
+    python -m src.weather_store ingest --input dumps/ --workers 8
+    python -m src.weather_store info
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from scipy.spatial import cKDTree
+from typing import Iterator, List, Optional, Sequence
+
+from .config import WEATHER_STORE_DIR, WEATHER_STORE_MAX_DISTANCE_DEG
+from .data_processing import prepare_weather_lookup_keys
+from .transformer import TEMPERATURE_UNITS, WIND_SPEED_UNITS
+from .weather import HISTORICAL_COLUMNS
+
+INDEX_FILE = 'index.npz'
+DUMP_SUFFIXES = ('.csv', '.json', '.parquet')
+
+# Stored fields (archive request names), in column order
+FIELDS = list(HISTORICAL_COLUMNS)
+FIELD_ALIASES = {'weather_code': 'weathercode', 'wind_speed_10m': 'windspeed_10m'}
+
+# (field, Open-Meteo unit label) -> (scale, offset) into the archive request's units
+UNIT_CONVERSIONS = {
+    ('temperature_2m', '°F'): TEMPERATURE_UNITS['fahrenheit'],
+    ('windspeed_10m', 'mp/h'): (WIND_SPEED_UNITS['mph'], 0.0),
+    ('windspeed_10m', 'mph'): (WIND_SPEED_UNITS['mph'], 0.0),
+    ('windspeed_10m', 'm/s'): (WIND_SPEED_UNITS['ms'], 0.0),
+    ('windspeed_10m', 'kn'): (WIND_SPEED_UNITS['kn'], 0.0),
+    ('precipitation', 'inch'): (25.4, 0.0),
+    ('snowfall', 'inch'): (2.54, 0.0)
+}
+NATIVE_UNITS = {'', '°C', 'mm', 'cm', 'km/h', 'wmo code'}
+
+
+# --- Dump Parsing ---
+def _split_header(name: str) -> tuple:
+    """'temperature_2m (°F)' -> ('temperature_2m', '°F')."""
+    field, _, unit = str(name).partition(' (')
+    return field.strip(), unit.rstrip(')').strip()
+
+
+def _to_hours(times, utc_offset_seconds: int = 0) -> np.ndarray:
+    """
+    ISO strings or Unix seconds -> hours since the epoch (GMT).
+
+    Only naive local times are shifted by utc_offset_seconds; Unix seconds
+    and ISO strings with an offset already pin the instant.
+    """
+    times = pd.Series(times)
+    if pd.api.types.is_numeric_dtype(times):
+        ts = pd.to_datetime(times, unit='s')
+    else:
+        ts = pd.to_datetime(times)
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert('UTC').dt.tz_localize(None)
+        else:
+            ts = ts - pd.Timedelta(seconds=int(utc_offset_seconds))
+    return ts.to_numpy().astype('datetime64[h]').astype(np.int64)
+
+
+def _make_cell(lat: float, lon: float, times, columns: dict, units: Optional[dict] = None,
+               utc_offset_seconds: int = 0) -> dict:
+    """
+    Build one cell's hourly series from raw columns.
+
+    Args:
+        lat: Cell latitude
+        lon: Cell longitude
+        times: Hour timestamps (ISO strings or Unix seconds)
+        columns: Field name (optionally with a unit label) -> values
+        units: Field name -> unit label (JSON hourly_units)
+        utc_offset_seconds: Offset of naive local times from GMT
+
+    Returns:
+        Dictionary with lat, lon, hours (int64) and values (float32, one column per FIELDS entry)
+    """
+    units = units or {}
+    hours = _to_hours(times, utc_offset_seconds)
+    values = np.full((len(hours), len(FIELDS)), np.nan, dtype=np.float32)
+    for name, data in columns.items():
+        field, unit = _split_header(name)
+        field = FIELD_ALIASES.get(field, field)
+        if field not in FIELDS:
+            continue
+        unit = unit or units.get(name, '')
+        if unit in NATIVE_UNITS:
+            scale, offset = 1.0, 0.0
+        elif (field, unit) in UNIT_CONVERSIONS:
+            scale, offset = UNIT_CONVERSIONS[(field, unit)]
+        else:
+            raise ValueError(f"Unsupported unit {unit!r} for {field}")
+        numbers = pd.to_numeric(pd.Series(data), errors='coerce').to_numpy(dtype=float)
+        values[:, FIELDS.index(field)] = numbers * scale + offset
+    return {'lat': float(lat), 'lon': float(lon), 'hours': hours, 'values': values}
+
+
+def _read_json(path: Path) -> Iterator[dict]:
+    payload = json.loads(Path(path).read_text())
+    for item in payload if isinstance(payload, list) else [payload]:
+        hourly = item['hourly']
+        yield _make_cell(
+            item['latitude'], item['longitude'], hourly['time'],
+            {k: v for k, v in hourly.items() if k != 'time'},
+            item.get('hourly_units'), item.get('utc_offset_seconds', 0)
+        )
+
+
+def _read_open_meteo_csv(path: Path) -> Iterator[dict]:
+    """Open-Meteo CSV export: location rows, a blank line, then the hourly table."""
+    text = Path(path).read_text(encoding='utf-8').replace('\r\n', '\n')
+    location_block, _, table_block = text.partition('\n\n')
+    locations = pd.read_csv(io.StringIO(location_block))
+    table = pd.read_csv(io.StringIO(table_block))
+    if 'location_id' in table.columns:
+        locations = locations.set_index('location_id')
+        groups = table.groupby('location_id', sort=False)
+    else:
+        groups = [(locations.index[0], table)]
+    for location, part in groups:
+        meta = locations.loc[location]
+        yield _make_cell(
+            meta['latitude'], meta['longitude'], part['time'],
+            {c: part[c] for c in part.columns if c not in ('time', 'location_id')},
+            utc_offset_seconds=meta.get('utc_offset_seconds', 0)
+        )
+
+
+def _read_flat_table(table: pd.DataFrame) -> Iterator[dict]:
+    """Flat table with one row per (location, hour)."""
+    lat_column = 'latitude' if 'latitude' in table.columns else 'lat'
+    lon_column = 'longitude' if 'longitude' in table.columns else 'lon'
+    for (lat, lon), part in table.groupby([lat_column, lon_column], sort=False):
+        yield _make_cell(
+            lat, lon, part['time'],
+            {c: part[c] for c in part.columns if c not in (lat_column, lon_column, 'time')}
+        )
+
+
+def read_dump(path: Path) -> List[dict]:
+    """
+    Parse one dump file into cell series.
+
+    Args:
+        path: .json, .csv or .parquet dump
+
+    Returns:
+        List of cells (see _make_cell)
+    """
+    path = Path(path)
+    if path.suffix == '.json':
+        return list(_read_json(path))
+    if path.suffix == '.parquet':
+        return list(_read_flat_table(pd.read_parquet(path)))
+    with open(path, encoding='utf-8') as f:
+        header = [_split_header(c)[0] for c in f.readline().strip().split(',')]
+    if 'time' in header:
+        return list(_read_flat_table(pd.read_csv(path)))
+    return list(_read_open_meteo_csv(path))
+
+
+def list_dumps(paths: Sequence[Path]) -> List[Path]:
+    """Expand directories into their dump files (sorted), keeping the given order otherwise."""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*') if p.suffix in DUMP_SUFFIXES))
+        else:
+            files.append(path)
+    return files
+
+
+# --- Store ---
+def write_store(cells: Sequence[dict], store_dir: Path = WEATHER_STORE_DIR) -> dict:
+    """
+    Write cell series as a new store generation.
+
+    Series for the same coordinates (to 4 decimals) are merged; where they
+    overlap, later cells win for every hour that has any value.
+
+    Args:
+        cells: Cell series (see _make_cell), oldest first
+        store_dir: Store directory
+
+    Returns:
+        Summary with cells and hours stored
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    index_path = store_dir / INDEX_FILE
+    generation = 1
+    if index_path.exists():
+        with np.load(index_path) as index:
+            generation = int(index['generation']) + 1
+
+    grouped = {}
+    for cell in cells:
+        if len(cell['hours']):
+            grouped.setdefault((round(cell['lat'], 4), round(cell['lon'], 4)), []).append(cell)
+    keys = sorted(grouped)
+    starts = np.array([min(int(c['hours'].min()) for c in grouped[k]) for k in keys], dtype=np.int64)
+    ends = np.array([max(int(c['hours'].max()) for c in grouped[k]) for k in keys], dtype=np.int64)
+    lengths = ends - starts + 1
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+
+    values_name = f"values-{generation:06d}.npy"
+    values = np.lib.format.open_memmap(
+        store_dir / values_name, mode='w+', dtype=np.float32, shape=(int(lengths.sum()), len(FIELDS))
+    )
+    values[:] = np.nan
+    for key, start, offset in zip(keys, starts, offsets):
+        for cell in grouped[key]:
+            present = ~np.isnan(cell['values']).all(axis=1)
+            values[offset + cell['hours'][present] - start] = cell['values'][present]
+    values.flush()
+    del values
+
+    tmp = store_dir / (INDEX_FILE + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.savez(
+            f, lat=np.array([k[0] for k in keys]), lon=np.array([k[1] for k in keys]),
+            start=starts, offset=offsets, length=lengths, fields=np.array(FIELDS),
+            values_file=np.array(values_name), generation=np.array(generation)
+        )
+    os.replace(tmp, index_path)
+    for old in store_dir.glob('values-*.npy'):
+        if old.name != values_name:
+            try:
+                old.unlink()
+            except OSError:  # Still mapped by a reader on Windows; removed by the next ingest
+                pass
+    return {'cells': len(keys), 'hours': int(lengths.sum())}
+
+
+class WeatherStore:
+    """
+    Read-only view of an ingested store.
+
+    Args:
+        index: Contents of index.npz
+        values: Hourly value matrix (memory-mapped)
+        max_distance: Largest record-to-cell distance (degrees) that counts as a match
+    """
+
+    def __init__(self, index: dict, values: np.ndarray, max_distance: float = WEATHER_STORE_MAX_DISTANCE_DEG):
+        self.lats = index['lat']
+        self.lons = index['lon']
+        self.starts = index['start']
+        self.offsets = index['offset']
+        self.lengths = index['length']
+        self.values = values
+        self.max_distance = max_distance
+        self._tree = cKDTree(np.column_stack([self.lats, self.lons])) if len(self.lats) else None
+
+    @classmethod
+    def load(
+        cls,
+        store_dir: Path = WEATHER_STORE_DIR,
+        max_distance: float = WEATHER_STORE_MAX_DISTANCE_DEG
+    ) -> Optional['WeatherStore']:
+        """
+        Open a store.
+
+        Returns:
+            WeatherStore, or None if nothing has been ingested
+        """
+        store_dir = Path(store_dir)
+        try:
+            with np.load(store_dir / INDEX_FILE) as data:
+                index = {k: data[k] for k in data.files}
+        except FileNotFoundError:
+            return None
+        if index['fields'].tolist() != FIELDS:
+            raise ValueError(f"{store_dir} was written with fields {index['fields'].tolist()}, expected {FIELDS}")
+        values = np.load(store_dir / str(index['values_file']), mmap_mode='r')
+        return cls(index, values, max_distance)
+
+    def cells(self) -> List[dict]:
+        """Stored series as cells (views into the value matrix), e.g. to merge with new dumps."""
+        return [
+            {'lat': float(lat), 'lon': float(lon), 'hours': np.arange(start, start + length),
+             'values': self.values[offset:offset + length]}
+            for lat, lon, start, offset, length
+            in zip(self.lats, self.lons, self.starts, self.offsets, self.lengths)
+        ]
+
+    def stats(self) -> dict:
+        """Cells, hours, covered time range and matrix size."""
+        if not len(self.starts):
+            return {'cells': 0, 'hours': 0, 'first': None, 'last': None, 'size_mb': 0.0}
+        as_time = lambda h: str(np.datetime64(int(h), 'h'))
+        return {
+            'cells': len(self.starts),
+            'hours': int(self.lengths.sum()),
+            'first': as_time(self.starts.min()),
+            'last': as_time((self.starts + self.lengths - 1).max()),
+            'size_mb': self.values.nbytes / 1e6
+        }
+
+    # --- Lookup ---
+    def nearest_cells(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Index of the nearest cell for each location (-1 if none is within max_distance)."""
+        if self._tree is None:
+            return np.full(len(lats), -1, dtype=np.int64)
+        distance, cell = self._tree.query(np.column_stack([lats, lons]), distance_upper_bound=self.max_distance)
+        return np.where(np.isfinite(distance), cell, -1).astype(np.int64)
+
+    def lookup(self, lats: np.ndarray, lons: np.ndarray, hours: np.ndarray) -> np.ndarray:
+        """
+        Hourly values for locations and GMT hours.
+
+        Args:
+            lats: Latitudes
+            lons: Longitudes
+            hours: Hours since the epoch (GMT)
+
+        Returns:
+            (n, len(FIELDS)) float32 array, NaN where the store has no value
+        """
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        # One nearest-cell query per distinct location (records repeat locations heavily)
+        keys = np.rint(lats * 1e4).astype(np.int64) * 4_000_000 + np.rint(lons * 1e4).astype(np.int64)
+        codes, unique = pd.factorize(keys)
+        first = np.zeros(len(unique), dtype=np.int64)
+        first[codes[::-1]] = np.arange(len(codes))[::-1]
+        cells = self.nearest_cells(lats[first], lons[first])[codes]
+
+        out = np.full((len(cells), len(FIELDS)), np.nan, dtype=np.float32)
+        matched = cells >= 0
+        relative = np.asarray(hours, dtype=np.int64)[matched] - self.starts[cells[matched]]
+        inside = (relative >= 0) & (relative < self.lengths[cells[matched]])
+        rows = np.flatnonzero(matched)[inside]
+        positions = self.offsets[cells[rows]] + relative[inside]
+        order = np.argsort(positions, kind='stable')  # Sequential reads from the memory map
+        out[rows[order]] = self.values[positions[order]]
+        return out
+
+    def lookup_keys(self, keyed: pd.DataFrame) -> pd.DataFrame:
+        """
+        Weather for prepare_weather_lookup_keys output.
+
+        Args:
+            keyed: DataFrame with lat_round, lon_round and DateTime (date_only is its day)
+
+        Returns:
+            DataFrame with HISTORICAL_COLUMNS value columns and keyed's index
+        """
+        hours = keyed['DateTime'].to_numpy().astype('datetime64[h]').astype(np.int64)
+        values = self.lookup(keyed['lat_round'].to_numpy(), keyed['lon_round'].to_numpy(), hours)
+        return pd.DataFrame(values.astype(float), columns=list(HISTORICAL_COLUMNS.values()), index=keyed.index)
+
+    def enrich(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add hourly weather columns to violation records from local disk.
+
+        Same output as src.weather.enrich_with_historical_weather.
+
+        Args:
+            df: Cleaned DataFrame with Latitude, Longitude and DateTime columns
+
+        Returns:
+            DataFrame with temperature, precipitation, snowfall, weathercode and
+            windspeed columns (NaN where the store has no weather)
+        """
+        weather = self.lookup_keys(prepare_weather_lookup_keys(df))
+        enriched = df.copy()
+        for column in weather.columns:
+            enriched[column] = weather[column]
+        return enriched
+
+
+# --- Ingest ---
+def ingest(
+    paths: Sequence[Path],
+    store_dir: Path = WEATHER_STORE_DIR,
+    max_workers: Optional[int] = None,
+    replace: bool = False
+) -> dict:
+    """
+    Parse dump files in parallel and add them to the store.
+
+    Args:
+        paths: Dump files or directories of them
+        store_dir: Store directory
+        max_workers: Parsing processes (defaults to the CPU count)
+        replace: Discard the existing store instead of merging into it
+
+    Returns:
+        Report with files, cells and hours stored, and seconds (parse, write)
+    """
+    started = time.perf_counter()
+    files = list_dumps(paths)
+    if not files:
+        raise FileNotFoundError("No .csv, .json or .parquet dump files found")
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        parsed = [cell for cells in executor.map(read_dump, files) for cell in cells]
+    parsed_at = time.perf_counter()
+
+    existing = None if replace else WeatherStore.load(store_dir)
+    report = write_store((existing.cells() if existing else []) + parsed, store_dir)
+    report.update({
+        'files': len(files),
+        'seconds': {'parse': parsed_at - started, 'write': time.perf_counter() - parsed_at}
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local store of historical hourly weather.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = sub.add_parser('ingest', help="Add bulk weather dumps to the store")
+    ingest_parser.add_argument('--input', nargs='+', type=Path, required=True,
+                               help="Dump files (.json, .csv, .parquet) or directories of them")
+    ingest_parser.add_argument('--store', type=Path, default=WEATHER_STORE_DIR)
+    ingest_parser.add_argument('--workers', type=int, default=None, help="Parsing processes")
+    ingest_parser.add_argument('--replace', action='store_true', help="Rebuild instead of merging")
+    info_parser = sub.add_parser('info', help="Describe the store")
+    info_parser.add_argument('--store', type=Path, default=WEATHER_STORE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        report = ingest(args.input, args.store, args.workers, args.replace)
+        print(f"Stored {report['hours']} hours for {report['cells']} cells from {report['files']} files "
+              f"(parse {report['seconds']['parse']:.1f}s, write {report['seconds']['write']:.1f}s)")
+        return
+
+    store = WeatherStore.load(args.store)
+    if store is None:
+        parser.error(f"No weather store at {args.store}; ingest dumps first")
+    print(json.dumps(store.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+What-if sensitivity sweeps for the ABIA Traffic Accident Forecaster.
+
+Contains functions that hold a location's state and weather fixed, build
+every PartOfDay x DayOfWeek x VehicleType x Gender combination, and score
+the whole grid with one encoding pass and one model call, so comparing
+hundreds of scenarios costs about the same as a single prediction. The
+grid is scored through the prediction cache with the model version's
+transformer, as the headline prediction is, so a grid cell and the
+matching headline agree.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from .config import MODEL_FEATURES, VEHICLE_MAP, GENDER_MAP, DAYS_OF_WEEK, PART_OF_DAY_HOURS
+from .prediction_cache import PredictionCache, cached_predict_proba
+
+
+def build_sweep_grid(state: str, weather: dict, month: int) -> pd.DataFrame:
+    """
+    Build the full scenario grid for one location and weather.
+
+    Args:
+        state: State code
+        weather: Model feature weather values (see src.weather.to_model_weather)
+        month: Month (1-12)
+
+    Returns:
+        DataFrame with MODEL_FEATURES columns plus the display labels
+        'Vehicle' and 'Driver', one row per scenario
+    """
+    grid = pd.MultiIndex.from_product(
+        [list(PART_OF_DAY_HOURS), DAYS_OF_WEEK, list(VEHICLE_MAP), list(GENDER_MAP)],
+        names=['PartOfDay', 'DayOfWeek', 'Vehicle', 'Driver']
+    ).to_frame(index=False)
+    grid['State'] = state
+    grid['Hour'] = grid['PartOfDay'].map(PART_OF_DAY_HOURS)
+    grid['Month'] = month
+    grid['VehicleType'] = grid['Vehicle'].map(VEHICLE_MAP)
+    grid['Gender'] = grid['Driver'].map(GENDER_MAP)
+    for feature in ('temperature', 'precipitation', 'snowfall', 'windspeed', 'WeatherCondition'):
+        grid[feature] = weather[feature]
+    return grid[MODEL_FEATURES + ['Vehicle', 'Driver']]
+
+
+def score_sweep(handle, grid: pd.DataFrame, cache: Optional[PredictionCache] = None) -> pd.DataFrame:
+    """
+    Score a scenario grid in one call.
+
+    Args:
+        handle: ModelHandle serving the headline prediction
+        grid: Output of build_sweep_grid
+        cache: Shared PredictionCache (defaults to a private one)
+
+    Returns:
+        The grid with a 'probability' column added
+    """
+    probabilities = cached_predict_proba(
+        cache if cache is not None else PredictionCache(), handle.model, grid[MODEL_FEATURES],
+        handle.model_columns, handle.version, handle.transformer
+    )
+    return grid.assign(probability=probabilities)
+
+
+def sweep_matrix(scored: pd.DataFrame, vehicle: Optional[str] = None, driver: Optional[str] = None) -> pd.DataFrame:
+    """
+    Pivot scored scenarios into a PartOfDay x DayOfWeek risk matrix.
+
+    Args:
+        scored: Output of score_sweep
+        vehicle: VEHICLE_MAP key to show (None averages over vehicle types)
+        driver: GENDER_MAP key to show (None averages over drivers)
+
+    Returns:
+        DataFrame of probabilities, parts of day as rows and days as columns
+    """
+    if vehicle is not None:
+        scored = scored[scored['Vehicle'] == vehicle]
+    if driver is not None:
+        scored = scored[scored['Driver'] == driver]
+    matrix = scored.pivot_table(index='PartOfDay', columns='DayOfWeek', values='probability', aggfunc='mean')
+    return matrix.reindex(index=list(PART_OF_DAY_HOURS), columns=DAYS_OF_WEEK)
+
+
+def lowest_risk_window(matrix: pd.DataFrame) -> dict:
+    """
+    Find the safest cell of a sweep matrix.
+
+    Args:
+        matrix: Output of sweep_matrix
+
+    Returns:
+        Dictionary with part_of_day, day_of_week and probability
+    """
+    values = matrix.to_numpy()
+    row, col = np.unravel_index(np.nanargmin(values), values.shape)
+    return {
+        'part_of_day': matrix.index[row],
+        'day_of_week': matrix.columns[col],
+        'probability': float(values[row, col])
+    }
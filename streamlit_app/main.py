@@ -14,28 +14,37 @@ sys.path.insert(0, str(PROJECT_ROOT))
 # --- Standard Library & Third-Party Imports ---
 import streamlit as st
 import pandas as pd
-import requests
 from datetime import datetime
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderUnavailable
 import nest_asyncio
 import time
+import uuid
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 import pytz
-from timezonefinder import TimezoneFinder
 
 # --- Local Imports from src ---
-from src.config import STATE_LIST, VEHICLE_MAP, GENDER_MAP, WEATHER_CODE_MAP
-from src.models import load_model_assets, prepare_prediction_input
-from src.features import get_part_of_day
+from src.config import (
+    STATE_LIST, VEHICLE_MAP, GENDER_MAP, WEATHER_UNITS, DEFAULT_TIMEZONE,
+    PREFETCH_WAIT_SECONDS, LIVE_WEATHER_BUDGET, ESTIMATE_UPGRADE_SECONDS, ESTIMATE_UPGRADE_MAX_FAILURES,
+    PART_OF_DAY_HOURS
+)
+from src.registry import ModelRegistry, load_version_metadata
+from src.prediction_cache import PredictionCache, cached_predict_proba
+from src.attribution import ForestAttribution, attribution_target, top_factors
+from src.history import AccidentRateCube
+from src.climatology import ClimatologyTable
+from src.geocoding import SuggestionService, GEOCODER_ERROR
+from src.prefetch import LocationPrefetcher
+from src.audit import PredictionLogger
+from src.drift import DriftMonitor
+from src.http_client import CircuitOpenError, ProviderError
+from src.weather import fetch_current_weather, open_meteo_fields, to_model_weather
+from src.whatif import build_sweep_grid, score_sweep, sweep_matrix, lowest_risk_window
+from src.features import get_part_of_day, get_local_timezone
 
 # Apply the patch for asyncio (required for geopy in Streamlit)
 nest_asyncio.apply()
 
-# --- Path Constants ---
-MODELS_DIR = PROJECT_ROOT / 'models'
-MODEL_PATH = MODELS_DIR / 'accident_predictor_model.pkl'
-COLUMNS_PATH = MODELS_DIR / 'model_columns.pkl'
-
 # --- Weather Icons Mapping ---
 WEATHER_ICONS = {
     'Clear': '☀️',
@@ -416,105 +425,226 @@ def init_session_state():
         'last_search': '',
         'last_search_time': 0,
         'prediction_made': False,
-        'prediction_result': None
+        'prediction_result': None,
+        'session_id': None,
+        'render_timings': {}
     }
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
+    if st.session_state.session_id is None:
+        st.session_state.session_id = uuid.uuid4().hex
 
 init_session_state()
 
 
 # --- Model Loading with Streamlit Caching ---
 @st.cache_resource
-def load_model():
-    """Load the trained model and columns with Streamlit caching."""
-    model, model_columns = load_model_assets(MODEL_PATH, COLUMNS_PATH)
-    return model, model_columns
+def get_model_registry():
+    """Model registry shared by all sessions; hot-swaps new versions in the background."""
+    return ModelRegistry().start()
+
+
+@st.cache_resource
+def get_prediction_cache():
+    """Prediction cache shared by all sessions."""
+    return PredictionCache()
+
+
+@st.cache_resource(max_entries=16)
+def get_attribution(version: str, _model, _model_columns):
+    """Attribution engine for one model version (built once, shared by all sessions)."""
+    return ForestAttribution(_model, _model_columns)
+
+
+@st.cache_resource(ttl=3600)
+def get_accident_cube():
+    """Historical accident-rate cube (None until `python -m src.history` has been run)."""
+    return AccidentRateCube.load()
+
+
+@st.cache_resource(ttl=3600)
+def get_climatology():
+    """Typical-weather fallback table (None until `python -m src.climatology` has been run)."""
+    return ClimatologyTable.load()
+
+
+@st.cache_resource
+def get_suggestion_service():
+    """Debounced, single-flight address suggestion service shared by all sessions."""
+    return SuggestionService()
+
+
+@st.cache_resource
+def get_prediction_logger():
+    """Asynchronous Parquet audit log of every prediction, shared by all sessions."""
+    return PredictionLogger()
+
+
+@st.cache_resource(max_entries=4)
+def get_drift_monitor(version: str):
+    """Serving input sketches for a model version (None if it has no training reference profile)."""
+    reference = load_version_metadata(version).get('drift_reference')
+    return DriftMonitor(reference, version) if reference else None
+
+
+@st.cache_resource
+def get_location_prefetcher():
+    """Background weather/timezone prefetch for selected locations, shared by all sessions."""
+    return LocationPrefetcher()
 
 
 # --- Helper Functions ---
-@st.cache_data(ttl=3600, show_spinner=False)
-def get_address_suggestions(address: str, state: str) -> list:
-    """Get address suggestions using Photon geocoder with Nominatim fallback."""
-    if not address or len(address) < 3:
-        return []
-    
-    # Try Photon geocoder first (Komoot, better rate limits)
-    try:
-        from geopy.geocoders import Photon
-        geolocator = Photon(user_agent="RoadRiskAI/1.0", timeout=10)
-        locations = geolocator.geocode(
-            f"{address}, {state}, USA",
-            exactly_one=False,
-            limit=5
-        )
-        if locations:
-            return [(loc.address, loc.latitude, loc.longitude) for loc in locations]
-    except Exception:
-        pass  # Try Nominatim fallback
-    
-    # Fallback to Nominatim with delay
+def get_address_suggestions(address: str, state: str, immediate: bool = False) -> list:
+    """Get address suggestions, sharing in-flight lookups with other sessions."""
+    future = get_suggestion_service().request(
+        st.session_state.session_id, address, state, immediate=immediate
+    )
     try:
-        time.sleep(1.5)
-        geolocator = Nominatim(
-            user_agent="RoadRiskAI/1.0 (roadrisk-ai.streamlit.app)",
-            timeout=15
-        )
-        locations = geolocator.geocode(
-            f"{address}, {state}, USA",
-            exactly_one=False,
-            limit=5
-        )
-        if locations:
-            return [(loc.address, loc.latitude, loc.longitude) for loc in locations]
-        return []
-    except GeocoderUnavailable:
-        return [("GEOCODER_ERROR", 0, 0)]
-    except Exception:
-        return [("GEOCODER_ERROR", 0, 0)]
-
+        return future.result(timeout=30)
+    except CancelledError:
+        return []  # Superseded by a newer query from this session
+    except FutureTimeoutError:
+        return list(GEOCODER_ERROR)
 
 
 @st.cache_data(ttl=300, show_spinner=False)
 def get_live_weather(lat: float, lon: float) -> dict:
     """Fetch current weather data from Open-Meteo API."""
     try:
-        url = (
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
-            f"&current=temperature_2m,precipitation,snowfall,weather_code,wind_speed_10m"
-            f"&temperature_unit=fahrenheit&wind_speed_unit=mph"
-        )
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        json_data = response.json()
-        
-        # Check for 'current' key in response
-        if 'current' not in json_data:
-            st.error(f"API response missing 'current' key. Response keys: {list(json_data.keys())}")
-            return None
-            
-        data = json_data['current']
-        return {
-            'temperature_f': data['temperature_2m'],
-            'temperature_c': round((data['temperature_2m'] - 32) * 5/9, 1),
-            'precipitation': data['precipitation'],
-            'snowfall': data['snowfall'],
-            'weathercode': data['weather_code'],
-            'windspeed': data['wind_speed_10m']
-        }
-    except requests.exceptions.Timeout:
-        st.warning("⏱️ Weather API request timed out. Please try again.")
-        return None
-    except requests.exceptions.RequestException as e:
-        st.warning(f"🌐 Network error fetching weather: {type(e).__name__}")
+        return fetch_current_weather(lat, lon)
+    except CircuitOpenError:
+        st.warning("🌐 Weather service is temporarily unavailable. Please try again shortly.")
         return None
-    except KeyError as e:
-        st.warning(f"⚠️ Weather data format error - missing key: {e}")
+    except ProviderError as e:
+        st.warning(f"🌐 Could not fetch weather: {e}")
         return None
+
+
+def get_location_weather(lat: float, lon: float, state: str, month: int, hour: int) -> dict:
+    """
+    Weather for the selected location, using the prefetch started when it was selected.
+
+    With a climatology table, live weather gets LIVE_WEATHER_BUDGET seconds;
+    after that the typical weather for the state, month and hour is returned
+    (marked estimated=True) while the live fetch carries on in the background.
+    """
+    prefetcher = get_location_prefetcher()
+    prefetcher.prefetch(st.session_state.session_id, lat, lon)  # No-op if already fetched or in flight
+    climatology = get_climatology()
+    budget = LIVE_WEATHER_BUDGET if climatology else PREFETCH_WAIT_SECONDS
+    context = prefetcher.result(st.session_state.session_id, lat, lon, timeout=budget)
+    if context and context['weather']:
+        return context['weather']
+    if climatology:
+        return climatology.lookup(state, month, hour)
+    return get_live_weather(lat, lon)  # No fallback table: fetch (and report errors) directly
+
+
+def log_prediction(result: dict, started: float, trigger: str = 'predict') -> None:
+    """Queue a prediction for the audit log (returns in microseconds; written in the background)."""
+    get_prediction_logger().log({
+        'session_id': st.session_state.session_id,
+        'trigger': trigger,
+        'model_version': result['model_version'],
+        'probability': float(result['probability']),
+        'estimated': bool(result['weather'].get('estimated', False)),
+        'stale_weather': bool(result['weather'].get('stale', False)),
+        'latency_ms': (time.perf_counter() - started) * 1000,
+        'inputs': dict(result['inputs'], timestamp=result['inputs']['timestamp'].isoformat()),
+        'features': result['features'],
+        'weather': {k: result['weather'][k] for k in
+                    ('temperature_c', 'precipitation', 'snowfall', 'windspeed', 'weathercode')},
+        'weather_condition': result['weather_condition']
+    })
+
+
+def get_sweep(model_handle, result: dict) -> pd.DataFrame:
+    """What-if grid for a prediction's location and weather, scored once and kept with the result."""
+    if result.get('sweep') is None:
+        grid = build_sweep_grid(
+            result['inputs']['state'], to_model_weather(result['weather']), result['features']['Month']
+        )
+        result['sweep'] = score_sweep(model_handle, grid, get_prediction_cache())
+    return result['sweep']
+
+
+def score_prediction(model_handle, inputs: dict, weather: dict) -> dict:
+    """
+    Score one set of selections against the given weather.
+
+    Args:
+        model_handle: Serving ModelHandle
+        inputs: Selections (state, vehicle_type, gender, timestamp, lat, lon)
+        weather: Live or estimated weather dictionary
+
+    Returns:
+        Result dictionary stored as st.session_state.prediction_result
+    """
+    # The model version's own transformer, so features match its training
+    transformer = model_handle.transformer
+    features = transformer.features_one({
+        'timestamp': inputs['timestamp'],
+        'lat': inputs['lat'],
+        'lon': inputs['lon'],
+        'state': inputs['state'],
+        'vehicle': inputs['vehicle_type'],
+        'gender': inputs['gender'],
+        **open_meteo_fields(weather)
+    }, **WEATHER_UNITS)
+    input_df = pd.DataFrame([features])
+    weather_condition = features['WeatherCondition']
+    
+    probability = cached_predict_proba(
+        get_prediction_cache(), model_handle.model, input_df,
+        model_handle.model_columns, model_handle.version, transformer
+    )[0]
+    # Estimated weather is re-scored once the live fetch lands; count only that result
+    monitor = get_drift_monitor(model_handle.version)
+    if monitor is not None and not weather.get('estimated'):
+        monitor.update(features)
+    cube = get_accident_cube()
+    history = cube.lookup(
+        features['State'], features['Hour'], features['DayOfWeek'],
+        weather_condition, features['VehicleType']
+    ) if cube else None
+    return {
+        'prediction': int(probability > 0.5),
+        'probability': probability,
+        'weather': weather,
+        'weather_condition': weather_condition,
+        'factors': explain_prediction(model_handle, input_df),
+        'history': history,
+        'model_version': model_handle.version,
+        'inputs': inputs,
+        'features': features
+    }
+
+
+def explain_prediction(model_handle, input_df: pd.DataFrame) -> list:
+    """Top per-feature contributions to a single prediction (empty if unavailable)."""
+    try:
+        X = model_handle.transformer.encode(input_df)
+        forest, columns, shard_version = attribution_target(
+            model_handle.model, model_handle.model_columns, input_df['State'].iloc[0]
+        )
+        key = model_handle.version if shard_version is None else f"{model_handle.version}/{shard_version}"
+        contributions = get_attribution(key, forest, columns).explain(X.reindex(columns=columns, fill_value=0))
+        return top_factors(contributions.iloc[0], input_df.iloc[0])
     except Exception as e:
-        st.warning(f"❌ Unexpected error fetching weather: {type(e).__name__}: {e}")
-        return None
+        print(f"Error explaining prediction: {e}")
+        return []
+
+
+def format_factor(factor: dict) -> str:
+    """One line of the factors card, e.g. '▲ +12.4 pts · Time of day: Night'."""
+    value = factor['value']
+    if isinstance(value, float):
+        value = f"{value:.1f}"
+    points = factor['contribution'] * 100
+    arrow, color = ('▲', '#ef4444') if points >= 0 else ('▼', '#22c55e')
+    return (f'<span style="color: {color}; font-weight: 600;">{arrow} {points:+.1f} pts</span>'
+            f' · {factor["label"]}: {value}')
 
 
 def get_risk_category(probability: float) -> tuple:
@@ -531,16 +661,54 @@ def celsius_to_fahrenheit(c: float) -> float:
     return round(c * 9/5 + 32, 1)
 
 
+@st.cache_data(show_spinner=False)
+def get_timezone_name(lat: float, lon: float) -> str:
+    """Timezone name for a location (looked up once per coordinate)."""
+    return get_local_timezone(lat, lon).zone
+
+
+def get_time_selection() -> tuple:
+    """
+    Resolve the time settings into (local now, hour, part of day).
+
+    Uses the selected location's timezone, or the default (Eastern) before
+    a location is chosen.
+    """
+    if st.session_state.lat and st.session_state.lon:
+        context = get_location_prefetcher().peek(
+            st.session_state.session_id, st.session_state.lat, st.session_state.lon
+        )
+        zone = context['timezone'] if context else get_timezone_name(st.session_state.lat, st.session_state.lon)
+        local_tz = pytz.timezone(zone)
+    else:
+        local_tz = pytz.timezone(DEFAULT_TIMEZONE)
+    now = datetime.now(local_tz)
+    if st.session_state.get('use_current_time', True):
+        return now, now.hour, get_part_of_day(now.hour)
+    part_of_day = st.session_state.get('manual_part_of_day', 'Morning')
+    return now, PART_OF_DAY_HOURS[part_of_day], part_of_day
+
+
+@contextmanager
+def render_timer(section: str):
+    """Record a page section's render time; add ?timings=1 to the URL to log them."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        st.session_state.render_timings[section] = elapsed_ms
+        if 'timings' in st.query_params:
+            print(f"render {section}: {elapsed_ms:.1f} ms")
+
+
 # --- Main App ---
 def main():
     # Header - now uses dark text visible on light background
     st.markdown('<h1 class="main-header">🚦 RoadRisk AI</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Real-time traffic accident risk prediction powered by AI and live weather data</p>', unsafe_allow_html=True)
     
-    # Load model
-    model, model_columns = load_model()
-    
-    if model is None or model_columns is None:
+    if get_model_registry().current() is None:
         st.error("⚠️ Model files not found. Please ensure model files are in the `models/` directory.")
         return
     
@@ -556,6 +724,19 @@ def main():
     col1, col2 = st.columns([1.2, 1])
     
     with col1:
+        location_panel()
+        location_map()
+    
+    with col2:
+        vehicle_time_panel()
+    
+    prediction_panel()
+
+
+@st.fragment
+def location_panel():
+    """Location search; reruns on its own while the user types and searches."""
+    with render_timer('location'):
         # Location Section
         st.markdown('<div class="section-header">📍 Location</div>', unsafe_allow_html=True)
         
@@ -571,9 +752,14 @@ def main():
         
         # Clear suggestions if state changes
         if st.session_state.prev_state != state_input:
+            get_suggestion_service().cancel(st.session_state.session_id)
+            get_location_prefetcher().cancel(st.session_state.session_id)
+            had_selection = st.session_state.selected_address is not None
             st.session_state.suggestions = []
             st.session_state.selected_address = None
             st.session_state.prev_state = state_input
+            if had_selection:
+                st.rerun()  # The map and prediction panel depend on the selection
         
         # Address input with auto-suggest
         address_input = st.text_input(
@@ -591,7 +777,9 @@ def main():
         # Trigger search: either button click or auto after typing
         if search_clicked and address_input and len(address_input) >= 3:
             with st.spinner("Finding addresses..."):
-                st.session_state.suggestions = get_address_suggestions(address_input, state_input)
+                st.session_state.suggestions = get_address_suggestions(
+                    address_input, state_input, immediate=True
+                )
             st.session_state.last_search = address_input
         elif (address_input and 
               len(address_input) >= 3 and 
@@ -604,7 +792,7 @@ def main():
         # Display suggestions or error
         if st.session_state.suggestions:
             # Check for geocoder error
-            if len(st.session_state.suggestions) == 1 and st.session_state.suggestions[0][0] == "GEOCODER_ERROR":
+            if st.session_state.suggestions == GEOCODER_ERROR:
                 st.warning("⚠️ Address search service is temporarily unavailable. Please try again in a few seconds.")
                 st.session_state.suggestions = []  # Clear error state
             else:
@@ -617,6 +805,8 @@ def main():
                         st.session_state.lat = lat
                         st.session_state.lon = lon
                         st.session_state.prediction_made = False
+                        # Start on weather and timezone while the page redraws
+                        get_location_prefetcher().prefetch(st.session_state.session_id, lat, lon)
                         st.rerun()
         
         # Show selected location
@@ -627,32 +817,44 @@ def main():
                 st.success(f"✅ **Selected:** {st.session_state.selected_address[:80]}...")
             with clear_col:
                 if st.button("🗑️ Clear", key="clear_address", help="Clear selection and search again"):
+                    get_suggestion_service().cancel(st.session_state.session_id)
+                    get_location_prefetcher().cancel(st.session_state.session_id)
                     st.session_state.selected_address = None
                     st.session_state.suggestions = []
                     st.session_state.prediction_made = False
                     st.session_state.last_search = ''
                     st.rerun()
-            
-            # Map display
-            st.markdown('<div class="map-container">', unsafe_allow_html=True)
-            map_data = pd.DataFrame({
-                'lat': [st.session_state.lat],
-                'lon': [st.session_state.lon]
-            })
-            st.map(map_data, zoom=15)
-            st.markdown('</div>', unsafe_allow_html=True)
-    
-    with col2:
+
+
+def location_map():
+    """Map of the selected location; only drawn on full reruns, i.e. when the selection changes."""
+    if not st.session_state.selected_address:
+        return
+    with render_timer('map'):
+        # Map display
+        st.markdown('<div class="map-container">', unsafe_allow_html=True)
+        map_data = pd.DataFrame({
+            'lat': [st.session_state.lat],
+            'lon': [st.session_state.lon]
+        })
+        st.map(map_data, zoom=15)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment
+def vehicle_time_panel():
+    """Vehicle, driver and time settings; changes rerun only this panel."""
+    with render_timer('vehicle_time'):
         # Vehicle & Driver Section
         st.markdown('<div class="section-header">🚗 Vehicle & Driver</div>', unsafe_allow_html=True)
         
-        vehicle_type = st.selectbox(
+        st.selectbox(
             "Vehicle Type",
             list(VEHICLE_MAP.keys()),
             key='vehicle_type'
         )
         
-        gender = st.selectbox(
+        st.selectbox(
             "Driver Gender",
             list(GENDER_MAP.keys()),
             key='gender'
@@ -664,202 +866,268 @@ def main():
         use_current_time = st.toggle("Use current time", value=True, key='use_current_time')
         
         if use_current_time:
-            # Get timezone based on selected location, or default to EST
-            try:
-                if st.session_state.lat and st.session_state.lon:
-                    tf = TimezoneFinder()
-                    tz_name = tf.timezone_at(lat=st.session_state.lat, lng=st.session_state.lon)
-                    if tz_name:
-                        local_tz = pytz.timezone(tz_name)
-                    else:
-                        local_tz = pytz.timezone('America/New_York')  # Default to EST
-                else:
-                    local_tz = pytz.timezone('America/New_York')  # Default to EST
-            except:
-                local_tz = pytz.timezone('America/New_York')  # Fallback to EST
-            
-            now = datetime.now(local_tz)
-            current_hour = now.hour
-            current_part = get_part_of_day(current_hour)
+            now, current_hour, current_part = get_time_selection()
             st.markdown(f"""
                 <div class="time-display">
                     <div class="time-value">{now.strftime('%I:%M %p')} • {current_part}</div>
                     <div class="time-date">{now.strftime('%A, %B %d, %Y')}</div>
                 </div>
             """, unsafe_allow_html=True)
-            selected_part_of_day = current_part
-            selected_hour = current_hour
         else:
-            selected_part_of_day = st.selectbox(
+            st.selectbox(
                 "Select Time of Day",
                 ['Morning', 'Afternoon', 'Evening', 'Night'],
                 key='manual_part_of_day',
                 help="Morning: 5AM-12PM, Afternoon: 12PM-5PM, Evening: 5PM-9PM, Night: 9PM-5AM"
             )
-            # Map part of day to representative hour
-            hour_map = {'Morning': 9, 'Afternoon': 14, 'Evening': 19, 'Night': 23}
-            selected_hour = hour_map[selected_part_of_day]
-    
-    st.markdown("---")
-    
-    # Prediction Button
-    predict_disabled = not st.session_state.selected_address
-    
-    if st.button(
-        "🔮 Predict Accident Risk",
-        use_container_width=True,
-        type="primary",
-        disabled=predict_disabled
-    ):
-        if not st.session_state.selected_address:
-            st.error("Please select an address first.")
-        else:
-            # Fetch weather and make prediction
-            with st.status("Analyzing risk...", expanded=True) as status:
-                st.write("📍 Confirming location...")
-                time.sleep(0.3)
-                
-                st.write("🌤️ Fetching live weather data...")
-                weather = get_live_weather(st.session_state.lat, st.session_state.lon)
-                
-                if not weather:
-                    status.update(label="Error", state="error")
-                    st.error("Could not fetch weather data. Please try again.")
-                    return
-                
-                st.write("🧠 Running prediction model...")
-                
-                # Build input data
-                now = datetime.now()
-                input_data = {
-                    "State": state_input,
-                    "VehicleType": VEHICLE_MAP[vehicle_type],
-                    "Gender": GENDER_MAP[gender],
-                    "temperature": weather['temperature_c'],
-                    "precipitation": weather['precipitation'],
-                    "snowfall": weather['snowfall'],
-                    "windspeed": weather['windspeed'] * 1.60934  # Convert mph to km/h for model
-                }
-                input_df = pd.DataFrame([input_data])
-                
-                # Add time features
-                input_df['Hour'] = selected_hour
-                input_df['DayOfWeek'] = now.strftime('%A')
-                input_df['Month'] = now.month
-                input_df['PartOfDay'] = selected_part_of_day
-                
-                # Add weather condition
-                weather_condition = WEATHER_CODE_MAP.get(weather['weathercode'], 'Other')
-                input_df['WeatherCondition'] = weather_condition
-                
-                # Make prediction
-                final_df = prepare_prediction_input(input_df, model_columns)
-                prediction = model.predict(final_df)[0]
-                probability = model.predict_proba(final_df)[0][1]
-                
-                status.update(label="Analysis complete!", state="complete")
-                
-                # Store results
-                st.session_state.prediction_made = True
-                st.session_state.prediction_result = {
-                    'prediction': prediction,
-                    'probability': probability,
-                    'weather': weather,
-                    'weather_condition': weather_condition
-                }
-    
-    # Display Results
-    if st.session_state.prediction_made and st.session_state.prediction_result:
-        result = st.session_state.prediction_result
-        probability = result['probability']
-        weather = result['weather']
-        weather_condition = result['weather_condition']
+
+
+@st.fragment
+def prediction_panel():
+    """Predict button and results; a prediction reruns only this panel."""
+    with render_timer('prediction'):
+        # Take the serving model once; this run keeps it even if a new version is swapped in
+        model_handle = get_model_registry().current()
+        state_input = st.session_state.state_input
+        vehicle_type = st.session_state.vehicle_type
+        gender = st.session_state.gender
+        now, selected_hour, _ = get_time_selection()
         
         st.markdown("---")
-        st.markdown('<div class="section-header">📊 Risk Assessment</div>', unsafe_allow_html=True)
         
-        # Results columns
-        res_col1, res_col2 = st.columns([1, 1])
+        # Prediction Button
+        predict_disabled = not st.session_state.selected_address
         
-        with res_col1:
-            # Risk Gauge
-            risk_label, risk_class, risk_color = get_risk_category(probability)
-            indicator_pos = min(probability * 100, 100)
+        if st.button(
+            "🔮 Predict Accident Risk",
+            use_container_width=True,
+            type="primary",
+            disabled=predict_disabled
+        ):
+            if not st.session_state.selected_address:
+                st.error("Please select an address first.")
+            else:
+                # Fetch weather and make prediction
+                started = time.perf_counter()
+                with st.status("Analyzing risk...", expanded=True) as status:
+                    st.write("🌤️ Fetching live weather data...")
+                    inputs = {
+                        'state': state_input,
+                        'vehicle_type': vehicle_type,
+                        'gender': gender,
+                        'timestamp': now if selected_hour == now.hour else now.replace(
+                            hour=selected_hour, minute=0, second=0, microsecond=0
+                        ),
+                        'lat': st.session_state.lat,
+                        'lon': st.session_state.lon
+                    }
+                    weather = get_location_weather(
+                        inputs['lat'], inputs['lon'], state_input, now.month, selected_hour
+                    )
+                    
+                    if not weather:
+                        status.update(label="Error", state="error")
+                        st.error("Could not fetch weather data. Please try again.")
+                        return
+                    if weather.get('estimated'):
+                        st.write("📚 Live weather is delayed; using typical conditions for now...")
+                    
+                    st.write("🧠 Running prediction model...")
+                    result = score_prediction(model_handle, inputs, weather)
+                    log_prediction(result, started)
+                    
+                    status.update(label="Analysis complete!", state="complete")
+                    
+                    # Store results
+                    st.session_state.prediction_made = True
+                    st.session_state.prediction_result = result
+        
+        # Display Results
+        if st.session_state.prediction_made and st.session_state.prediction_result:
+            result = st.session_state.prediction_result
+            probability = result['probability']
+            weather = result['weather']
+            weather_condition = result['weather_condition']
             
-            st.markdown(f"""
-                <div class="{risk_class}">
-                    <div class="risk-label" style="color: {risk_color};">{risk_label}</div>
-                    <div class="risk-score" style="color: {risk_color};">{probability:.1%}</div>
-                    <div style="color: #94a3b8; font-size: 0.9rem;">Accident Probability</div>
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown("---")
+            st.markdown('<div class="section-header">📊 Risk Assessment</div>', unsafe_allow_html=True)
             
-            # Visual gauge
-            st.markdown(f"""
-                <div style="margin-top: 20px;">
-                    <div style="display: flex; justify-content: space-between; font-size: 0.8rem; color: #94a3b8; margin-bottom: 4px;">
-                        <span>Low</span>
-                        <span>Moderate</span>
-                        <span>High</span>
-                    </div>
-                    <div class="risk-gauge">
-                        <div class="risk-indicator" style="left: {indicator_pos}%;"></div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
-            
-            # Risk interpretation message
-            if probability < 0.25:
-                interpretation = "🟢 Conditions are favorable - standard caution advised."
-                interp_color = "#22c55e"
-            elif probability < 0.50:
-                interpretation = "🟡 Extra caution recommended - potential adverse conditions."
-                interp_color = "#eab308"
-            else:
-                interpretation = "🔴 High risk conditions - consider delaying travel or use extreme caution."
-                interp_color = "#ef4444"
+            # Results columns
+            res_col1, res_col2 = st.columns([1, 1])
             
-            st.markdown(f"""
-                <div style="margin-top: 16px; padding: 12px 16px; background: rgba(30, 41, 59, 0.6); 
-                border-radius: 8px; border-left: 4px solid {interp_color};">
-                    <div style="font-size: 0.95rem; color: #e2e8f0;">
-                        {interpretation}
+            with res_col1:
+                # Risk Gauge
+                risk_label, risk_class, risk_color = get_risk_category(probability)
+                indicator_pos = min(probability * 100, 100)
+                
+                st.markdown(f"""
+                    <div class="{risk_class}">
+                        <div class="risk-label" style="color: {risk_color};">{risk_label}</div>
+                        <div class="risk-score" style="color: {risk_color};">{probability:.1%}</div>
+                        <div style="color: #94a3b8; font-size: 0.9rem;">Accident Probability</div>
                     </div>
-                </div>
-            """, unsafe_allow_html=True)
-        
-        with res_col2:
-            # Weather Card
-            weather_icon = WEATHER_ICONS.get(weather_condition, '🌡️')
-            st.markdown(f"""
-                <div class="weather-card">
-                    <div class="weather-icon">{weather_icon}</div>
-                    <div class="weather-info">
-                        <div class="weather-condition">{weather_condition}</div>
-                        <div class="weather-temp">{weather['temperature_f']:.0f}°F / {weather['temperature_c']:.0f}°C</div>
-                        <div style="color: #94a3b8; font-size: 0.9rem;">
-                            💨 Wind: {weather['windspeed']:.0f} mph
+                """, unsafe_allow_html=True)
+                
+                # Visual gauge
+                st.markdown(f"""
+                    <div style="margin-top: 20px;">
+                        <div style="display: flex; justify-content: space-between; font-size: 0.8rem; color: #94a3b8; margin-bottom: 4px;">
+                            <span>Low</span>
+                            <span>Moderate</span>
+                            <span>High</span>
+                        </div>
+                        <div class="risk-gauge">
+                            <div class="risk-indicator" style="left: {indicator_pos}%;"></div>
                         </div>
                     </div>
-                </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
+                
+                # Risk interpretation message
+                if probability < 0.25:
+                    interpretation = "🟢 Conditions are favorable - standard caution advised."
+                    interp_color = "#22c55e"
+                elif probability < 0.50:
+                    interpretation = "🟡 Extra caution recommended - potential adverse conditions."
+                    interp_color = "#eab308"
+                else:
+                    interpretation = "🔴 High risk conditions - consider delaying travel or use extreme caution."
+                    interp_color = "#ef4444"
+                
+                st.markdown(f"""
+                    <div style="margin-top: 16px; padding: 12px 16px; background: rgba(30, 41, 59, 0.6); 
+                    border-radius: 8px; border-left: 4px solid {interp_color};">
+                        <div style="font-size: 0.95rem; color: #e2e8f0;">
+                            {interpretation}
+                        </div>
+                    </div>
+                """, unsafe_allow_html=True)
+                history = result.get('history')
+                if history:
+                    scope = "these conditions"
+                    if 'WeatherCondition' not in history['conditioned_on']:
+                        scope = "this state, hour and day" if 'VehicleType' not in history['conditioned_on'] \
+                            else "these conditions (any weather)"
+                    st.markdown(f"""
+                        <div class="interpretation-card">
+                            📚 Historical accident rate for {scope}:
+                            <b>{history['rate']:.1%}</b> of {history['stops']:,} recorded stops
+                        </div>
+                    """, unsafe_allow_html=True)
+                st.caption(f"Model version: {result.get('model_version', 'unknown')}")
             
-            # Contributing factors
-            st.markdown("""
-                <div style="margin-top: 16px; padding: 14px; background: #f8fafc; 
-                border-radius: 10px; border: 2px solid #e2e8f0;">
-                    <div style="font-size: 0.95rem; font-weight: 600; color: #1e293b; margin-bottom: 10px;">
-                        📋 Factors Analyzed
+            with res_col2:
+                # Weather Card
+                weather_icon = WEATHER_ICONS.get(weather_condition, '🌡️')
+                st.markdown(f"""
+                    <div class="weather-card">
+                        <div class="weather-icon">{weather_icon}</div>
+                        <div class="weather-info">
+                            <div class="weather-condition">{weather_condition}</div>
+                            <div class="weather-temp">{weather['temperature_f']:.0f}°F / {weather['temperature_c']:.0f}°C</div>
+                            <div style="color: #94a3b8; font-size: 0.9rem;">
+                                💨 Wind: {weather['windspeed']:.0f} mph
+                            </div>
+                        </div>
                     </div>
-                    <div style="font-size: 0.9rem; color: #475569; line-height: 1.7;">
-                        • Location & State<br>
-                        • Current Weather Conditions<br>
-                        • Time of Day<br>
-                        • Vehicle Type<br>
-                        • Historical Accident Patterns
+                """, unsafe_allow_html=True)
+                if weather.get('estimated') and result.get('upgrade_failures', 0) >= ESTIMATE_UPGRADE_MAX_FAILURES:
+                    st.caption(f"⚠️ Live weather unavailable: the weather service is not responding, so this "
+                               f"uses typical conditions for this {weather['based_on']}. Predict again to retry.")
+                elif weather.get('estimated'):
+                    st.caption(f"⏳ Estimated: live weather was unavailable, so this uses typical conditions "
+                               f"for this {weather['based_on']}. It updates automatically when live data arrives.")
+                    estimate_upgrade()
+                elif weather.get('stale'):
+                    st.caption(f"⚠️ The weather service is not responding; this uses the last conditions "
+                               f"received for this location, {weather['age_seconds'] / 60:.0f} min ago.")
+                
+                # Contributing factors for this prediction
+                factors = result.get('factors') or []
+                if factors:
+                    factors_title = "📋 What Drove This Prediction"
+                    factors_html = '<br>'.join(format_factor(f) for f in factors)
+                else:
+                    factors_title = "📋 Factors Analyzed"
+                    factors_html = "• Location & State<br>• Current Weather Conditions<br>• Time of Day<br>• Vehicle Type"
+                st.markdown(f"""
+                    <div style="margin-top: 16px; padding: 14px; background: #f8fafc; 
+                    border-radius: 10px; border: 2px solid #e2e8f0;">
+                        <div style="font-size: 0.95rem; font-weight: 600; color: #1e293b; margin-bottom: 10px;">
+                            {factors_title}
+                        </div>
+                        <div style="font-size: 0.9rem; color: #475569; line-height: 1.7;">
+                            {factors_html}
+                        </div>
                     </div>
-                </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
+            
+            # What-if sweep over times and driver profiles at this location and weather
+            with st.expander("🧭 Compare Travel Times"):
+                sweep_col1, sweep_col2 = st.columns(2)
+                with sweep_col1:
+                    sweep_vehicle = st.selectbox(
+                        "Vehicle", ['All vehicles'] + list(VEHICLE_MAP.keys()),
+                        index=1 + list(VEHICLE_MAP).index(result['inputs']['vehicle_type']), key='sweep_vehicle'
+                    )
+                with sweep_col2:
+                    sweep_driver = st.selectbox(
+                        "Driver", ['All drivers'] + list(GENDER_MAP.keys()),
+                        index=1 + list(GENDER_MAP).index(result['inputs']['gender']), key='sweep_driver'
+                    )
+                scored = get_sweep(model_handle, result)
+                matrix = sweep_matrix(
+                    scored,
+                    None if sweep_vehicle == 'All vehicles' else sweep_vehicle,
+                    None if sweep_driver == 'All drivers' else sweep_driver
+                )
+                best = lowest_risk_window(matrix)
+                st.markdown(f"**Lowest-risk window:** {best['day_of_week']} {best['part_of_day'].lower()} "
+                            f"({best['probability']:.1%}), with today's weather at this location.")
+                st.dataframe(
+                    matrix.style.format('{:.1%}').highlight_min(axis=None, color='#bbf7d0'),
+                    use_container_width=True
+                )
+
+
+@st.fragment(run_every=ESTIMATE_UPGRADE_SECONDS)
+def estimate_upgrade():
+    """
+    Re-score an estimated prediction with live weather once the background fetch succeeds.
+
+    A failed fetch is retried after a wait that doubles each time; after
+    ESTIMATE_UPGRADE_MAX_FAILURES failures the result stops polling and is
+    shown as "live weather unavailable".
+    """
+    result = st.session_state.prediction_result
+    if not (st.session_state.prediction_made and result and result['weather'].get('estimated')):
+        return
+    inputs = result['inputs']
+    if (inputs['lat'], inputs['lon']) != (st.session_state.lat, st.session_state.lon):
+        return  # Location changed since this prediction
+    failures = result.get('upgrade_failures', 0)
+    future = result.get('upgrade_future')
+    if future is None:
+        if failures >= ESTIMATE_UPGRADE_MAX_FAILURES or time.monotonic() < result.get('upgrade_retry_at', 0.0):
+            return
+        # Restarts the fetch if the last attempt failed; otherwise returns the one in flight
+        future = result['upgrade_future'] = get_location_prefetcher().prefetch(
+            st.session_state.session_id, inputs['lat'], inputs['lon']
+        )
+    if not future.done():
+        return
+    failed = future.cancelled() or future.exception() is not None
+    weather = None if failed else future.result()['weather']
+    if not weather:
+        result['upgrade_future'] = None
+        result['upgrade_failures'] = failures + 1
+        result['upgrade_retry_at'] = time.monotonic() + ESTIMATE_UPGRADE_SECONDS * 2 ** (failures + 1)
+        if result['upgrade_failures'] >= ESTIMATE_UPGRADE_MAX_FAILURES:
+            st.rerun()  # Show the unavailable state and stop polling
+        return
+    started = time.perf_counter()
+    st.session_state.prediction_result = score_prediction(get_model_registry().current(), inputs, weather)
+    log_prediction(st.session_state.prediction_result, started, trigger='live_upgrade')
+    st.rerun()
 
 
 if __name__ == '__main__':